@@ -139,8 +139,8 @@ class FieldLookupBackend(BaseFilterBackend):
     Filter using field lookups provided via query string parameters.
     '''
 
-    RESERVED_NAMES = ('page', 'page_size', 'format', 'order', 'order_by',
-                      'search', 'type', 'host_filter')
+    RESERVED_NAMES = ('page', 'page_size', 'pagination', 'cursor', 'format',
+                      'order', 'order_by', 'search', 'type', 'host_filter')
 
     SUPPORTED_LOOKUPS = ('exact', 'iexact', 'contains', 'icontains',
                          'startswith', 'istartswith', 'endswith', 'iendswith',
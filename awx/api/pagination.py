@@ -1,18 +1,49 @@
 # Copyright (c) 2015 Ansible, Inc.
 # All Rights Reserved.
 
-# Django REST Framework
+# Python
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+# Django
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+
+# Django REST Framework
 from rest_framework import pagination
-from rest_framework.utils.urls import replace_query_param
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class Pagination(pagination.PageNumberPagination):
+    '''
+    Page number pagination, or keyset pagination for requests that ask for
+    it with `?pagination=cursor` (and, by default, for views that set
+    `default_pagination = 'cursor'`, unless the request asks for a `page`).
+
+    A cursor page is the `page_size` rows that follow (or precede) the last
+    row of the previous page in `(ordering field, pk)` order; it is found
+    with a range condition on those columns, so it costs no COUNT(*) and no
+    OFFSET, and the response has no `count`.  Only the first field of the
+    requested ordering is used, and it must be a non-null column of the
+    model itself.
+    '''
 
     page_size_query_param = 'page_size'
     max_page_size = settings.MAX_PAGE_SIZE
 
+    pagination_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor.')
+    cursor_ordering = None
+
     def get_next_link(self):
+        if self.cursor_ordering is not None:
+            return self.get_cursor_link(self.next_position)
         if not self.page.has_next():
             return None
         url = self.request and self.request.get_full_path() or ''
@@ -21,9 +52,127 @@ class Pagination(pagination.PageNumberPagination):
         return replace_query_param(url, self.page_query_param, page_number)
 
     def get_previous_link(self):
+        if self.cursor_ordering is not None:
+            return self.get_cursor_link(self.previous_position)
         if not self.page.has_previous():
             return None
         url = self.request and self.request.get_full_path() or ''
         url = url.encode('utf-8')
         page_number = self.page.previous_page_number()
         return replace_query_param(url, self.page_query_param, page_number)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_ordering = None
+        mode = request.query_params.get(self.pagination_query_param)
+        if mode is None:
+            if self.cursor_query_param in request.query_params:
+                mode = 'cursor'
+            elif self.page_query_param not in request.query_params:
+                mode = getattr(view, 'default_pagination', 'page')
+        if mode != 'cursor':
+            return super(Pagination, self).paginate_queryset(queryset, request, view=view)
+
+        ordering = self.get_cursor_ordering(queryset)
+        if ordering is None:
+            if self.pagination_query_param in request.query_params:
+                raise ParseError(_('Cursor pagination requires ordering by a non-null field of the model.'))
+            # the view's default doesn't apply to this ordering
+            return super(Pagination, self).paginate_queryset(queryset, request, view=view)
+        return self.paginate_queryset_by_cursor(queryset, request, ordering)
+
+    def get_cursor_ordering(self, queryset):
+        '''
+        Return the (field, descending) pair to page `queryset` by, where
+        field is None to page by pk alone, or None if it can't be paged by
+        a cursor.
+        '''
+        model = queryset.model
+        ordering = queryset.query.order_by or model._meta.ordering or ('pk',)
+        name = ordering[0]
+        if not isinstance(name, str) or name == '?':
+            return None
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name in ('pk', model._meta.pk.name):
+            return (None, descending)
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation or field.null or not field.concrete:
+            return None
+        return (field, descending)
+
+    def paginate_queryset_by_cursor(self, queryset, request, ordering):
+        self.request = request
+        self.cursor_ordering = ordering
+        field, descending = ordering
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request, field)
+
+        # a cursor for the previous page walks backwards from its position
+        backwards = reverse != descending
+        order_by = ['-pk' if backwards else 'pk']
+        if field is not None:
+            order_by.insert(0, ('-' if backwards else '') + field.name)
+        queryset = queryset.order_by(*order_by)
+        if position is not None:
+            value, pk = position
+            op = 'lt' if backwards else 'gt'
+            condition = Q(**{'pk__' + op: pk})
+            if field is not None:
+                condition = Q(**{field.name + '__' + op: value}) | (Q(**{field.name: value}) & condition)
+            queryset = queryset.filter(condition)
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results:
+            first, last = self.get_position(results[0]), self.get_position(results[-1])
+            if has_more or reverse:
+                self.next_position = (False, last)
+            if (has_more and reverse) or (position is not None and not reverse):
+                self.previous_position = (True, first)
+        return results
+
+    def get_position(self, obj):
+        field = self.cursor_ordering[0]
+        return (None if field is None else field.value_to_string(obj), obj.pk)
+
+    def decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            reverse, value, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if field is not None:
+                value = field.to_python(value)
+            return bool(reverse), (value, int(pk))
+        except (TypeError, ValueError, ValidationError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, position):
+        value, pk = position
+        data = json.dumps([int(reverse), value, pk])
+        return urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def get_cursor_link(self, position):
+        if position is None:
+            return None
+        reverse, position = position
+        url = self.request and self.request.get_full_path() or ''
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(reverse, position))
+
+    def get_paginated_response(self, data):
+        if self.cursor_ordering is None:
+            return super(Pagination, self).get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
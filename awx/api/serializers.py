@@ -728,7 +728,7 @@ class UnifiedJobSerializer(BaseSerializer):
         fields = ('*', 'unified_job_template', 'launch_type', 'status',
                   'failed', 'started', 'finished', 'elapsed', 'job_args',
                   'job_cwd', 'job_env', 'job_explanation',
-                  'execution_node', 'controller_node',
+                  'execution_node', 'controller_node', 'task_impact',
                   'result_traceback', 'event_processing_finished')
         extra_kwargs = {
             'unified_job_template': {
@@ -3353,7 +3353,7 @@ class JobDetailSerializer(JobSerializer):
 
     class Meta:
         model = Job
-        fields = ('*', 'host_status_counts', 'playbook_counts', 'custom_virtualenv')
+        fields = ('*', 'host_status_counts', 'playbook_counts', 'custom_virtualenv', 'fact_cache_stats')
 
     def get_playbook_counts(self, obj):
         task_count = obj.job_events.filter(event='playbook_on_task_start').count()
@@ -3705,7 +3705,7 @@ class WorkflowJobSerializer(LabelsListMixin, UnifiedJobSerializer):
         fields = ('*', 'workflow_job_template', 'extra_vars', 'allow_simultaneous',
                   'job_template', 'is_sliced_job',
                   '-execution_node', '-event_processing_finished', '-controller_node',
-                  'inventory',)
+                  '-task_impact', 'inventory',)
 
     def get_related(self, obj):
         res = super(WorkflowJobSerializer, self).get_related(obj)
@@ -3735,7 +3735,7 @@ class WorkflowJobSerializer(LabelsListMixin, UnifiedJobSerializer):
 class WorkflowJobListSerializer(WorkflowJobSerializer, UnifiedJobListSerializer):
 
     class Meta:
-        fields = ('*', '-execution_node', '-controller_node',)
+        fields = ('*', '-execution_node', '-controller_node', '-task_impact',)
 
 
 class WorkflowJobCancelSerializer(WorkflowJobSerializer):
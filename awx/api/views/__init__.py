@@ -87,7 +87,7 @@ from awx.main.utils import (
 from awx.main.utils.encryption import encrypt_value
 from awx.main.utils.filters import SmartFilter
 from awx.main.utils.insights import filter_insights_api_response
-from awx.main.redact import UriCleaner
+from awx.main.redact import UriCleanerStream
 from awx.api.permissions import (
     JobTemplateCallbackPermission, TaskPermission, ProjectUpdatePermission,
     InventoryInventorySourcesUpdatePermission, UserPermission,
@@ -840,6 +840,7 @@ class ProjectUpdateEventsList(SubListAPIView):
     relationship = 'project_update_events'
     view_name = _('Project Update Events List')
     search_fields = ('stdout',)
+    default_pagination = 'cursor'
 
     def finalize_response(self, request, response, *args, **kwargs):
         response['X-UI-Max-Events'] = settings.MAX_UI_JOB_EVENTS
@@ -854,6 +855,7 @@ class SystemJobEventsList(SubListAPIView):
     relationship = 'system_job_events'
     view_name = _('System Job Events List')
     search_fields = ('stdout',)
+    default_pagination = 'cursor'
 
     def finalize_response(self, request, response, *args, **kwargs):
         response['X-UI-Max-Events'] = settings.MAX_UI_JOB_EVENTS
@@ -3789,6 +3791,7 @@ class BaseJobEventsList(SubListAPIView):
     relationship = 'job_events'
     view_name = _('Job Events List')
     search_fields = ('stdout',)
+    default_pagination = 'cursor'
 
     def finalize_response(self, request, response, *args, **kwargs):
         response['X-UI-Max-Events'] = settings.MAX_UI_JOB_EVENTS
@@ -3998,6 +4001,7 @@ class BaseAdHocCommandEventsList(SubListAPIView):
     relationship = 'ad_hoc_command_events'
     view_name = _('Ad Hoc Command Events List')
     search_fields = ('stdout',)
+    default_pagination = 'cursor'
 
 
 class HostAdHocCommandEventsList(BaseAdHocCommandEventsList):
@@ -4096,8 +4100,10 @@ class StdoutFilter(object):
 
     def __init__(self, fileobj):
         self._functions = []
+        self._streams = []
         self.fileobj = fileobj
         self.extra_data = ''
+        self.eof = False
         if hasattr(fileobj, 'close'):
             self.close = fileobj.close
 
@@ -4106,6 +4112,9 @@ class StdoutFilter(object):
         while size > 0 and len(data) < size:
             line = self.fileobj.readline(size)
             if not line:
+                if not self.eof:
+                    self.eof = True
+                    data += self.flush_streams()
                 break
             line = self.process_line(line)
             data += line
@@ -4119,11 +4128,27 @@ class StdoutFilter(object):
     def register(self, func):
         self._functions.append(func)
 
+    def register_stream(self, stream):
+        '''
+        Register an object with `feed(data)` and `flush()` methods (such as
+        a UriCleanerStream) that may hold back part of the text it's fed
+        until it sees more of it; streams are applied after the functions.
+        '''
+        self._streams.append(stream)
+
     def process_line(self, line):
         for func in self._functions:
             line = func(line)
+        for stream in self._streams:
+            line = stream.feed(line)
         return line
 
+    def flush_streams(self):
+        data = ''
+        for stream in self._streams:
+            data = stream.feed(data) + stream.flush()
+        return data
+
 
 class UnifiedJobStdout(RetrieveAPIView):
 
@@ -4185,7 +4210,7 @@ class UnifiedJobStdout(RetrieveAPIView):
                 if target_format == 'txt_download':
                     redactor.register(redact_ansi)
                 if type(unified_job) == models.ProjectUpdate:
-                    redactor.register(UriCleaner.remove_sensitive)
+                    redactor.register_stream(UriCleanerStream())
                 response = HttpResponse(FileWrapper(redactor), content_type='text/plain')
                 response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
                 return response
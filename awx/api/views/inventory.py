@@ -64,6 +64,7 @@ class InventoryUpdateEventsList(SubListAPIView):
     relationship = 'inventory_update_events'
     view_name = _('Inventory Update Events List')
     search_fields = ('stdout',)
+    default_pagination = 'cursor'
 
     def finalize_response(self, request, response, *args, **kwargs):
         response['X-UI-Max-Events'] = settings.MAX_UI_JOB_EVENTS
@@ -24,20 +24,25 @@ import datetime
 import json
 import multiprocessing
 import os
+import socket
 import stat
 import threading
 import uuid
 
-try:
-    import memcache
-except ImportError:
-    raise ImportError('python-memcached is missing; {}bin/pip install python-memcached'.format(
-        os.environ['VIRTUAL_ENV']
-    ))
-
 __all__ = ['event_context']
 
 
+def memcache_client():
+    try:
+        import memcache
+    except ImportError:
+        raise ImportError('python-memcached is missing; {}bin/pip install python-memcached'.format(
+            os.environ['VIRTUAL_ENV']
+        ))
+    cache_actual = os.getenv('CACHE', '127.0.0.1:11211')
+    return memcache.Client([cache_actual], debug=0)
+
+
 class IsolatedFileWrite:
     '''
     Stand-in class that will write partial event data to a file as a
@@ -59,6 +64,42 @@ class IsolatedFileWrite:
         os.rename(write_location, dropoff_location)
 
 
+class EventSocketWrite:
+    '''
+    Stand-in class that streams event data over the Unix socket named by
+    AWX_EVENT_SOCKET (which the parent AWX process listens on) as a
+    replacement for memcache.  Each event is sent as one line of JSON before
+    its uuid is written to stdout.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.sock = None
+        self.pid = None
+        self.fallback = None
+
+    def _connect(self):
+        # ansible forks worker processes, and each needs its own connection
+        if self.sock is None or self.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self.sock, self.pid = sock, os.getpid()
+        return self.sock
+
+    def set(self, key, value):
+        if self.fallback is None:
+            try:
+                with self.lock:
+                    self._connect().sendall((value + '\n').encode('utf-8'))
+                return
+            except (IOError, OSError):
+                # if the parent process isn't listening, fall back to memcache
+                self.sock = None
+                self.fallback = memcache_client()
+        self.fallback.set(key, value)
+
+
 class EventContext(object):
     '''
     Store global and local (per thread/process) data associated with callback
@@ -67,11 +108,12 @@ class EventContext(object):
 
     def __init__(self):
         self.display_lock = multiprocessing.RLock()
-        cache_actual = os.getenv('CACHE', '127.0.0.1:11211')
         if os.getenv('AWX_ISOLATED_DATA_DIR', False):
             self.cache = IsolatedFileWrite()
+        elif os.getenv('AWX_EVENT_SOCKET', False):
+            self.cache = EventSocketWrite(os.getenv('AWX_EVENT_SOCKET'))
         else:
-            self.cache = memcache.Client([cache_actual], debug=0)
+            self.cache = memcache_client()
 
     def add_local(self, **kwargs):
         if not hasattr(self, '_local'):
@@ -1,5 +1,7 @@
 import json
 import logging
+import time
+from collections import OrderedDict
 
 from channels import Group
 from channels.auth import channel_session_user_from_http, channel_session_user
@@ -95,3 +97,114 @@ def emit_channel_notification(group, payload):
         Group(group).send({"text": json.dumps(payload, cls=DjangoJSONEncoder)})
     except ValueError:
         logger.error("Invalid payload emitting channel {} on topic: {}".format(group, payload))
+
+
+class EventBroadcaster(object):
+    '''
+    Sends the websocket notifications for newly saved job events.
+
+    By default, each event is sent as soon as it's saved, in a message of its
+    own.  Once `interval` is set (the callback receiver sets it from
+    EVENT_BROADCAST_INTERVAL), the events for each group are collected and
+    sent together at most every `interval` milliseconds, in one message:
+
+        {"group_name": "job_events", "events": [<event>, <event>, ...]}
+
+    where each event has the same shape as the message it would have been
+    sent in alone.  Events for groups that nobody is subscribed to are then
+    discarded without being serialized.
+
+    With `max_events_per_second`, each group is sent at most that many events
+    per second; the rest wait for later messages, up to BACKLOG_SECONDS worth
+    of them, after which new events are dropped.  A forced flush (at the end
+    of a job) sends everything that's waiting.
+    '''
+
+    SUBSCRIBER_CHECK_SECONDS = 1
+    BACKLOG_SECONDS = 60
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, interval=0, max_events_per_second=0):
+        self.interval = interval
+        self.max_events_per_second = max_events_per_second
+        self.pending = OrderedDict()
+        self.subscribers = {}
+        self.allowances = {}
+        self.dropped = 0
+        self.last_flush = time.time()
+
+    def send(self, group, get_payload):
+        '''
+        Send (or queue) the notification returned by `get_payload()` to
+        `group`; `get_payload` isn't called for events that are discarded.
+        '''
+        if not self.interval:
+            emit_channel_notification(group, get_payload())
+            return
+        if self.has_subscribers(group, time.time()):
+            events = self.pending.setdefault(group, [])
+            if self.max_events_per_second and \
+                    len(events) >= self.max_events_per_second * self.BACKLOG_SECONDS:
+                self.dropped += 1
+            else:
+                events.append(get_payload())
+        self.flush()
+
+    def flush(self, force=False):
+        now = time.time()
+        if not force and (now - self.last_flush) * 1000 < self.interval:
+            return
+        pending, self.pending = self.pending, OrderedDict()
+        self.last_flush = now
+        for group, events in pending.items():
+            count = len(events) if force else self.allowance(group, len(events), now)
+            if count:
+                emit_channel_notification(group, {'group_name': events[0].get('group_name'), 'events': events[:count]})
+            if count < len(events):
+                self.pending[group] = events[count:]
+
+        # forget about groups (i.e., jobs) we haven't heard from lately
+        self.subscribers = dict(
+            (group, checked) for group, checked in self.subscribers.items()
+            if now - checked[0] < self.SUBSCRIBER_CHECK_SECONDS
+        )
+        self.allowances = dict(
+            (group, allowance) for group, allowance in self.allowances.items()
+            if group in self.pending or now - allowance[1] < 1
+        )
+
+    def allowance(self, group, count, now):
+        '''
+        Return how many of the `count` events waiting for `group` may be sent
+        now; the allowance refills at max_events_per_second.
+        '''
+        rate = self.max_events_per_second
+        if not rate:
+            return count
+        available, updated = self.allowances.get(group, (rate, now))
+        available = min(rate, available + (now - updated) * rate)
+        count = min(count, int(available))
+        self.allowances[group] = (available - count, now)
+        return count
+
+    def has_subscribers(self, group, now):
+        checked = self.subscribers.get(group)
+        if checked is None or now - checked[0] >= self.SUBSCRIBER_CHECK_SECONDS:
+            checked = self.subscribers[group] = (now, self.group_has_channels(group))
+        return checked[1]
+
+    def group_has_channels(self, group):
+        group_channels = getattr(Group(group).channel_layer, 'group_channels', None)
+        if group_channels is None:
+            # this channel layer can't tell; assume somebody is listening
+            return True
+        try:
+            return len(group_channels(group)) > 0
+        except Exception:
+            logger.exception('Could not list the subscribers of channel {}'.format(group))
+            return True
+
+
+event_broadcaster = EventBroadcaster()
@@ -1,10 +1,16 @@
 import inspect
 import logging
+import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from uuid import uuid4
 
 from django.conf import settings
+from django.core.cache import cache
 from kombu import Connection, Exchange, Producer
+from kombu.serialization import dumps
 
 logger = logging.getLogger('awx.main.dispatch')
 
@@ -13,6 +19,142 @@ def serialize_task(f):
     return '.'.join([f.__module__, f.__name__])
 
 
+class Publisher(object):
+    '''
+    A per-process pool of long-lived broker connections used to publish
+    dispatcher tasks.
+
+    Connections are reused across publishes (and discarded when the process
+    forks), exchanges are only declared the first time they're published to,
+    and message bodies are only compressed (with
+    `DISPATCHER_PUBLISH_COMPRESSION`) when they're at least
+    `DISPATCHER_PUBLISH_COMPRESSION_THRESHOLD` bytes.
+    '''
+
+    MAX_RETRIES = 2
+    STATS_INTERVAL = 5
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.idle = []
+        self.declared = set()
+        self.stats = {
+            'publishes': 0,
+            'errors': 0,
+            'compressed': 0,
+            'bytes': 0,
+            'publishes_per_second': 0.0,
+            'last_latency': 0.0,
+            'average_latency': 0.0,
+        }
+        self.stats_window_start = time.time()
+        self.stats_window_publishes = 0
+        self.stats_window_latency = 0.0
+
+    @staticmethod
+    def stats_key(pid):
+        return 'awx-publisher-stats-{}'.format(pid)
+
+    @contextmanager
+    def producer(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # connections can't be shared with the parent process
+                self.reset()
+            producer = self.idle.pop() if self.idle else None
+        if producer is None:
+            producer = Producer(Connection(settings.BROKER_URL))
+        try:
+            yield producer
+        except Exception:
+            producer.connection.release()
+            with self.lock:
+                # the exchanges may have to be declared on the new connection
+                self.declared = set()
+            raise
+        with self.lock:
+            if self.pid == os.getpid():
+                self.idle.append(producer)
+
+    def publish(self, body, exchange_name, exchange_type, routing_key, **kwargs):
+        started = time.time()
+        content_type, content_encoding, data = dumps(body, serializer='json')
+        compression = None
+        if settings.DISPATCHER_PUBLISH_COMPRESSION and \
+                len(data) >= settings.DISPATCHER_PUBLISH_COMPRESSION_THRESHOLD:
+            compression = settings.DISPATCHER_PUBLISH_COMPRESSION
+
+        exchange = Exchange(exchange_name, type=exchange_type)
+        for retry_count in range(self.MAX_RETRIES + 1):
+            try:
+                with self.producer() as producer:
+                    declare = []
+                    if (exchange_name, exchange_type) not in self.declared:
+                        declare = [exchange]
+                    producer.publish(data,
+                                     content_type=content_type,
+                                     content_encoding=content_encoding,
+                                     compression=compression,
+                                     exchange=exchange,
+                                     declare=declare,
+                                     routing_key=routing_key,
+                                     **kwargs)
+                    self.declared.add((exchange_name, exchange_type))
+                break
+            except Exception:
+                self.stats['errors'] += 1
+                if retry_count >= self.MAX_RETRIES:
+                    raise
+                logger.info('Publish exception, retry={}'.format(retry_count), exc_info=True)
+        self.record(len(data), compression is not None, time.time() - started)
+
+    def record(self, size, compressed, latency):
+        stats = self.stats
+        stats['publishes'] += 1
+        stats['bytes'] += size
+        stats['compressed'] += int(compressed)
+        stats['last_latency'] = latency
+        self.stats_window_publishes += 1
+        self.stats_window_latency += latency
+
+        elapsed = time.time() - self.stats_window_start
+        if elapsed >= self.STATS_INTERVAL:
+            stats['publishes_per_second'] = self.stats_window_publishes / elapsed
+            stats['average_latency'] = self.stats_window_latency / self.stats_window_publishes
+            self.stats_window_start = time.time()
+            self.stats_window_publishes = 0
+            self.stats_window_latency = 0.0
+            try:
+                cache.set(self.stats_key(os.getpid()), stats, self.STATS_INTERVAL * 6)
+            except Exception:
+                logger.exception('could not record publisher stats')
+
+    @classmethod
+    def debug(cls, pids):
+        '''
+        Render the most recently recorded publisher stats for the given
+        processes.
+        '''
+        keys = dict((cls.stats_key(pid), pid) for pid in pids)
+        lines = []
+        for key, stats in sorted(cache.get_many(list(keys)).items(), key=lambda item: keys[item[0]]):
+            lines.append(
+                '.  publisher[pid:{pid}] publishes={publishes} errors={errors}'
+                ' compressed={compressed} bytes={bytes}'
+                ' publishes/s={publishes_per_second:0.1f}'
+                ' last_latency={last_latency:0.4f}s'
+                ' average_latency={average_latency:0.4f}s'.format(pid=keys[key], **stats)
+            )
+        return '\n'.join(lines)
+
+
+publisher = Publisher()
+
+
 class task:
     """
     Used to decorate a function or class so that it can be run asynchronously
@@ -84,21 +226,16 @@ class task:
                 if callable(queue):
                     queue = queue()
                 if not settings.IS_TESTING(sys.argv):
-                    with Connection(settings.BROKER_URL) as conn:
-                        exchange = Exchange(queue, type=exchange_type or 'direct')
-                        producer = Producer(conn)
-                        logger.debug('publish {}({}, queue={})'.format(
-                            cls.name,
-                            task_id,
-                            queue
-                        ))
-                        producer.publish(obj,
-                                         serializer='json',
-                                         compression='bzip2',
-                                         exchange=exchange,
-                                         declare=[exchange],
-                                         delivery_mode="persistent",
-                                         routing_key=queue)
+                    logger.debug('publish {}({}, queue={})'.format(
+                        cls.name,
+                        task_id,
+                        queue
+                    ))
+                    publisher.publish(obj,
+                                      queue,
+                                      exchange_type or 'direct',
+                                      routing_key=queue,
+                                      delivery_mode="persistent")
                 return (obj, queue)
 
         # If the object we're wrapping *is* a class (e.g., RunJob), return
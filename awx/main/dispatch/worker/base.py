@@ -12,6 +12,7 @@ from kombu import Producer
 from kombu.mixins import ConsumerMixin
 
 from awx.main.dispatch.pool import WorkerPool
+from awx.main.dispatch.publish import publisher
 
 logger = logging.getLogger('awx.main.dispatch')
 
@@ -47,7 +48,8 @@ class AWXConsumer(ConsumerMixin):
 
     def get_consumers(self, Consumer, channel):
         logger.debug(self.listening_on)
-        return [Consumer(queues=self.queues, accept=['json'],
+        # events may be msgpack-encoded (see CALLBACK_EVENT_CODEC)
+        return [Consumer(queues=self.queues, accept=['json', 'application/x-msgpack'],
                          callbacks=[self.process_task])]
 
     @property
@@ -65,7 +67,12 @@ class AWXConsumer(ConsumerMixin):
                 routing_key=message.properties['reply_to']
             )
             if control == 'status':
-                msg = '\n'.join([self.listening_on, self.pool.debug()])
+                msg = '\n'.join(filter(None, [
+                    self.listening_on,
+                    self.pool.debug(),
+                    self.worker.debug(self.pool),
+                    publisher.debug([os.getpid()] + [w.pid for w in self.pool.workers])
+                ]))
             elif control == 'running':
                 msg = []
                 for worker in self.pool.workers:
@@ -87,13 +94,10 @@ class AWXConsumer(ConsumerMixin):
                 logger.exception("Exception handling control message:")
                 return
         if len(self.pool):
-            if "uuid" in body and body['uuid']:
-                try:
-                    queue = UUID(body['uuid']).int % len(self.pool)
-                except Exception:
-                    queue = self.total_messages % len(self.pool)
-            else:
-                queue = self.total_messages % len(self.pool)
+            queue = self.worker.preferred_queue(body)
+            if queue is None:
+                queue = self.total_messages
+            queue = queue % len(self.pool)
         else:
             queue = 0
         self.pool.write(queue, body)
@@ -124,7 +128,7 @@ class BaseWorker(object):
             if os.getppid() != ppid:
                 break
             try:
-                body = queue.get(block=True, timeout=1)
+                body = self.read(queue)
                 if body == 'QUIT':
                     break
             except QueueEmpty:
@@ -143,11 +147,38 @@ class BaseWorker(object):
                     uuid = body['uuid']
                     logger.debug('task {} is finished'.format(uuid))
                     finished.put(uuid)
+        self.on_exit()
         logger.warn('worker exiting gracefully pid:{}'.format(os.getpid()))
 
+    def read(self, queue):
+        return queue.get(block=True, timeout=1)
+
+    def preferred_queue(self, body):
+        '''
+        Return an integer used to choose which worker process should handle
+        `body` (modulo the size of the pool), or None to distribute messages
+        round-robin.
+        '''
+        if "uuid" in body and body['uuid']:
+            try:
+                return UUID(body['uuid']).int
+            except Exception:
+                pass
+        return None
+
+    def debug(self, pool):
+        '''
+        Return extra lines for the `status` control output; this runs in the
+        parent process, not in the forked workers.
+        '''
+        return ''
+
     def perform_work(self, body):
         raise NotImplementedError()
 
+    def on_exit(self):
+        pass
+
     def on_start(self):
         pass
 
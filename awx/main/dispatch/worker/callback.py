@@ -1,14 +1,19 @@
 import logging
+import os
 import time
 import traceback
+from collections import OrderedDict
+from queue import Empty as QueueEmpty
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import DatabaseError, OperationalError, connection as django_connection
 from django.db.utils import InterfaceError, InternalError
 
-from awx.main.consumers import emit_channel_notification
+from awx.main.consumers import emit_channel_notification, event_broadcaster
 from awx.main.models import (JobEvent, AdHocCommandEvent, ProjectUpdateEvent,
                              InventoryUpdateEvent, SystemJobEvent, UnifiedJob)
+from awx.main.models.events import bulk_save_events, JobHostCache, ParentEventRollup
 
 from .base import BaseWorker
 
@@ -22,34 +27,201 @@ class CallbackBrokerWorker(BaseWorker):
 
     The code that *builds* these types of messages is found in the AWX display
     callback (`awx.lib.awx_display_callback`).
+
+    Events are buffered per event class and written with a single multi-row
+    INSERT once `JOB_EVENT_BUFFER_SIZE` events of a class are pending, once
+    `JOB_EVENT_BUFFER_SECONDS` have passed since the last write, or as soon as
+    the EOF event for a job arrives.
+
+    While buffering, the changed/failed flags that job events propagate to
+    their parents are aggregated in memory (see `ParentEventRollup`) and
+    written once per parent instead of once per child event.
+
+    Host names of job events are resolved to host ids using a per-process
+    `JobHostCache`, which is populated the first time a job's events arrive
+    and evicted when its EOF is handled.
+
+    The websocket notifications for saved events are coalesced by the
+    process' `EventBroadcaster` into one message per job every
+    `EVENT_BROADCAST_INTERVAL` milliseconds.
     '''
 
     MAX_RETRIES = 2
+    STATS_INTERVAL = 5
+
+    EVENT_MAP = OrderedDict([
+        ('job_id', JobEvent),
+        ('ad_hoc_command_id', AdHocCommandEvent),
+        ('project_update_id', ProjectUpdateEvent),
+        ('inventory_update_id', InventoryUpdateEvent),
+        ('system_job_id', SystemJobEvent),
+    ])
+
+    def __init__(self):
+        self.buff = OrderedDict()
+        self.parent_rollup = ParentEventRollup()
+        self.host_cache = JobHostCache()
+        self.last_flush = time.time()
+        self.stats = {
+            'events': 0,
+            'flushes': 0,
+            'last_flush_size': 0,
+            'last_flush_latency': 0.0,
+            'events_per_second': 0.0,
+            'host_cache_hits': 0,
+            'host_cache_misses': 0,
+        }
+        self.stats_window_start = time.time()
+        self.stats_window_events = 0
+        event_broadcaster.configure(
+            interval=settings.EVENT_BROADCAST_INTERVAL,
+            max_events_per_second=settings.EVENT_BROADCAST_MAX_EVENTS_PER_SECOND
+        )
+
+    @property
+    def buffering(self):
+        return settings.JOB_EVENT_BUFFER_SIZE > 1
+
+    @staticmethod
+    def stats_key(pid):
+        return 'awx-callback-receiver-stats-{}'.format(pid)
+
+    def read(self, queue):
+        try:
+            return queue.get(block=True, timeout=settings.JOB_EVENT_BUFFER_SECONDS)
+        except QueueEmpty:
+            return {'event': 'FLUSH'}
+
+    def preferred_queue(self, body):
+        if self.buffering:
+            # when events are buffered, every event for a given job must be
+            # handled by the same process; this preserves per-job ordering
+            # and guarantees that all of a job's events have been written
+            # when its EOF is handled
+            for key in self.EVENT_MAP:
+                if body.get(key):
+                    try:
+                        return int(body[key])
+                    except (TypeError, ValueError):
+                        break
+        return super(CallbackBrokerWorker, self).preferred_queue(body)
+
+    def debug(self, pool):
+        lines = []
+        for worker in pool.workers:
+            stats = cache.get(self.stats_key(worker.pid))
+            if stats:
+                lines.append(
+                    '.  worker[pid:{pid}] events={events} flushes={flushes}'
+                    ' last_flush_size={last_flush_size}'
+                    ' last_flush_latency={last_flush_latency:0.3f}s'
+                    ' events/s={events_per_second:0.1f}'
+                    ' host_cache_hits={host_cache_hits}'
+                    ' host_cache_misses={host_cache_misses}'.format(pid=worker.pid, **stats)
+                )
+        return '\n'.join(lines)
+
+    def on_exit(self):
+        self.flush(force=True)
+        self.parent_rollup.write_all()
+        event_broadcaster.flush(force=True)
+
+    def flush(self, force=False):
+        pending = [len(events) for events in self.buff.values()]
+        if not any(pending):
+            self.last_flush = time.time()
+            return
+        if not force and max(pending) < settings.JOB_EVENT_BUFFER_SIZE and \
+                time.time() - self.last_flush < settings.JOB_EVENT_BUFFER_SECONDS:
+            return
+
+        started = time.time()
+        buff, self.buff = self.buff, OrderedDict()
+        for cls, events in buff.items():
+            self.save_events(cls, events)
+        self.last_flush = time.time()
+        self.record_flush(sum(pending), self.last_flush - started)
+
+    def save_events(self, cls, events):
+        retries = 0
+        while retries <= self.MAX_RETRIES:
+            try:
+                # if a prior attempt failed part of the way through, don't
+                # INSERT the events that were already persisted
+                bulk_save_events(
+                    cls, [e for e in events if e.pk is None],
+                    parent_rollup=self.parent_rollup if self.buffering else None,
+                    host_cache=self.host_cache
+                )
+                break
+            except (OperationalError, InterfaceError, InternalError):
+                if retries >= self.MAX_RETRIES:
+                    logger.exception('Worker could not re-establish database connectivity, giving up on {} {}s'.format(
+                        len(events), cls.__name__
+                    ))
+                    return
+                delay = 60 * retries
+                logger.exception('Database Error Saving Job Events, retry #{i} in {delay} seconds:'.format(
+                    i=retries + 1,
+                    delay=delay
+                ))
+                django_connection.close()
+                time.sleep(delay)
+                retries += 1
+            except DatabaseError:
+                # something in the batch is broken; save the events one at a
+                # time so that a single bad event doesn't discard the others
+                logger.exception('Database Error Saving {} {}s, retrying individually'.format(
+                    len(events), cls.__name__
+                ))
+                for event in events:
+                    if event.pk is not None:
+                        continue
+                    try:
+                        event.save()
+                    except DatabaseError:
+                        logger.exception('Database Error Saving Job Event for {} {}'.format(
+                            cls.__name__, event.uuid
+                        ))
+                break
+
+    def record_flush(self, size, latency):
+        self.stats['events'] += size
+        self.stats['flushes'] += 1
+        self.stats['last_flush_size'] = size
+        self.stats['last_flush_latency'] = latency
+        self.stats['host_cache_hits'] = self.host_cache.hits
+        self.stats['host_cache_misses'] = self.host_cache.misses
+        self.stats_window_events += size
+
+        elapsed = time.time() - self.stats_window_start
+        if elapsed >= self.STATS_INTERVAL:
+            self.stats['events_per_second'] = self.stats_window_events / elapsed
+            self.stats_window_start = time.time()
+            self.stats_window_events = 0
+            try:
+                cache.set(self.stats_key(os.getpid()), self.stats, self.STATS_INTERVAL * 6)
+            except Exception:
+                logger.exception('could not record callback receiver stats')
 
     def perform_work(self, body):
         try:
-            event_map = {
-                'job_id': JobEvent,
-                'ad_hoc_command_id': AdHocCommandEvent,
-                'project_update_id': ProjectUpdateEvent,
-                'inventory_update_id': InventoryUpdateEvent,
-                'system_job_id': SystemJobEvent,
-            }
-
-            if not any([key in body for key in event_map]):
-                raise Exception('Payload does not have a job identifier')
+            if body.get('event') == 'FLUSH':
+                self.flush()
+                event_broadcaster.flush()
+                return
 
-            def _save_event_data():
-                for key, cls in event_map.items():
-                    if key in body:
-                        cls.create_from_data(**body)
+            if not any([key in body for key in self.EVENT_MAP]):
+                raise Exception('Payload does not have a job identifier')
 
             job_identifier = 'unknown job'
             job_key = 'unknown'
-            for key in event_map.keys():
+            event_cls = None
+            for key, cls in self.EVENT_MAP.items():
                 if key in body:
                     job_identifier = body[key]
                     job_key = key
+                    event_cls = cls
                     break
 
             if settings.DEBUG:
@@ -69,6 +241,16 @@ class CallbackBrokerWorker(BaseWorker):
                 )[:1024 * 4])
 
             if body.get('event') == 'EOF':
+                # every buffered event for this job must be persisted before
+                # we report the job's events as finished
+                self.flush(force=True)
+                try:
+                    if job_key == 'job_id':
+                        self.host_cache.evict(job_identifier)
+                        self.parent_rollup.write(job_identifier)
+                except DatabaseError:
+                    logger.exception('Database Error Saving Parent Job Event flags for Job {}'.format(job_identifier))
+                event_broadcaster.flush(force=True)
                 try:
                     final_counter = body.get('final_counter', 0)
                     logger.info('Event processing is finished for Job {}, sending notifications'.format(job_identifier))
@@ -101,26 +283,10 @@ class CallbackBrokerWorker(BaseWorker):
                     logger.exception('Worker failed to emit notifications: Job {}'.format(job_identifier))
                 return
 
-            retries = 0
-            while retries <= self.MAX_RETRIES:
-                try:
-                    _save_event_data()
-                    break
-                except (OperationalError, InterfaceError, InternalError):
-                    if retries >= self.MAX_RETRIES:
-                        logger.exception('Worker could not re-establish database connectivity, giving up on event for Job {}'.format(job_identifier))
-                        return
-                    delay = 60 * retries
-                    logger.exception('Database Error Saving Job Event, retry #{i} in {delay} seconds:'.format(
-                        i=retries + 1,
-                        delay=delay
-                    ))
-                    django_connection.close()
-                    time.sleep(delay)
-                    retries += 1
-                except DatabaseError:
-                    logger.exception('Database Error Saving Job Event for Job {}'.format(job_identifier))
-                    break
+            event = event_cls.build_from_data(**body)
+            if event is not None:
+                self.buff.setdefault(event_cls, []).append(event)
+            self.flush()
         except Exception as exc:
             tb = traceback.format_exc()
             logger.error('Callback Task Processor Raised Exception: %r', exc)
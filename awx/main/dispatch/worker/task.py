@@ -5,7 +5,7 @@ import sys
 import traceback
 
 
-from awx.main.tasks import dispatch_startup, inform_cluster_of_shutdown
+from awx.main.tasks import dispatch_startup, inform_cluster_of_shutdown, inventory_computed_fields_debug
 
 from .base import BaseWorker
 
@@ -113,6 +113,13 @@ class TaskWorker(BaseWorker):
             self.perform_work(callback)
         return result
 
+    def debug(self, pool):
+        try:
+            return inventory_computed_fields_debug()
+        except Exception:
+            logger.exception('failed to render inventory computed fields stats')
+            return ''
+
     def on_start(self):
         dispatch_startup()
 
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import selectors
+import socket
+import stat
+import threading
+import time
+
+logger = logging.getLogger('awx.main.expect.event_receiver')
+
+
+class EventPayloadReceiver(object):
+    '''
+    Listens on a Unix socket for the event payloads sent by the AWX display
+    callback (see `EventSocketWrite` in `awx.lib.awx_display_callback`).
+
+    Each payload is a line of JSON containing the event's `uuid`; the display
+    callback sends it *before* writing the event's encoded uuid to stdout, so
+    by the time `OutputEventFilter` parses the uuid from stdout the payload
+    has (almost always) already arrived.  Payloads are read on a background
+    thread so that a child process sending a large payload never blocks on
+    a parent process that is busy reading stdout.
+    '''
+
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self.payloads = {}
+        self.accepted = 0
+        self.cond = threading.Condition()
+        self.closed = False
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        self.sock.listen(16)
+        self.sock.setblocking(False)
+
+        # used by close() to wake up the thread
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        buffers = {}
+        while not self.closed:
+            for key, mask in self.selector.select():
+                if key.fileobj is self.wakeup_r:
+                    break
+                if key.fileobj is self.sock:
+                    try:
+                        conn, _ = self.sock.accept()
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    conn.setblocking(False)
+                    self.selector.register(conn, selectors.EVENT_READ)
+                    buffers[conn] = bytearray()
+                    with self.cond:
+                        self.accepted += 1
+                    continue
+
+                conn = key.fileobj
+                try:
+                    data = conn.recv(65536)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b''
+                if not data:
+                    self.selector.unregister(conn)
+                    conn.close()
+                    buffers.pop(conn, None)
+                    continue
+
+                buffers[conn].extend(data)
+                if b'\n' not in data:
+                    # a large payload can span many reads
+                    continue
+                lines = buffers[conn].split(b'\n')
+                buffers[conn] = lines.pop()
+                received = {}
+                for line in lines:
+                    try:
+                        payload = json.loads(bytes(line).decode('utf-8'))
+                        received[payload['uuid']] = payload
+                    except (ValueError, KeyError, TypeError):
+                        logger.exception('Invalid event payload received on {}'.format(self.path))
+                if received:
+                    with self.cond:
+                        self.payloads.update(received)
+                        self.cond.notify_all()
+
+    def get(self, uuid):
+        '''
+        Return (and forget) the payload for the event with the given uuid,
+        or None if it doesn't arrive within `timeout` seconds.
+        '''
+        deadline = time.time() + self.timeout
+        with self.cond:
+            while uuid not in self.payloads:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self.closed:
+                    if not self.accepted:
+                        # the display callback never connected (and is
+                        # sending its payloads elsewhere); don't wait on
+                        # every remaining event
+                        self.timeout = 0
+                    return None
+                self.cond.wait(remaining)
+            return self.payloads.pop(uuid)
+
+    def close(self):
+        self.closed = True
+        self.wakeup_w.send(b'\0')
+        self.thread.join()
+        self.wakeup_w.close()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        with self.cond:
+            self.payloads = {}
@@ -43,7 +43,7 @@ from rest_framework import serializers
 from awx.main.utils.filters import SmartFilter
 from awx.main.utils.encryption import encrypt_value, decrypt_value, get_encryption_key
 from awx.main.validators import validate_ssh_private_key
-from awx.main.models.rbac import batch_role_ancestor_rebuilding, Role
+from awx.main.models.rbac import batch_role_ancestor_rebuilding, invalidate_accessible_pks_of_roles, Role
 from awx.main.constants import ENV_BLACKLIST
 from awx.main import utils
 
@@ -364,6 +364,9 @@ class ImplicitRoleField(models.ForeignKey):
 
         Role_ = utils.get_current_apps().get_model('main', 'Role')
         child_ids = [x for x in Role_.parents.through.objects.filter(to_role_id__in=role_ids).distinct().values_list('from_role_id', flat=True)]
+        # the delete cascades to the members and ancestors of the roles
+        # without sending m2m_changed
+        invalidate_accessible_pks_of_roles(role_ids)
         Role_.objects.filter(id__in=role_ids).delete()
         Role.rebuild_role_ancestor_list([], child_ids)
 
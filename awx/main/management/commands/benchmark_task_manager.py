@@ -0,0 +1,241 @@
+# Copyright (c) 2018 Ansible, Inc.
+# All Rights Reserved.
+
+# Python
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+# AWX
+from awx.main.models import (
+    Host, Instance, InstanceGroup, Inventory, InventorySource, Job,
+    JobTemplate, Organization, Project
+)
+from awx.main.scheduler import TaskManager
+
+
+PHASES = ('get_tasks', 'process_finished_workflow_jobs', 'spawn_workflow_graph_jobs', 'process_tasks')
+
+
+class BenchmarkTaskManager(TaskManager):
+    '''
+    A TaskManager that records the wall time and query count of each phase
+    of a scheduling cycle, and the number of tasks it starts.
+    '''
+
+    def __init__(self):
+        super(BenchmarkTaskManager, self).__init__()
+        self.phases = OrderedDict((phase, {'wall_time': 0.0, 'queries': 0}) for phase in PHASES)
+        self.started = []
+
+    def measure(self, phase, *args):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            result = getattr(super(BenchmarkTaskManager, self), phase)(*args)
+            self.phases[phase]['wall_time'] += time.time() - started
+        self.phases[phase]['queries'] += len(queries)
+        return result
+
+    def get_tasks(self, *args):
+        return self.measure('get_tasks', *args)
+
+    def process_finished_workflow_jobs(self, *args):
+        return self.measure('process_finished_workflow_jobs', *args)
+
+    def spawn_workflow_graph_jobs(self, *args):
+        return self.measure('spawn_workflow_graph_jobs', *args)
+
+    def process_tasks(self, *args):
+        return self.measure('process_tasks', *args)
+
+    def start_task(self, task, *args, **kwargs):
+        self.started.append(task)
+        return super(BenchmarkTaskManager, self).start_task(task, *args, **kwargs)
+
+    # nothing started by the benchmark is actually run, or announced
+
+    def dispatch_task(self, *args):
+        pass
+
+    def emit_status(self, task, status):
+        pass
+
+    def reschedule(self):
+        pass
+
+
+class Command(BaseCommand):
+    '''
+    Seed the database with a synthetic cluster and workload, run the task
+    manager against it and report how long each scheduling cycle took.
+    '''
+
+    help = ('Benchmark the task manager against generated instance groups, '
+            'projects, inventories and jobs; results are written as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instance-groups', dest='instance_groups', type=int, default=2, metavar='N',
+                            help='Number of instance groups to create (default=2)')
+        parser.add_argument('--instances', dest='instances', type=int, default=3, metavar='N',
+                            help='Number of instances in each instance group (default=3)')
+        parser.add_argument('--instance-capacity', dest='instance_capacity', type=int, default=100, metavar='N',
+                            help='Capacity of each instance (default=100)')
+        parser.add_argument('--projects', dest='projects', type=int, default=10, metavar='N',
+                            help='Number of projects to create (default=10)')
+        parser.add_argument('--inventories', dest='inventories', type=int, default=10, metavar='N',
+                            help='Number of inventories to create (default=10)')
+        parser.add_argument('--hosts', dest='hosts', type=int, default=10, metavar='N',
+                            help='Number of hosts in each inventory (default=10)')
+        parser.add_argument('--update-on-launch', dest='update_on_launch', action='store_true', default=False,
+                            help='Make every project and inventory source update on launch')
+        parser.add_argument('--job-templates', dest='job_templates', type=int, default=20, metavar='N',
+                            help='Number of job templates to create (default=20)')
+        parser.add_argument('--pending', dest='pending', type=int, default=100, metavar='N',
+                            help='Number of pending jobs to create (default=100)')
+        parser.add_argument('--running', dest='running', type=int, default=10, metavar='N',
+                            help='Number of running jobs to create (default=10)')
+        parser.add_argument('--cycles', dest='cycles', type=int, default=5, metavar='N',
+                            help='Number of scheduling cycles to run (default=5)')
+        parser.add_argument('--finish-started', dest='finish_started', action='store_true', default=False,
+                            help='Mark the jobs started by each cycle as successful before the next cycle')
+        parser.add_argument('--output', dest='output', default=None, metavar='PATH',
+                            help='Write the results to PATH instead of stdout')
+        parser.add_argument('--keep', dest='keep', action='store_true', default=False,
+                            help='Keep the generated data instead of rolling it back')
+
+    def seed(self, options):
+        suffix = uuid.uuid4().hex[:8]
+        organization = Organization.objects.create(name='benchmark-{}'.format(suffix))
+
+        instances = []
+        for i in range(options['instance_groups']):
+            ig = InstanceGroup.objects.create(name='benchmark-{}-{}'.format(suffix, i))
+            group_instances = [
+                Instance.objects.create(
+                    uuid=str(uuid.uuid4()),
+                    hostname='benchmark-{}-{}-{}'.format(suffix, i, j),
+                    capacity=options['instance_capacity']
+                ) for j in range(options['instances'])
+            ]
+            ig.instances.add(*group_instances)
+            organization.instance_groups.add(ig)
+            instances.extend((ig, instance) for instance in group_instances)
+
+        projects = []
+        for i in range(options['projects']):
+            project = Project(
+                name='benchmark-{}-{}'.format(suffix, i), organization=organization,
+                scm_type='git', scm_url='https://example.invalid/benchmark.git',
+                scm_update_on_launch=options['update_on_launch'], scm_update_cache_timeout=0
+            )
+            project.save(skip_update=True)
+            projects.append(project)
+
+        inventories = []
+        for i in range(options['inventories']):
+            inventory = Inventory.objects.create(name='benchmark-{}-{}'.format(suffix, i), organization=organization)
+            timestamp = now()
+            Host.objects.bulk_create([
+                Host(name='host-{}'.format(j), inventory=inventory, created=timestamp, modified=timestamp)
+                for j in range(options['hosts'])
+            ])
+            if options['update_on_launch']:
+                InventorySource.objects.create(
+                    name='benchmark-{}-{}'.format(suffix, i), inventory=inventory, source='ec2',
+                    update_on_launch=True, update_cache_timeout=0
+                )
+            inventories.append(inventory)
+
+        if not projects or not inventories:
+            raise CommandError('At least one project and one inventory are required')
+        job_templates = [
+            JobTemplate.objects.create(
+                name='benchmark-{}-{}'.format(suffix, i), project=projects[i % len(projects)],
+                inventory=inventories[i % len(inventories)], playbook='benchmark.yml',
+                allow_simultaneous=True
+            ) for i in range(options['job_templates'])
+        ]
+        if not job_templates:
+            raise CommandError('At least one job template is required')
+
+        def create_job(i, **kwargs):
+            jt = job_templates[i % len(job_templates)]
+            return Job.objects.create(
+                name=jt.name, job_template=jt, project=jt.project, inventory=jt.inventory,
+                playbook=jt.playbook, launch_type='manual', **kwargs
+            )
+
+        for i in range(options['running']):
+            if not instances:
+                raise CommandError('Running jobs require at least one instance')
+            ig, instance = instances[i % len(instances)]
+            create_job(i, status='running', instance_group=ig, execution_node=instance.hostname)
+        for i in range(options['pending']):
+            create_job(i, status='pending')
+
+    def run_cycle(self, options):
+        tm = BenchmarkTaskManager()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            tm.schedule()
+            wall_time = time.time() - started
+        if options['finish_started']:
+            for task in tm.started:
+                task.status = 'successful'
+                task.finished = now()
+                task.save(update_fields=['status', 'finished'])
+        return OrderedDict([
+            ('wall_time', wall_time),
+            ('queries', len(queries)),
+            ('jobs_started', len(tm.started)),
+            ('phases', tm.phases),
+        ])
+
+    def handle(self, *args, **options):
+        # CaptureQueriesContext can only count as many queries as the
+        # connection logs (9000 by default); a large cycle runs more
+        queries_log = connection.queries_log
+        connection.queries_log = deque()
+        try:
+            with transaction.atomic():
+                started = time.time()
+                self.seed(options)
+                seed_time = time.time() - started
+
+                cycles = [self.run_cycle(options) for i in range(options['cycles'])]
+
+                if not options['keep']:
+                    transaction.set_rollback(True)
+        finally:
+            connection.queries_log = queries_log
+
+        results = OrderedDict([
+            ('database', connection.vendor),
+            ('options', dict(
+                (key, options[key]) for key in (
+                    'instance_groups', 'instances', 'instance_capacity', 'projects',
+                    'inventories', 'hosts', 'update_on_launch', 'job_templates',
+                    'pending', 'running', 'cycles', 'finish_started'
+                )
+            )),
+            ('seed_time', seed_time),
+            ('cycles', cycles),
+            ('total', OrderedDict([
+                ('wall_time', sum(c['wall_time'] for c in cycles)),
+                ('queries', sum(c['queries'] for c in cycles)),
+                ('jobs_started', sum(c['jobs_started'] for c in cycles)),
+            ])),
+        ])
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
@@ -59,6 +59,11 @@ class Command(BaseCommand):
         parser.add_argument('--workflow-jobs', default=False,
                             action='store_true', dest='only_workflow_jobs',
                             help='Remove workflow jobs')
+        parser.add_argument('--archived-stdout', default=False,
+                            action='store_true', dest='only_archived_stdout',
+                            help='Clear the stdout of the events of jobs whose '
+                            'stdout has been archived (not done by default; '
+                            'the full output stays available from the archive)')
 
     def cleanup_jobs(self):
         #jobs_qs = Job.objects.exclude(status__in=('pending', 'running'))
@@ -221,6 +226,21 @@ class Command(BaseCommand):
         skipped += Notification.objects.filter(created__gte=self.cutoff).count()
         return skipped, deleted
 
+    def cleanup_archived_stdout(self):
+        skipped, deleted = 0, 0
+        for model in (Job, AdHocCommand, ProjectUpdate, InventoryUpdate, SystemJob):
+            unified_jobs = model.objects.filter(finished__lt=self.cutoff)
+            for unified_job in unified_jobs.filter(stdout_archive__isnull=False).iterator():
+                unified_job_display = '"{}" ({} events)'.format(
+                    str(unified_job), unified_job.get_event_queryset().count())
+                action_text = 'would clear stdout of' if self.dry_run else 'clearing stdout of'
+                self.logger.info('%s %s', action_text, unified_job_display)
+                if not self.dry_run:
+                    unified_job.get_event_queryset().exclude(stdout='').update(stdout='')
+                deleted += 1
+            skipped += unified_jobs.filter(stdout_archive__isnull=True).count()
+        return skipped, deleted
+
     @transaction.atomic
     def handle(self, *args, **options):
         self.verbosity = int(options.get('verbosity', 1))
@@ -233,14 +253,16 @@ class Command(BaseCommand):
             raise CommandError('--days specified is too large. Try something less than 99999 (about 270 years).')
         model_names = ('jobs', 'ad_hoc_commands', 'project_updates', 'inventory_updates',
                        'management_jobs', 'workflow_jobs', 'notifications')
+        # only done when asked for
+        optional_names = ('archived_stdout',)
         models_to_cleanup = set()
-        for m in model_names:
+        for m in model_names + optional_names:
             if options.get('only_%s' % m, False):
                 models_to_cleanup.add(m)
         if not models_to_cleanup:
             models_to_cleanup.update(model_names)
         with disable_activity_stream(), disable_computed_fields():
-            for m in model_names:
+            for m in model_names + optional_names:
                 if m in models_to_cleanup:
                     skipped, deleted = getattr(self, 'cleanup_%s' % m)()
                     if self.dry_run:
@@ -2,6 +2,8 @@
 # All Rights Reserved.
 
 # Python
+import contextlib
+import io
 import json
 import logging
 import fnmatch
@@ -9,6 +11,7 @@ import os
 import re
 import subprocess
 import sys
+import tempfile
 import time
 import traceback
 import shutil
@@ -17,7 +20,12 @@ import shutil
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection, transaction
+from django.db.models import Case, F, When, Value
 from django.utils.encoding import smart_text
+from django.utils.timezone import now
+
+# Django-CRUM
+from crum import get_current_user
 
 # AWX inventory imports
 from awx.main.models.inventory import (
@@ -26,7 +34,7 @@ from awx.main.models.inventory import (
     InventoryUpdate,
     Host
 )
-from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data
+from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data, stream_to_mem_data
 
 # other AWX imports
 from awx.main.models.rbac import batch_role_ancestor_rebuilding
@@ -37,7 +45,7 @@ from awx.main.utils import (
     build_proot_temp_dir,
     get_licenser
 )
-from awx.main.signals import disable_activity_stream
+from awx.main.signals import activity_stream_enabled, disable_activity_stream
 from awx.main.constants import STANDARD_INVENTORY_UPDATE_ENV
 
 logger = logging.getLogger('awx.main.commands.inventory_import')
@@ -157,14 +165,17 @@ class AnsibleInventoryLoader(object):
 
         return wrap_args_with_proot(cmd, cwd, **kwargs)
 
+    def get_command(self, cmd, env):
+        if ((self.is_custom or 'AWX_PRIVATE_DATA_DIR' in env) and
+                getattr(settings, 'AWX_PROOT_ENABLED', False)):
+            cmd = self.get_proot_args(cmd, env)
+        return cmd
+
     def command_to_json(self, cmd):
         data = {}
         stdout, stderr = '', ''
         env = self.build_env()
-
-        if ((self.is_custom or 'AWX_PRIVATE_DATA_DIR' in env) and
-                getattr(settings, 'AWX_PROOT_ENABLED', False)):
-            cmd = self.get_proot_args(cmd, env)
+        cmd = self.get_command(cmd, env)
 
         proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
         stdout, stderr = proc.communicate()
@@ -188,12 +199,59 @@ class AnsibleInventoryLoader(object):
             raise
         return data
 
+    def command_to_mem_data(self, cmd, inventory):
+        '''
+        Like `command_to_json`, but add the output of `cmd` to `inventory`
+        while it is being read (see `stream_to_mem_data`), rather than
+        loading all of it at once.
+        '''
+        env = self.build_env()
+        cmd = self.get_command(cmd, env)
+
+        # stderr goes to a file, so the command can't block writing to it
+        # while stdout is being read
+        with tempfile.TemporaryFile(prefix='awx_inventory_stderr_') as stderr_file:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, env=env)
+            stdout = io.TextIOWrapper(proc.stdout, encoding='utf-8')
+            error = None
+            try:
+                stream_to_mem_data(stdout, inventory=inventory,
+                                   memory_budget=settings.AWX_INVENTORY_HOSTVARS_MEMORY_BUDGET,
+                                   tmp_dir=settings.AWX_PROOT_BASE_PATH)
+            except Exception as e:
+                error = e
+            # anything the parser stopped short of, for the messages below
+            remaining = smart_text(proc.stdout.read(), errors='replace')
+            proc.wait()
+            stdout.close()
+            stderr_file.seek(0)
+            stderr = smart_text(stderr_file.read())
+
+        if self.tmp_private_dir:
+            shutil.rmtree(self.tmp_private_dir, True)
+        if proc.returncode != 0:
+            raise RuntimeError('%s failed (rc=%d) with stdout:\n%s\nstderr:\n%s' % (
+                self.method, proc.returncode, remaining, stderr))
+
+        for line in stderr.splitlines():
+            logger.error(line)
+        if error is not None:
+            logger.error('Failed to load JSON (%s), the rest of it was: %s', error, remaining)
+            raise error
+        return inventory
+
     def load(self):
         base_args = self.get_base_args()
         logger.info('Reading Ansible inventory source: %s', self.source)
 
         return self.command_to_json(base_args + ['--list'])
 
+    def load_into(self, inventory):
+        base_args = self.get_base_args()
+        logger.info('Reading Ansible inventory source: %s', self.source)
+
+        return self.command_to_mem_data(base_args + ['--list'], inventory)
+
 
 class Command(BaseCommand):
     '''
@@ -661,66 +719,117 @@ class Command(BaseCommand):
                            len(connection.queries) - queries_before,
                            len(self.all_group.all_groups))
 
-    def _update_db_host_from_mem_host(self, db_host, mem_host):
-        # Update host variables.
-        db_variables = db_host.variables_dict
-        if self.overwrite_vars:
-            db_variables = mem_host.variables
-        else:
-            db_variables.update(mem_host.variables)
-        update_fields = []
-        if db_variables != db_host.variables_dict:
-            db_host.variables = json.dumps(db_variables)
-            update_fields.append('variables')
+    def _get_host_updates(self, db_host, mem_host):
+        '''
+        Return a dict of the fields of db_host that differ from the imported
+        mem_host, mapped to their new values.
+        '''
+        updates = {}
+        # mem_host.variables is rebuilt from the HostVarsStore on every access
+        variables = mem_host.variables
+        # Update host variables.  When the stored variables are exactly what
+        # this import would write (i.e., nothing changed since the last
+        # import), there's no need to parse and compare them.
+        mem_variables = json.dumps(variables)
+        if db_host.variables != mem_variables:
+            db_variables = db_host.variables_dict
+            if self.overwrite_vars:
+                db_variables = variables
+            else:
+                db_variables.update(variables)
+            if db_variables != db_host.variables_dict:
+                updates['variables'] = json.dumps(db_variables)
         # Update host enabled flag.
-        enabled = self._get_enabled(mem_host.variables)
+        enabled = self._get_enabled(variables)
         if enabled is not None and db_host.enabled != enabled:
-            db_host.enabled = enabled
-            update_fields.append('enabled')
+            updates['enabled'] = enabled
         # Update host name.
         if mem_host.name != db_host.name:
-            old_name = db_host.name
-            db_host.name = mem_host.name
-            update_fields.append('name')
+            updates['name'] = mem_host.name
         # Update host instance_id.
-        instance_id = self._get_instance_id(mem_host.variables)
+        instance_id = self._get_instance_id(variables)
         if instance_id != db_host.instance_id:
-            old_instance_id = db_host.instance_id
-            db_host.instance_id = instance_id
-            update_fields.append('instance_id')
-        # Update host and display message(s) on what changed.
-        if update_fields:
-            db_host.save(update_fields=update_fields)
-        if 'name' in update_fields:
-            logger.debug('Host renamed from "%s" to "%s"', old_name, mem_host.name)
-        if 'instance_id' in update_fields:
-            if old_instance_id:
+            updates['instance_id'] = instance_id
+        return updates
+
+    def _log_host_updates(self, db_host, mem_host, updates):
+        '''
+        Display message(s) on what changed; db_host holds the old values.
+        '''
+        if 'name' in updates:
+            logger.debug('Host renamed from "%s" to "%s"', db_host.name, mem_host.name)
+        if 'instance_id' in updates:
+            if db_host.instance_id:
                 logger.debug('Host "%s" instance_id updated', mem_host.name)
             else:
                 logger.debug('Host "%s" instance_id added', mem_host.name)
-        if 'variables' in update_fields:
+        if 'variables' in updates:
             if self.overwrite_vars:
                 logger.debug('Host "%s" variables replaced', mem_host.name)
             else:
                 logger.debug('Host "%s" variables updated', mem_host.name)
         else:
             logger.debug('Host "%s" variables unmodified', mem_host.name)
-        if 'enabled' in update_fields:
-            if enabled:
+        if 'enabled' in updates:
+            if updates['enabled']:
                 logger.debug('Host "%s" is now enabled', mem_host.name)
             else:
                 logger.debug('Host "%s" is now disabled', mem_host.name)
+
+    def _update_db_host_from_mem_host(self, db_host, mem_host):
+        updates = self._get_host_updates(db_host, mem_host)
+        self._log_host_updates(db_host, mem_host, updates)
+        if updates:
+            for field, value in updates.items():
+                setattr(db_host, field, value)
+            db_host.save(update_fields=list(updates.keys()))
         self._batch_add_m2m(self.inventory_source.hosts, db_host)
 
+    def _new_host_attrs(self, mem_host):
+        variables = mem_host.variables
+        host_attrs = dict(variables=json.dumps(variables),
+                          description='imported')
+        enabled = self._get_enabled(variables)
+        if enabled is not None:
+            host_attrs['enabled'] = enabled
+        if self.instance_id_var:
+            instance_id = self._get_instance_id(variables)
+            host_attrs['instance_id'] = instance_id
+        return host_attrs
+
     def _create_update_hosts(self):
         '''
         For each host in the local list, create it if it doesn't exist in the
         database.  Otherwise, update/replace database variables from the
         imported data.  Associate with the inventory source group if importing
         from cloud inventory source.
+
+        Unless the activity stream is recording this import (which needs
+        every change to be saved individually), changed hosts are written
+        with one UPDATE per batch, new hosts with bulk INSERTs, and their
+        associations with the inventory source in bulk; no signals are sent.
         '''
         if settings.SQL_DEBUG:
             queries_before = len(connection.queries)
+        bulk = not activity_stream_enabled
+        hosts_qs = self.inventory.hosts.all()
+        host_updates = {}
+        host_pks_unchanged = []
+        if bulk:
+            hosts_qs = hosts_qs.only('pk', 'name', 'instance_id', 'enabled', 'variables')
+
+        def update_host(db_host, mem_host):
+            if not bulk:
+                self._update_db_host_from_mem_host(db_host, mem_host)
+                return
+            updates = self._get_host_updates(db_host, mem_host)
+            self._log_host_updates(db_host, mem_host, updates)
+            if updates:
+                host_updates[db_host.pk] = updates
+            else:
+                host_pks_unchanged.append(db_host.pk)
+
+        started = time.time()
         host_pks_updated = set()
         mem_host_pk_map = {}
         mem_host_instance_id_map = {}
@@ -728,7 +837,8 @@ class Command(BaseCommand):
         mem_host_names_to_update = set(self.all_group.all_hosts.keys())
         for k,v in self.all_group.all_hosts.items():
             mem_host_name_map[k] = v
-            instance_id = self._get_instance_id(v.variables)
+            # only decode the variables if there is an instance ID to find
+            instance_id = self._get_instance_id(v.variables) if self.instance_id_var else ''
             if instance_id in self.db_instance_id_map:
                 mem_host_pk_map[self.db_instance_id_map[instance_id]] = v
             elif instance_id:
@@ -738,11 +848,11 @@ class Command(BaseCommand):
         all_host_pks = sorted(mem_host_pk_map.keys())
         for offset in range(0, len(all_host_pks), self._batch_size):
             host_pks = all_host_pks[offset:(offset + self._batch_size)]
-            for db_host in self.inventory.hosts.filter( pk__in=host_pks):
+            for db_host in hosts_qs.filter( pk__in=host_pks):
                 if db_host.pk in host_pks_updated:
                     continue
                 mem_host = mem_host_pk_map[db_host.pk]
-                self._update_db_host_from_mem_host(db_host, mem_host)
+                update_host(db_host, mem_host)
                 host_pks_updated.add(db_host.pk)
                 mem_host_names_to_update.discard(mem_host.name)
 
@@ -750,11 +860,11 @@ class Command(BaseCommand):
         all_instance_ids = sorted(mem_host_instance_id_map.keys())
         for offset in range(0, len(all_instance_ids), self._batch_size):
             instance_ids = all_instance_ids[offset:(offset + self._batch_size)]
-            for db_host in self.inventory.hosts.filter( instance_id__in=instance_ids):
+            for db_host in hosts_qs.filter( instance_id__in=instance_ids):
                 if db_host.pk in host_pks_updated:
                     continue
                 mem_host = mem_host_instance_id_map[db_host.instance_id]
-                self._update_db_host_from_mem_host(db_host, mem_host)
+                update_host(db_host, mem_host)
                 host_pks_updated.add(db_host.pk)
                 mem_host_names_to_update.discard(mem_host.name)
 
@@ -762,39 +872,114 @@ class Command(BaseCommand):
         all_host_names = sorted(mem_host_name_map.keys())
         for offset in range(0, len(all_host_names), self._batch_size):
             host_names = all_host_names[offset:(offset + self._batch_size)]
-            for db_host in self.inventory.hosts.filter( name__in=host_names):
+            for db_host in hosts_qs.filter( name__in=host_names):
                 if db_host.pk in host_pks_updated:
                     continue
                 mem_host = mem_host_name_map[db_host.name]
-                self._update_db_host_from_mem_host(db_host, mem_host)
+                update_host(db_host, mem_host)
                 host_pks_updated.add(db_host.pk)
                 mem_host_names_to_update.discard(mem_host.name)
 
-        # Create any new hosts.
-        for mem_host_name in sorted(mem_host_names_to_update):
-            mem_host = self.all_group.all_hosts[mem_host_name]
-            host_attrs = dict(variables=json.dumps(mem_host.variables),
-                              description='imported')
-            enabled = self._get_enabled(mem_host.variables)
-            if enabled is not None:
-                host_attrs['enabled'] = enabled
-            if self.instance_id_var:
-                instance_id = self._get_instance_id(mem_host.variables)
-                host_attrs['instance_id'] = instance_id
-            db_host = self.inventory.hosts.update_or_create(name=mem_host_name, defaults=host_attrs)[0]
-            if enabled is False:
-                logger.debug('Host "%s" added (disabled)', mem_host_name)
-            else:
-                logger.debug('Host "%s" added', mem_host_name)
-            self._batch_add_m2m(self.inventory_source.hosts, db_host)
+        if bulk:
+            compared = time.time()
+            self._bulk_update_hosts(host_updates)
+            updated = time.time()
+            new_host_pks = self._bulk_create_hosts(sorted(mem_host_names_to_update))
+            created = time.time()
+            self._bulk_add_inventory_source_hosts(host_pks_unchanged + sorted(host_updates.keys()) + new_host_pks)
+            if host_updates or new_host_pks:
+                # what Host.save() would have done for each of them
+                self.inventory._update_smart_inventories_of_hosts()
+            logger.info('Hosts: %d unchanged, %d updated, %d added (compare %0.3fs, update %0.3fs, '
+                        'add %0.3fs, associate with source %0.3fs)',
+                        len(host_pks_unchanged), len(host_updates), len(new_host_pks),
+                        compared - started, updated - compared, created - updated, time.time() - created)
+        else:
+            # Create any new hosts.
+            for mem_host_name in sorted(mem_host_names_to_update):
+                mem_host = self.all_group.all_hosts[mem_host_name]
+                host_attrs = self._new_host_attrs(mem_host)
+                db_host = self.inventory.hosts.update_or_create(name=mem_host_name, defaults=host_attrs)[0]
+                if host_attrs.get('enabled') is False:
+                    logger.debug('Host "%s" added (disabled)', mem_host_name)
+                else:
+                    logger.debug('Host "%s" added', mem_host_name)
+                self._batch_add_m2m(self.inventory_source.hosts, db_host)
 
-        self._batch_add_m2m(self.inventory_source.hosts, flush=True)
+            self._batch_add_m2m(self.inventory_source.hosts, flush=True)
 
         if settings.SQL_DEBUG:
             logger.warning('host updates took %d queries for %d hosts',
                            len(connection.queries) - queries_before,
                            len(self.all_group.all_hosts))
 
+    def _get_current_user(self):
+        # the user that PrimordialModel.save() would record
+        user = get_current_user()
+        if user and not user.id:
+            user = None
+        return user
+
+    def _bulk_update_hosts(self, host_updates):
+        '''
+        Apply {host pk: {field: new value}} with one UPDATE per batch of
+        hosts.
+        '''
+        user = self._get_current_user()
+        host_pks = sorted(host_updates.keys())
+        for offset in range(0, len(host_pks), self._batch_size):
+            batch = host_pks[offset:(offset + self._batch_size)]
+            fields = set()
+            for pk in batch:
+                fields.update(host_updates[pk].keys())
+            values = dict(modified=now(), modified_by=user)
+            for field in fields:
+                values[field] = Case(
+                    *[When(pk=pk, then=Value(host_updates[pk][field])) for pk in batch if field in host_updates[pk]],
+                    default=F(field),
+                    output_field=Host._meta.get_field(field).__class__()
+                )
+            Host.objects.filter(pk__in=batch).update(**values)
+
+    def _bulk_create_hosts(self, mem_host_names):
+        '''
+        INSERT the given imported hosts in batches; returns their pks.
+        '''
+        user = self._get_current_user()
+        host_pks = []
+        for offset in range(0, len(mem_host_names), self._batch_size):
+            batch = mem_host_names[offset:(offset + self._batch_size)]
+            timestamp = now()
+            db_hosts = []
+            for mem_host_name in batch:
+                mem_host = self.all_group.all_hosts[mem_host_name]
+                host_attrs = self._new_host_attrs(mem_host)
+                db_hosts.append(Host(
+                    inventory=self.inventory, name=mem_host_name,
+                    created=timestamp, modified=timestamp,
+                    created_by=user, modified_by=user,
+                    **host_attrs
+                ))
+                if host_attrs.get('enabled') is False:
+                    logger.debug('Host "%s" added (disabled)', mem_host_name)
+                else:
+                    logger.debug('Host "%s" added', mem_host_name)
+            Host.objects.bulk_create(db_hosts)
+            host_pks.extend(self.inventory.hosts.filter(name__in=batch).values_list('pk', flat=True))
+        return host_pks
+
+    def _bulk_add_inventory_source_hosts(self, host_pks):
+        through = Host.inventory_sources.through
+        source_id = self.inventory_source.pk
+        for offset in range(0, len(host_pks), self._batch_size):
+            batch = host_pks[offset:(offset + self._batch_size)]
+            existing = set(through.objects.filter(
+                inventorysource_id=source_id, host_id__in=batch
+            ).values_list('host_id', flat=True))
+            through.objects.bulk_create([
+                through(inventorysource_id=source_id, host_id=pk) for pk in batch if pk not in existing
+            ])
+
     @transaction.atomic
     def _create_update_group_children(self):
         '''
@@ -867,17 +1052,32 @@ class Command(BaseCommand):
         # FIXME: Attribute changes to superuser?
         # Perform __in queries in batches (mainly for unit tests using SQLite).
         self._batch_size = 500
-        self._build_db_instance_id_map()
-        self._build_mem_instance_id_map()
+        with self._timed_phase('build instance id maps'):
+            self._build_db_instance_id_map()
+            self._build_mem_instance_id_map()
         if self.overwrite:
-            self._delete_hosts()
-            self._delete_groups()
-            self._delete_group_children_and_hosts()
-        self._update_inventory()
-        self._create_update_groups()
-        self._create_update_hosts()
-        self._create_update_group_children()
-        self._create_update_group_hosts()
+            with self._timed_phase('delete hosts'):
+                self._delete_hosts()
+            with self._timed_phase('delete groups'):
+                self._delete_groups()
+            with self._timed_phase('delete group memberships'):
+                self._delete_group_children_and_hosts()
+        with self._timed_phase('update inventory'):
+            self._update_inventory()
+        with self._timed_phase('create/update groups'):
+            self._create_update_groups()
+        with self._timed_phase('create/update hosts'):
+            self._create_update_hosts()
+        with self._timed_phase('update group children'):
+            self._create_update_group_children()
+        with self._timed_phase('update group hosts'):
+            self._create_update_group_hosts()
+
+    @contextlib.contextmanager
+    def _timed_phase(self, name):
+        started = time.time()
+        yield
+        logger.info('Inventory import phase "%s" took %0.3fs', name, time.time() - started)
 
     def check_license(self):
         license_info = get_licenser().validate()
@@ -976,15 +1176,20 @@ class Command(BaseCommand):
 
             source = self.get_source_absolute_path(self.source)
 
-            data = AnsibleInventoryLoader(source=source, is_custom=self.is_custom, venv_path=venv_path).load()
-
-            logger.debug('Finished loading from source: %s', source)
-            logger.info('Processing JSON output...')
+            loader = AnsibleInventoryLoader(source=source, is_custom=self.is_custom, venv_path=venv_path)
             inventory = MemInventory(
                 group_filter_re=self.group_filter_re, host_filter_re=self.host_filter_re)
-            inventory = dict_to_mem_data(data, inventory=inventory)
+            if settings.AWX_INVENTORY_IMPORT_STREAMING:
+                inventory = loader.load_into(inventory)
+                logger.debug('Finished loading from source: %s', source)
+            else:
+                data = loader.load()
+
+                logger.debug('Finished loading from source: %s', source)
+                logger.info('Processing JSON output...')
+                inventory = dict_to_mem_data(data, inventory=inventory)
 
-            del data  # forget dict from import, could be large
+                del data  # forget dict from import, could be large
 
             logger.info('Loaded %d groups, %d hosts', len(inventory.all_group.all_groups),
                         len(inventory.all_group.all_hosts))
@@ -1024,7 +1229,8 @@ class Command(BaseCommand):
                                     self.load_into_database()
                             if settings.SQL_DEBUG:
                                 queries_before2 = len(connection.queries)
-                            self.inventory.update_computed_fields()
+                            with self._timed_phase('update computed fields'):
+                                self.inventory.update_computed_fields()
                             if settings.SQL_DEBUG:
                                 logger.warning('update computed fields took %d queries',
                                                len(connection.queries) - queries_before2)
@@ -1,10 +1,14 @@
 # Copyright (c) 2015 Ansible, Inc.
 # All Rights Reserved
 
+# Python
+import psutil
+
 # Django
 from django.core.management.base import BaseCommand
 
 # AWX
+from awx.main.dispatch.publish import publisher
 from awx.main.models import UnifiedJob
 
 
@@ -26,8 +30,14 @@ class Command(BaseCommand):
     def job_stats(self, state):
         return UnifiedJob.objects.filter(status=state).count()
 
+    def publisher_stats(self):
+        # web and dispatcher processes record their stats keyed by pid
+        return publisher.debug(psutil.pids())
+
     def handle(self, *args, **options):
         if options['stat'].startswith("jobs_"):
             self.stdout.write(str(self.job_stats(options['stat'][5:])))
+        elif options['stat'] == 'publisher':
+            self.stdout.write(self.publisher_stats())
         else:
-            self.stdout.write("Supported stats:  jobs_{state}")
+            self.stdout.write("Supported stats:  jobs_{state}, publisher")
@@ -174,7 +174,7 @@ class InstanceGroupManager(models.Manager):
             self.zero_out_group(graph, group_name, breakdown)
         for t in tasks:
             # TODO: dock capacity for isolated job management tasks running in queue
-            impact = t.task_impact
+            impact = t.get_task_impact()
             if t.status == 'waiting' or not t.execution_node:
                 # Subtract capacity from any peer groups that share instances
                 if not t.instance_group:
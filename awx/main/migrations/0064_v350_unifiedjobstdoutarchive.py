@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import awx.main.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0063_v350_unifiedjob_task_impact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnifiedJobStdoutArchive',
+            fields=[
+                ('unified_job', models.OneToOneField(editable=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stdout_archive', serialize=False, to='main.UnifiedJob')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('lines', models.PositiveIntegerField(default=0, editable=False)),
+                ('size', models.BigIntegerField(default=0, editable=False, help_text='Uncompressed size of the archived stdout, in bytes.')),
+                ('block_index', awx.main.fields.JSONField(blank=True, default=list, editable=False)),
+                ('data', models.BinaryField(editable=False)),
+            ],
+        ),
+    ]
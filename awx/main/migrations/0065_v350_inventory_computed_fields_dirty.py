@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0064_v350_unifiedjobstdoutarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='computed_fields_dirty',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Parts of the computed fields of this inventory that are waiting to be recomputed.'),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='computed_fields_dirty_since',
+            field=models.DateTimeField(default=None, editable=False, help_text='When the computed fields of this inventory started waiting to be recomputed.', null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+import awx.main.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0065_v350_inventory_computed_fields_dirty'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='fact_cache_stats',
+            field=awx.main.fields.JSONField(blank=True, default={}, editable=False, help_text="How many hosts' cached facts were written before, and saved after, the playbook run, and how long each took."),
+        ),
+    ]
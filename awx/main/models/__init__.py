@@ -10,7 +10,7 @@ from awx.main.models.base import (  # noqa
     BaseModel, PrimordialModel, prevent_search, CLOUD_INVENTORY_SOURCES, VERBOSITY_CHOICES
 )
 from awx.main.models.unified_jobs import (  # noqa
-    UnifiedJob, UnifiedJobTemplate, StdoutMaxBytesExceeded
+    UnifiedJob, UnifiedJobTemplate, UnifiedJobStdoutArchive, StdoutMaxBytesExceeded
 )
 from awx.main.models.organization import (  # noqa
     Organization, Profile, Team, UserSessionMembership
@@ -1,12 +1,13 @@
 import datetime
 import logging
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from django.conf import settings
-from django.db import models, DatabaseError
+from django.db import models, DatabaseError, connection
+from django.db.models.signals import post_save
 from django.utils.dateparse import parse_datetime
 from django.utils.text import Truncator
-from django.utils.timezone import utc
+from django.utils.timezone import utc, now
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import force_text
 
@@ -55,6 +56,51 @@ def create_host_status_counts(event_data):
     return dict(host_status_counts)
 
 
+def bulk_save_events(cls, events, parent_rollup=None, host_cache=None):
+    '''
+    Persist a list of unsaved events of type `cls` (built with
+    `cls.build_from_data`) using a single multi-row INSERT.
+
+    The field and related object updates normally performed by `save()` are
+    applied to each event, in order, and `post_save` is sent for each event
+    so that websocket notifications are still emitted.
+
+    If `parent_rollup` is specified, the changed/failed flags that job events
+    propagate to their parent are handed to `parent_rollup.record(event)`
+    instead of being written with an UPDATE per event.
+
+    If `host_cache` (a `JobHostCache`) is specified, job event host names are
+    resolved to host ids from the cache instead of the database.
+    '''
+    if not events:
+        return events
+    for event in events:
+        if parent_rollup is not None:
+            event.parent_rollup = parent_rollup
+        if host_cache is not None:
+            event.host_cache = host_cache
+    if not connection.features.can_return_ids_from_bulk_insert:
+        # related object updates and websocket notifications need the pk of
+        # each event, so fall back to saving one at a time
+        for event in events:
+            event.save()
+        return events
+
+    timestamp = now()
+    for event in events:
+        event._update_fields_before_save()
+        if not event.created:
+            event.created = timestamp
+        event.modified = timestamp
+    cls.objects.bulk_create(events)
+    for event in events:
+        event._update_related_objects()
+        post_save.send(sender=cls, instance=event, created=True)
+        if isinstance(event, BasePlaybookEvent):
+            analytics_logger.info('Event data saved.', extra=dict(python_objects=dict(job_event=event)))
+    return events
+
+
 class BasePlaybookEvent(CreatedModifiedModel):
     '''
     An event/message logged from a playbook callback for each host.
@@ -293,14 +339,14 @@ class BasePlaybookEvent(CreatedModifiedModel):
         return updated_fields
 
     @classmethod
-    def create_from_data(cls, **kwargs):
+    def _sanitize_data(cls, kwargs):
         pk = None
         for key in ('job_id', 'project_update_id'):
             if key in kwargs:
                 pk = key
         if pk is None:
             # payload must contain either a job_id or a project_update_id
-            return
+            return None
 
         # Convert the datetime for the job event's creation appropriately,
         # and include a time zone for it.
@@ -316,14 +362,77 @@ class BasePlaybookEvent(CreatedModifiedModel):
             kwargs.pop('created', None)
 
         sanitize_event_keys(kwargs, cls.VALID_KEYS)
+        return kwargs
+
+    @classmethod
+    def create_from_data(cls, **kwargs):
+        kwargs = cls._sanitize_data(kwargs)
+        if kwargs is None:
+            return
         job_event = cls.objects.create(**kwargs)
         analytics_logger.info('Event data saved.', extra=dict(python_objects=dict(job_event=job_event)))
         return job_event
 
+    @classmethod
+    def build_from_data(cls, **kwargs):
+        '''
+        Like create_from_data, but return an unsaved event suitable for
+        persisting in batches with bulk_save_events.
+        '''
+        kwargs = cls._sanitize_data(kwargs)
+        if kwargs is None:
+            return
+        return cls(**kwargs)
+
     @property
     def job_verbosity(self):
         return 0
 
+    def _update_fields_before_save(self):
+        # Update model fields from event data.
+        updated_fields = self._update_from_event_data()
+
+        # Update host related field from host_name.  (Events built by
+        # build_from_data only have a job_id; hasattr(self, 'job') would
+        # load the job.)
+        if getattr(self, 'job_id', None) and not self.host_id and self.host_name:
+            host_cache = getattr(self, 'host_cache', None)
+            if host_cache is not None:
+                host_id = host_cache.get(self.job_id)['hosts'].get(self.host_name)
+            else:
+                host_qs = self.job.inventory.hosts.filter(name=self.host_name)
+                host_id = host_qs.only('id').values_list('id', flat=True).first()
+            if host_id != self.host_id:
+                self.host_id = host_id
+                updated_fields.add('host_id')
+        return updated_fields
+
+    def _update_related_objects(self):
+        # Update related objects after this event is saved.
+        if not getattr(self, 'job_id', None):
+            return
+        if getattr(settings, 'CAPTURE_JOB_EVENT_HOSTS', False):
+            self._update_hosts()
+        parent_rollup = getattr(self, 'parent_rollup', None)
+        if parent_rollup is not None:
+            parent_rollup.record(self)
+        elif self.parent_uuid:
+            kwargs = {}
+            if self.changed is True:
+                kwargs['changed'] = True
+            if self.failed is True:
+                kwargs['failed'] = True
+            if kwargs:
+                JobEvent.objects.filter(job_id=self.job_id, uuid=self.parent_uuid).update(**kwargs)
+
+        if self.event == 'playbook_on_stats':
+            hostnames = self._hostnames()
+            self._update_host_summary_from_stats(hostnames)
+            try:
+                self.job.inventory.update_computed_fields()
+            except DatabaseError:
+                logger.exception('Computed fields database error saving event {}'.format(self.pk))
+
     def save(self, *args, **kwargs):
         # If update_fields has been specified, add our field names to it,
         # if it hasn't been specified, then we're just doing a normal save.
@@ -332,42 +441,13 @@ class BasePlaybookEvent(CreatedModifiedModel):
         # failed/changed flags triggered from a child event.
         from_parent_update = kwargs.pop('from_parent_update', False)
         if not from_parent_update:
-            # Update model fields from event data.
-            updated_fields = self._update_from_event_data()
-            for field in updated_fields:
+            for field in self._update_fields_before_save():
                 if field not in update_fields:
                     update_fields.append(field)
-
-            # Update host related field from host_name.
-            if hasattr(self, 'job') and not self.host_id and self.host_name:
-                host_qs = self.job.inventory.hosts.filter(name=self.host_name)
-                host_id = host_qs.only('id').values_list('id', flat=True).first()
-                if host_id != self.host_id:
-                    self.host_id = host_id
-                    if 'host_id' not in update_fields:
-                        update_fields.append('host_id')
         super(BasePlaybookEvent, self).save(*args, **kwargs)
 
-        # Update related objects after this event is saved.
-        if hasattr(self, 'job') and not from_parent_update:
-            if getattr(settings, 'CAPTURE_JOB_EVENT_HOSTS', False):
-                self._update_hosts()
-            if self.parent_uuid:
-                kwargs = {}
-                if self.changed is True:
-                    kwargs['changed'] = True
-                if self.failed is True:
-                    kwargs['failed'] = True
-                if kwargs:
-                    JobEvent.objects.filter(job_id=self.job_id, uuid=self.parent_uuid).update(**kwargs)
-
-            if self.event == 'playbook_on_stats':
-                hostnames = self._hostnames()
-                self._update_host_summary_from_stats(hostnames)
-                try:
-                    self.job.inventory.update_computed_fields()
-                except DatabaseError:
-                    logger.exception('Computed fields database error saving event {}'.format(self.pk))
+        if not from_parent_update:
+            self._update_related_objects()
 
 
 
@@ -476,11 +556,10 @@ class JobEvent(BasePlaybookEvent):
 
     def _update_host_summary_from_stats(self, hostnames):
         with ignore_inventory_computed_fields():
-            if not self.job or not self.job.inventory:
+            if not self.job or not self.job.inventory_id:
                 logger.info('Event {} missing job or inventory, host summaries not updated'.format(self.pk))
                 return
-            qs = self.job.inventory.hosts.filter(name__in=hostnames)
-            job = self.job
+            stats_by_host = {}
             for host in hostnames:
                 host_stats = {}
                 for stat in ('changed', 'dark', 'failures', 'ignored', 'ok', 'processed', 'rescued', 'skipped'):
@@ -488,26 +567,133 @@ class JobEvent(BasePlaybookEvent):
                         host_stats[stat] = self.event_data.get(stat, {}).get(host, 0)
                     except AttributeError:  # in case event_data[stat] isn't a dict.
                         pass
-                if qs.filter(name=host).exists():
-                    host_actual = qs.get(name=host)
-                    host_summary, created = job.job_host_summaries.get_or_create(host=host_actual, host_name=host_actual.name, defaults=host_stats)
-                else:
-                    host_summary, created = job.job_host_summaries.get_or_create(host_name=host, defaults=host_stats)
-
-                if not created:
-                    update_fields = []
-                    for stat, value in host_stats.items():
-                        if getattr(host_summary, stat) != value:
-                            setattr(host_summary, stat, value)
-                            update_fields.append(stat)
-                    if update_fields:
-                        host_summary.save(update_fields=update_fields)
+                stats_by_host[host] = host_stats
+
+            host_cache = getattr(self, 'host_cache', None)
+            if host_cache is not None:
+                inventory_hosts = host_cache.get(self.job_id)['hosts']
+            else:
+                inventory_hosts = dict(self.job.inventory.hosts.values_list('name', 'id'))
+            host_ids = dict(
+                (host, inventory_hosts[host])
+                for host in hostnames if host in inventory_hosts
+            )
+            self.job.job_host_summaries.model.bulk_update_from_stats(
+                self.job, stats_by_host, host_ids
+            )
 
     @property
     def job_verbosity(self):
+        host_cache = getattr(self, 'host_cache', None)
+        if host_cache is not None:
+            return host_cache.get(self.job_id)['verbosity']
         return self.job.verbosity
 
 
+class ParentEventRollup(object):
+    '''
+    Tracks, in memory, the changed/failed flags that job events propagate to
+    their parent event (runner events -> task, tasks -> play, and so on).
+
+    Rather than issuing an UPDATE against the parent row for every changed or
+    failed child, flags are aggregated per parent and written when a new
+    playbook, play or task starts, at `playbook_on_stats`, or when `write()`
+    is called for the job (e.g., on EOF).  Children that arrive after their
+    parent was written (e.g., with the `free` strategy) are simply written
+    again with the next batch.
+    '''
+
+    WRITE_ON_EVENTS = (
+        'playbook_on_start', 'playbook_on_play_start',
+        'playbook_on_task_start', 'playbook_on_stats',
+    )
+
+    def __init__(self):
+        # job_id -> {parent_uuid: set(['changed', 'failed'])}
+        self.pending = {}
+
+    def __len__(self):
+        return sum(len(parents) for parents in self.pending.values())
+
+    def record(self, event):
+        if event.event in self.WRITE_ON_EVENTS:
+            self.write(event.job_id)
+        if not event.parent_uuid:
+            return
+        flags = set()
+        if event.changed is True:
+            flags.add('changed')
+        if event.failed is True:
+            flags.add('failed')
+        if flags:
+            parents = self.pending.setdefault(event.job_id, {})
+            parents.setdefault(event.parent_uuid, set()).update(flags)
+
+    def write(self, job_id):
+        parents = self.pending.pop(job_id, None)
+        if not parents:
+            return
+        uuids_by_flags = defaultdict(list)
+        for uuid, flags in parents.items():
+            uuids_by_flags[frozenset(flags)].append(uuid)
+        for flags, uuids in uuids_by_flags.items():
+            JobEvent.objects.filter(job_id=job_id, uuid__in=uuids).update(
+                **dict((flag, True) for flag in flags)
+            )
+
+    def write_all(self):
+        for job_id in list(self.pending.keys()):
+            self.write(job_id)
+
+
+class JobHostCache(object):
+    '''
+    A bounded, least-recently-used map of job id -> the job's inventory id,
+    verbosity, and {host name: host id} for the job's inventory.
+
+    The first lookup for a job loads all of its inventory's host names in
+    a single query; subsequent lookups for the job's events don't touch the
+    database.  Entries should be evicted when the job's EOF is received.
+    '''
+
+    def __init__(self, max_jobs=None):
+        self.max_jobs = max_jobs or settings.JOB_EVENT_HOST_CACHE_SIZE
+        self.jobs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def get(self, job_id):
+        entry = self.jobs.pop(job_id, None)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = self._load(job_id)
+            while len(self.jobs) >= self.max_jobs:
+                self.jobs.popitem(last=False)
+        # (re)insert as the most recently used job
+        self.jobs[job_id] = entry
+        return entry
+
+    def evict(self, job_id):
+        self.jobs.pop(job_id, None)
+
+    def _load(self, job_id):
+        from awx.main.models import Host, Job
+        entry = dict(inventory_id=None, verbosity=0, hosts={})
+        job = Job.objects.filter(pk=job_id).values('inventory_id', 'verbosity').first()
+        if job is not None:
+            entry.update(job)
+            if job['inventory_id'] is not None:
+                entry['hosts'] = dict(
+                    Host.objects.filter(inventory_id=job['inventory_id']).values_list('name', 'id')
+                )
+        return entry
+
+
 class ProjectUpdateEvent(BasePlaybookEvent):
 
     VALID_KEYS = BasePlaybookEvent.VALID_KEYS + ['project_update_id']
@@ -581,7 +767,7 @@ class BaseCommandEvent(CreatedModifiedModel):
         return u'%s @ %s' % (self.get_event_display(), self.created.isoformat())
 
     @classmethod
-    def create_from_data(cls, **kwargs):
+    def _sanitize_data(cls, kwargs):
         # Convert the datetime for the event's creation
         # appropriately, and include a time zone for it.
         #
@@ -596,7 +782,34 @@ class BaseCommandEvent(CreatedModifiedModel):
             kwargs.pop('created', None)
 
         sanitize_event_keys(kwargs, cls.VALID_KEYS)
-        return cls.objects.create(**kwargs)
+        return kwargs
+
+    @classmethod
+    def create_from_data(cls, **kwargs):
+        return cls.objects.create(**cls._sanitize_data(kwargs))
+
+    @classmethod
+    def build_from_data(cls, **kwargs):
+        '''
+        Like create_from_data, but return an unsaved event suitable for
+        persisting in batches with bulk_save_events.
+        '''
+        return cls(**cls._sanitize_data(kwargs))
+
+    def _update_fields_before_save(self):
+        return set()
+
+    def _update_related_objects(self):
+        pass
+
+    def save(self, *args, **kwargs):
+        # If update_fields has been specified, add our field names to it,
+        # if it hasn't been specified, then we're just doing a normal save.
+        update_fields = kwargs.get('update_fields', [])
+        for field in self._update_fields_before_save():
+            if field not in update_fields:
+                update_fields.append(field)
+        super(BaseCommandEvent, self).save(*args, **kwargs)
 
     def get_event_display(self):
         '''
@@ -686,34 +899,28 @@ class AdHocCommandEvent(BaseCommandEvent):
     def get_absolute_url(self, request=None):
         return reverse('api:ad_hoc_command_event_detail', kwargs={'pk': self.pk}, request=request)
 
-    def save(self, *args, **kwargs):
-        # If update_fields has been specified, add our field names to it,
-        # if it hasn't been specified, then we're just doing a normal save.
-        update_fields = kwargs.get('update_fields', [])
+    def _update_fields_before_save(self):
+        updated_fields = set()
         res = self.event_data.get('res', None)
         if self.event in self.FAILED_EVENTS:
             if not self.event_data.get('ignore_errors', False):
                 self.failed = True
-                if 'failed' not in update_fields:
-                    update_fields.append('failed')
+                updated_fields.add('failed')
         if isinstance(res, dict) and res.get('changed', False):
             self.changed = True
-            if 'changed' not in update_fields:
-                update_fields.append('changed')
+            updated_fields.add('changed')
         self.host_name = self.event_data.get('host', '').strip()
-        if 'host_name' not in update_fields:
-            update_fields.append('host_name')
+        updated_fields.add('host_name')
         if not self.host_id and self.host_name:
             host_qs = self.ad_hoc_command.inventory.hosts.filter(name=self.host_name)
             try:
                 host_id = host_qs.only('id').values_list('id', flat=True)
                 if host_id.exists():
                     self.host_id = host_id[0]
-                    if 'host_id' not in update_fields:
-                        update_fields.append('host_id')
+                    updated_fields.add('host_id')
             except (IndexError, AttributeError):
                 pass
-        super(AdHocCommandEvent, self).save(*args, **kwargs)
+        return updated_fields
 
 
 class InventoryUpdateEvent(BaseCommandEvent):
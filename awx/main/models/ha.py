@@ -106,7 +106,7 @@ class Instance(HasPolicyEditsMixin, BaseModel):
 
     @property
     def consumed_capacity(self):
-        return sum(x.task_impact for x in UnifiedJob.objects.filter(execution_node=self.hostname,
+        return sum(x.get_task_impact() for x in UnifiedJob.objects.filter(execution_node=self.hostname,
                                                                     status__in=('running', 'waiting')))
 
     @property
@@ -224,7 +224,7 @@ class InstanceGroup(HasPolicyEditsMixin, BaseModel, RelatedJobsMixin):
         for i in self.instances.filter(capacity__gt=0).order_by('hostname'):
             if not i.enabled:
                 continue
-            if i.remaining_capacity >= task.task_impact and \
+            if i.remaining_capacity >= task.get_task_impact() and \
                     (instance_most_capacity is None or
                      i.remaining_capacity > instance_most_capacity.remaining_capacity):
                 instance_most_capacity = i
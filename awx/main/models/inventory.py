@@ -19,6 +19,7 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 
 # REST Framework
 from rest_framework.exceptions import ParseError
@@ -53,6 +54,7 @@ from awx.main.models.notifications import (
     JobNotificationMixin,
 )
 from awx.main.utils import _inventory_updates, region_sorting
+from awx.main.utils.group_computed_fields import compute_group_fields, compute_group_fields_by_subtree
 
 
 __all__ = ['Inventory', 'Host', 'Group', 'InventorySource', 'InventoryUpdate',
@@ -67,6 +69,16 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
     '''
 
     FIELDS_TO_PRESERVE_AT_COPY = ['hosts', 'groups', 'instance_groups']
+    # Parts of the computed fields that may need to be recomputed (bits of
+    # `computed_fields_dirty`); the inventory's own counts are recomputed
+    # along with any of them.
+    COMPUTED_FIELDS_HOSTS = 1
+    COMPUTED_FIELDS_GROUPS = 2
+    COMPUTED_FIELDS_COUNTS = 4
+    COMPUTED_FIELDS_ALL = COMPUTED_FIELDS_HOSTS | COMPUTED_FIELDS_GROUPS | COMPUTED_FIELDS_COUNTS
+    # The SmartInventoryMembership rows of a smart inventory, which are
+    # brought up to date the same way.
+    COMPUTED_FIELDS_SMART_HOSTS = 8
     KIND_CHOICES = [
         ('', _('Hosts have a direct link to this inventory.')),
         ('smart', _('Hosts for inventory generated using the host_filter property.')),
@@ -130,6 +142,17 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
         editable=False,
         help_text=_('Number of external inventory sources in this inventory with failures.'),
     )
+    computed_fields_dirty = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        help_text=_('Parts of the computed fields of this inventory that are waiting to be recomputed.'),
+    )
+    computed_fields_dirty_since = models.DateTimeField(
+        null=True,
+        default=None,
+        editable=False,
+        help_text=_('When the computed fields of this inventory started waiting to be recomputed.'),
+    )
     kind = models.CharField(
         max_length=32,
         choices=KIND_CHOICES,
@@ -371,70 +394,94 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
         group_hosts_map = self.get_group_hosts_map()
         active_host_pks = set(self.hosts.values_list('pk', flat=True))
         failed_host_pks = set(self.hosts.filter(last_job_host_summary__failed=True).values_list('pk', flat=True))
-        # active_group_pks = set(self.groups.values_list('pk', flat=True))
-        failed_group_pks = set() # Update below as we check each group.
         groups_with_cloud_pks = set(self.groups.filter(inventory_sources__source__in=CLOUD_INVENTORY_SOURCES).values_list('pk', flat=True))
-        groups_to_update = {}
-
-        # Build list of group pks to check, starting with the groups at the
-        # deepest level within the tree.
         root_group_pks = set(self.root_groups.values_list('pk', flat=True))
-        group_depths = {} # pk: max_depth
-
-        def update_group_depths(group_pk, current_depth=0):
-            max_depth = group_depths.get(group_pk, -1)
-            # Arbitrarily limit depth to avoid hitting Python recursion limit (which defaults to 1000).
-            if current_depth > 100:
-                return
-            if current_depth > max_depth:
-                group_depths[group_pk] = current_depth
-            for child_pk in group_children_map.get(group_pk, set()):
-                update_group_depths(child_pk, current_depth + 1)
-        for group_pk in root_group_pks:
-            update_group_depths(group_pk)
-        group_pks_to_check = [x[1] for x in sorted([(v,k) for k,v in group_depths.items()], reverse=True)]
-
-        for group_pk in group_pks_to_check:
-            # Get all children and host pks for this group.
-            parent_pks_to_check = set([group_pk])
-            parent_pks_checked = set()
-            child_pks = set()
+        args = (root_group_pks, group_children_map, group_hosts_map,
+                active_host_pks, failed_host_pks, groups_with_cloud_pks)
+        groups_to_update = compute_group_fields(*args)
+        if groups_to_update is None:
+            logger.warning('Groups of inventory %s have a cycle, computing their fields one at a time', self.pk)
+            groups_to_update = compute_group_fields_by_subtree(*args)
+
+        # Now apply updates to the groups that need them, with one UPDATE
+        # for each batch of groups that get the same values.
+        fields = ('total_hosts', 'has_active_failures', 'hosts_with_active_failures',
+                  'total_groups', 'groups_with_active_failures', 'has_inventory_sources')
+        group_pks_by_values = {}
+        for row in self.groups.values_list('pk', *fields).iterator():
+            group_updates = groups_to_update.get(row[0])
+            if group_updates is None:
+                continue
+            values = tuple(group_updates[field] for field in fields)
+            if values != row[1:]:
+                group_pks_by_values.setdefault(values, []).append(row[0])
+        for values, update_pks in group_pks_by_values.items():
+            for offset in range(0, len(update_pks), 500):
+                Group.objects.filter(pk__in=update_pks[offset:(offset + 500)]).update(**dict(zip(fields, values)))
+
+    @classmethod
+    def mark_computed_fields_dirty(cls, inventory_id, scope=COMPUTED_FIELDS_ALL):
+        '''
+        Record that the `scope` parts (COMPUTED_FIELDS_* bits) of the computed
+        fields of an inventory need to be recomputed.  Return True if the
+        inventory wasn't already waiting to be recomputed.
+        '''
+        if cls.objects.filter(pk=inventory_id, computed_fields_dirty=0).update(
+                computed_fields_dirty=scope, computed_fields_dirty_since=now()):
+            return True
+        # a concurrent claim may have cleared it since the UPDATE above
+        cls.objects.filter(pk=inventory_id).update(
+            computed_fields_dirty=models.F('computed_fields_dirty').bitor(scope),
+            computed_fields_dirty_since=Coalesce(models.F('computed_fields_dirty_since'), now()))
+        return False
+
+    @classmethod
+    def mark_smart_host_memberships_dirty(cls, inventories):
+        '''
+        Record that the host memberships (and so the counts) of the smart
+        inventories in the queryset `inventories` need to be brought up to
+        date, with two UPDATEs however many inventories there are.
+        '''
+        scope = cls.COMPUTED_FIELDS_SMART_HOSTS | cls.COMPUTED_FIELDS_COUNTS
+        inventories = inventories.filter(kind='smart')
+        inventories.exclude(computed_fields_dirty=0).update(
+            computed_fields_dirty=models.F('computed_fields_dirty').bitor(scope),
+            computed_fields_dirty_since=Coalesce(models.F('computed_fields_dirty_since'), now()))
+        inventories.filter(computed_fields_dirty=0).update(
+            computed_fields_dirty=scope, computed_fields_dirty_since=now())
+
+    @classmethod
+    def claim_computed_fields_dirty(cls, inventory_id, scope):
+        '''
+        Clear the dirty parts of the computed fields of an inventory, if they
+        are still `scope`; return True if they were (and so the caller must
+        recompute them).
+        '''
+        return bool(cls.objects.filter(pk=inventory_id, computed_fields_dirty=scope).update(
+            computed_fields_dirty=0, computed_fields_dirty_since=None))
+
+    def update_smart_host_memberships(self):
+        '''
+        Bring the SmartInventoryMembership rows of this inventory up to date
+        with its host_filter, inserting and deleting only the rows that
+        changed; return the numbers of rows added and removed.
+        '''
+        if self.kind == 'smart' and self.host_filter is not None and not self.pending_deletion:
+            host_pks = set(self.hosts.order_by().values_list('pk', flat=True))
+        else:
             host_pks = set()
-            while parent_pks_to_check:
-                for parent_pk in list(parent_pks_to_check):
-                    c_ids = group_children_map.get(parent_pk, set())
-                    child_pks.update(c_ids)
-                    parent_pks_to_check.remove(parent_pk)
-                    parent_pks_checked.add(parent_pk)
-                    parent_pks_to_check.update(c_ids - parent_pks_checked)
-                    h_ids = group_hosts_map.get(parent_pk, set())
-                    host_pks.update(h_ids)
-            # Define updates needed for this group.
-            group_updates = groups_to_update.setdefault(group_pk, {})
-            group_updates.update({
-                'total_hosts': len(active_host_pks & host_pks),
-                'has_active_failures': bool(failed_host_pks & host_pks),
-                'hosts_with_active_failures': len(failed_host_pks & host_pks),
-                'total_groups': len(child_pks),
-                'groups_with_active_failures': len(failed_group_pks & child_pks),
-                'has_inventory_sources': bool(group_pk in groups_with_cloud_pks),
-            })
-            if group_updates['has_active_failures']:
-                failed_group_pks.add(group_pk)
-
-        # Now apply updates to each group as needed (in batches).
-        all_update_pks = list(groups_to_update.keys())
-        for offset in range(0, len(all_update_pks), 500):
-            update_pks = all_update_pks[offset:(offset + 500)]
-            for group in self.groups.filter(pk__in=update_pks):
-                group_updates = groups_to_update[group.pk]
-                for field, value in list(group_updates.items()):
-                    if getattr(group, field) != value:
-                        setattr(group, field, value)
-                    else:
-                        group_updates.pop(field)
-                if group_updates:
-                    group.save(update_fields=group_updates.keys())
+        memberships = SmartInventoryMembership.objects.filter(inventory_id=self.pk)
+        with transaction.atomic():
+            current_pks = set(memberships.values_list('host_id', flat=True))
+            removed_pks = sorted(current_pks - host_pks)
+            for offset in range(0, len(removed_pks), 500):
+                memberships.filter(host_id__in=removed_pks[offset:(offset + 500)]).delete()
+            added_pks = sorted(host_pks - current_pks)
+            SmartInventoryMembership.objects.bulk_create(
+                [SmartInventoryMembership(inventory_id=self.pk, host_id=host_pk) for host_pk in added_pks],
+                batch_size=500
+            )
+        return len(added_pks), len(removed_pks)
 
     def update_computed_fields(self, update_groups=True, update_hosts=True):
         '''
@@ -514,23 +561,31 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
 
     def _update_host_smart_inventory_memeberships(self):
         if self.kind == 'smart' and settings.AWX_REBUILD_SMART_MEMBERSHIP:
-            def on_commit():
-                from awx.main.tasks import update_host_smart_inventory_memberships
-                update_host_smart_inventory_memberships.delay()
-            connection.on_commit(on_commit)
+            from awx.main.tasks import schedule_smart_host_memberships
+            schedule_smart_host_memberships(Inventory.objects.filter(pk=self.pk))
+
+    def _update_smart_inventories_of_hosts(self):
+        if settings.AWX_REBUILD_SMART_MEMBERSHIP:
+            # The hosts of this inventory can only be matched by the smart
+            # inventories of its organization, or of no organization.
+            from awx.main.tasks import schedule_smart_host_memberships
+            schedule_smart_host_memberships(Inventory.objects.filter(
+                Q(organization__isnull=True) | Q(organization=self.organization_id),
+                host_filter__isnull=False, pending_deletion=False
+            ))
 
     def save(self, *args, **kwargs):
-        self._update_host_smart_inventory_memeberships()
         super(Inventory, self).save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields', None)
+        if update_fields is None or set(update_fields) & set(['host_filter', 'organization', 'kind']):
+            # Only this inventory's hosts can have changed; the memberships
+            # of a deleted one go with it.
+            self._update_host_smart_inventory_memeberships()
         if (self.kind == 'smart' and 'host_filter' in kwargs.get('update_fields', ['host_filter']) and
                 connection.vendor != 'sqlite'):
             # Minimal update of host_count for smart inventory host filter changes
             self.update_computed_fields(update_groups=False, update_hosts=False)
 
-    def delete(self, *args, **kwargs):
-        self._update_host_smart_inventory_memeberships()
-        super(Inventory, self).delete(*args, **kwargs)
-
     '''
     RelatedJobsMixin
     '''
@@ -727,15 +782,11 @@ class Host(CommonModelNameNotUnique, RelatedJobsMixin):
         return host_name
 
     def _update_host_smart_inventory_memeberships(self):
-        if settings.AWX_REBUILD_SMART_MEMBERSHIP:
-            def on_commit():
-                from awx.main.tasks import update_host_smart_inventory_memberships
-                update_host_smart_inventory_memberships.delay()
-            connection.on_commit(on_commit)
+        self.inventory._update_smart_inventories_of_hosts()
 
     def save(self, *args, **kwargs):
-        self._update_host_smart_inventory_memeberships()
         super(Host, self).save(*args, **kwargs)
+        self._update_host_smart_inventory_memeberships()
 
     def delete(self, *args, **kwargs):
         self._update_host_smart_inventory_memeberships()
@@ -829,7 +880,7 @@ class Group(CommonModelNameNotUnique, RelatedJobsMixin):
     @transaction.atomic
     def delete_recursive(self):
         from awx.main.utils import ignore_inventory_computed_fields
-        from awx.main.tasks import update_inventory_computed_fields
+        from awx.main.tasks import schedule_inventory_computed_fields
         from awx.main.signals import disable_activity_stream, activity_stream_delete
 
 
@@ -884,7 +935,7 @@ class Group(CommonModelNameNotUnique, RelatedJobsMixin):
                 marked_groups.append(group)
             Group.objects.filter(id__in=marked_groups).delete()
             Host.objects.filter(id__in=marked_hosts).delete()
-            update_inventory_computed_fields.delay(self.inventory.id)
+            schedule_inventory_computed_fields(self.inventory.id)
         with ignore_inventory_computed_fields():
             with disable_activity_stream():
                 mark_actual()
@@ -1703,8 +1754,7 @@ class InventoryUpdate(UnifiedJob, InventorySourceOptions, JobNotificationMixin,
     def event_class(self):
         return InventoryUpdateEvent
 
-    @property
-    def task_impact(self):
+    def _get_task_impact(self):
         return 1
 
     # InventoryUpdate credential required
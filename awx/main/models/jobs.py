@@ -2,18 +2,21 @@
 # All Rights Reserved.
 
 # Python
-import codecs
+import collections
 import datetime
+import hashlib
 import logging
 import os
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
 
 # Django
 from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, Value, When
 #from django.core.cache import cache
 from django.utils.encoding import smart_str
 from django.utils.timezone import now
@@ -40,7 +43,7 @@ from awx.main.models.notifications import (
     JobNotificationMixin,
 )
 from awx.main.utils import parse_yaml_or_json, getattr_dne
-from awx.main.fields import ImplicitRoleField, JSONField, AskForField
+from awx.main.fields import ImplicitRoleField, JSONField, JSONBField, AskForField
 from awx.main.models.mixins import (
     ResourceMixin,
     SurveyJobTemplateMixin,
@@ -553,6 +556,13 @@ class Job(UnifiedJob, JobOptions, SurveyJobMixin, JobNotificationMixin, TaskMana
         help_text=_("If ran as part of sliced jobs, the total number of slices. "
                     "If 1, job is not part of a sliced job."),
     )
+    fact_cache_stats = JSONField(
+        blank=True,
+        default={},
+        editable=False,
+        help_text=_("How many hosts' cached facts were written before, and saved after, the "
+                    "playbook run, and how long each took."),
+    )
 
 
     def _get_parent_field_name(self):
@@ -690,8 +700,7 @@ class Job(UnifiedJob, JobOptions, SurveyJobMixin, JobNotificationMixin, TaskMana
             ).format(status_value=status))
         return self._get_hosts(**kwargs)
 
-    @property
-    def task_impact(self):
+    def _get_task_impact(self):
         # NOTE: We sorta have to assume the host count matches and that forks default to 5
         from awx.main.models.inventory import Host
         if self.launch_type == 'callback':
@@ -812,75 +821,169 @@ class Job(UnifiedJob, JobOptions, SurveyJobMixin, JobNotificationMixin, TaskMana
     def get_notification_friendly_name(self):
         return "Job"
 
-    def _get_inventory_hosts(
-        self,
-        only=['name', 'ansible_facts', 'ansible_facts_modified', 'modified', 'inventory_id']
-    ):
+    def _get_inventory_host_rows(self, fields, **filters):
+        '''
+        Iterate over the `fields` values of the job's inventory hosts, fetched
+        in chunks (with a server-side cursor on PostgreSQL) rather than all
+        at once.
+        '''
         if not self.inventory:
-            return []
-        return self.inventory.hosts.only(*only)
+            return iter([])
+        return self.inventory.hosts.filter(**filters).order_by().values_list(*fields).iterator()
+
+    def _record_fact_cache_stats(self, phase, **stats):
+        self.fact_cache_stats = dict(self.fact_cache_stats or {}, **{phase: stats})
+        Job.objects.filter(pk=self.pk).update(fact_cache_stats=self.fact_cache_stats)
 
-    def start_job_fact_cache(self, destination, modification_times, timeout=None):
+    def start_job_fact_cache(self, destination, fact_hashes, timeout=None):
+        '''
+        Write the cached facts of the job's hosts where the jsonfile fact
+        cache plugin looks for them, noting a hash of each file written in
+        `fact_hashes` so `finish_job_fact_cache` can tell which ones the
+        playbook changed.
+        '''
+        started = time.time()
         destination = os.path.join(destination, 'facts')
         os.makedirs(destination, mode=0o700)
-        hosts = self._get_inventory_hosts()
+        filters = {}
         if timeout is None:
             timeout = settings.ANSIBLE_FACT_CACHE_TIMEOUT
         if timeout > 0:
             # exclude hosts with fact data older than `settings.ANSIBLE_FACT_CACHE_TIMEOUT seconds`
-            timeout = now() - datetime.timedelta(seconds=timeout)
-            hosts = hosts.filter(ansible_facts_modified__gte=timeout)
-        for host in hosts:
-            filepath = os.sep.join(map(str, [destination, host.name]))
+            filters['ansible_facts_modified__gte'] = now() - datetime.timedelta(seconds=timeout)
+
+        def write_facts(name, ansible_facts):
+            filepath = os.sep.join(map(str, [destination, name]))
             if not os.path.realpath(filepath).startswith(destination):
-                system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
-                continue
+                system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(name)))
+                return None
+            data = json.dumps(ansible_facts).encode('utf-8')
             try:
-                with codecs.open(filepath, 'w', encoding='utf-8') as f:
+                with open(filepath, 'wb') as f:
                     os.chmod(f.name, 0o600)
-                    json.dump(host.ansible_facts, f)
+                    f.write(data)
             except IOError:
-                system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
-                continue
-            # make note of the time we wrote the file so we can check if it changed later
-            modification_times[filepath] = os.path.getmtime(filepath)
-
-    def finish_job_fact_cache(self, destination, modification_times):
+                system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(name)))
+                return None
+            return filepath, hashlib.sha1(data).hexdigest()
+
+        hosts = self._get_inventory_host_rows(['name', 'ansible_facts'], **filters)
+        written = 0
+        for result in _map_in_threads(write_facts, hosts, settings.AWX_FACT_CACHE_WORKERS):
+            if result is not None:
+                filepath, digest = result
+                fact_hashes[filepath] = digest
+                written += 1
+        self._record_fact_cache_stats('start', hosts=written, seconds=round(time.time() - started, 3))
+
+    def finish_job_fact_cache(self, destination, fact_hashes):
+        '''
+        Save the facts of the hosts whose fact cache files the playbook
+        changed (or removed), with one UPDATE of the fact columns per batch
+        of hosts.
+        '''
+        started = time.time()
         destination = os.path.join(destination, 'facts')
-        for host in self._get_inventory_hosts():
-            filepath = os.sep.join(map(str, [destination, host.name]))
+
+        def read_facts(pk, name):
+            filepath = os.sep.join(map(str, [destination, name]))
             if not os.path.realpath(filepath).startswith(destination):
-                system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
+                system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(name)))
+                return None
+            try:
+                with open(filepath, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # if the file goes missing, ansible removed it (likely via clear_facts)
+                return pk, name, {}, True
+            # If the file changed since we wrote it pre-playbook run...
+            if hashlib.sha1(data).hexdigest() == fact_hashes.get(filepath):
+                return None
+            try:
+                return pk, name, json.loads(data.decode('utf-8')), False
+            except ValueError:
+                return None
+
+        hosts = self._get_inventory_host_rows(['pk', 'name'])
+        checked = changed = cleared = 0
+        batch = []
+        for result in _map_in_threads(read_facts, hosts, settings.AWX_FACT_CACHE_WORKERS):
+            checked += 1
+            if result is None:
                 continue
-            if os.path.exists(filepath):
-                # If the file changed since we wrote it pre-playbook run...
-                modified = os.path.getmtime(filepath)
-                if modified > modification_times.get(filepath, 0):
-                    with codecs.open(filepath, 'r', encoding='utf-8') as f:
-                        try:
-                            ansible_facts = json.load(f)
-                        except ValueError:
-                            continue
-                        host.ansible_facts = ansible_facts
-                        host.ansible_facts_modified = now()
-                        if 'insights' in ansible_facts and 'system_id' in ansible_facts['insights']:
-                            host.insights_system_id = ansible_facts['insights']['system_id']
-                        host.save()
-                        system_tracking_logger.info(
-                            'New fact for inventory {} host {}'.format(
-                                smart_str(host.inventory.name), smart_str(host.name)),
-                            extra=dict(inventory_id=host.inventory.id, host_name=host.name,
-                                       ansible_facts=host.ansible_facts,
-                                       ansible_facts_modified=host.ansible_facts_modified.isoformat(),
-                                       job_id=self.id))
+            if result[3]:
+                cleared += 1
             else:
-                # if the file goes missing, ansible removed it (likely via clear_facts)
-                host.ansible_facts = {}
-                host.ansible_facts_modified = now()
+                changed += 1
+            batch.append(result)
+            if len(batch) >= settings.AWX_FACT_CACHE_BATCH_SIZE:
+                self._save_host_facts(batch)
+                batch = []
+        if batch:
+            self._save_host_facts(batch)
+        if (changed or cleared) and self.inventory:
+            # the UPDATEs don't send the signals Host.save() does
+            self.inventory._update_smart_inventories_of_hosts()
+        self._record_fact_cache_stats('finish', hosts=checked, changed=changed, cleared=cleared,
+                                      seconds=round(time.time() - started, 3))
+
+    def _save_host_facts(self, changed):
+        '''
+        Save [(host pk, host name, ansible_facts, cleared)] with one UPDATE.
+        '''
+        from awx.main.models.inventory import Host
+        ansible_facts_modified = now()
+        values = dict(
+            ansible_facts_modified=ansible_facts_modified,
+            ansible_facts=Case(
+                *[When(pk=pk, then=Value(ansible_facts, output_field=JSONBField()))
+                  for pk, name, ansible_facts, cleared in changed],
+                default=F('ansible_facts'),
+                output_field=JSONBField()
+            )
+        )
+        insights_system_ids = [
+            When(pk=pk, then=Value(ansible_facts['insights']['system_id']))
+            for pk, name, ansible_facts, cleared in changed
+            if 'insights' in ansible_facts and 'system_id' in ansible_facts['insights']
+        ]
+        if insights_system_ids:
+            values['insights_system_id'] = Case(*insights_system_ids, default=F('insights_system_id'),
+                                                output_field=models.TextField())
+        Host.objects.filter(pk__in=[row[0] for row in changed]).update(**values)
+
+        inventory_name = smart_str(self.inventory.name)
+        for pk, name, ansible_facts, cleared in changed:
+            if cleared:
                 system_tracking_logger.info(
-                    'Facts cleared for inventory {} host {}'.format(
-                        smart_str(host.inventory.name), smart_str(host.name)))
-                host.save()
+                    'Facts cleared for inventory {} host {}'.format(inventory_name, smart_str(name)))
+            else:
+                system_tracking_logger.info(
+                    'New fact for inventory {} host {}'.format(inventory_name, smart_str(name)),
+                    extra=dict(inventory_id=self.inventory.id, host_name=name,
+                               ansible_facts=ansible_facts,
+                               ansible_facts_modified=ansible_facts_modified.isoformat(),
+                               job_id=self.id))
+
+
+def _map_in_threads(func, rows, workers):
+    '''
+    Yield func(*row) for each of the `rows`, in order, running up to
+    `workers` calls at a time in a thread pool, and reading no further
+    ahead in `rows` than it takes to keep the pool busy.
+    '''
+    if workers <= 1:
+        for row in rows:
+            yield func(*row)
+        return
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for row in rows:
+            pending.append(pool.submit(func, *row))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 
 # Add on aliases for the non-related-model fields
@@ -1130,6 +1233,8 @@ class JobHostSummary(CreatedModifiedModel):
     skipped = models.PositiveIntegerField(default=0, editable=False)
     failed = models.BooleanField(default=False, editable=False)
 
+    BULK_UPDATE_BATCH_SIZE = 500
+
     def __str__(self):
         host = getattr_dne(self, 'host')
         hostname = host.name if host else 'N/A'
@@ -1165,6 +1270,65 @@ class JobHostSummary(CreatedModifiedModel):
             self.host.save(update_fields=update_fields)
         #self.host.update_computed_fields()
 
+    @classmethod
+    def bulk_update_from_stats(cls, job, stats_by_host, host_ids):
+        '''
+        Create or update the summaries of `job` for every host in
+        `stats_by_host` ({host name: {stat: value}}) using a fixed number of
+        queries, rather than several queries per host.
+
+        `host_ids` maps the host names found in the job's inventory to their
+        host ids.  The `last_job` and `last_job_host_summary` of those hosts
+        are then updated with a single UPDATE.
+        '''
+        from awx.main.models.inventory import Host
+        existing = dict(
+            (summary.host_name, summary)
+            for summary in cls.objects.filter(job_id=job.id)
+        )
+        timestamp = now()
+        to_create = []
+        to_update = {}
+        for host_name, host_stats in stats_by_host.items():
+            summary = existing.get(host_name)
+            if summary is None:
+                summary = cls(
+                    job_id=job.id, host_id=host_ids.get(host_name),
+                    host_name=host_name, created=timestamp, modified=timestamp,
+                    **host_stats
+                )
+                summary.failed = bool(summary.dark or summary.failures)
+                to_create.append(summary)
+                continue
+            changed = False
+            for stat, value in host_stats.items():
+                if getattr(summary, stat) != value:
+                    setattr(summary, stat, value)
+                    changed = True
+            if changed:
+                summary.failed = bool(summary.dark or summary.failures)
+                # most hosts in a play share identical stats, so group the
+                # changed summaries by their new values and UPDATE each group
+                key = tuple(sorted(host_stats.items())) + (('failed', summary.failed),)
+                to_update.setdefault(key, []).append(summary.pk)
+
+        cls.objects.bulk_create(to_create)
+        for values, pks in to_update.items():
+            for i in range(0, len(pks), cls.BULK_UPDATE_BATCH_SIZE):
+                cls.objects.filter(pk__in=pks[i:i + cls.BULK_UPDATE_BATCH_SIZE]).update(
+                    modified=timestamp, **dict(values)
+                )
+
+        if host_ids:
+            Host.objects.filter(job_host_summaries__job_id=job.id).update(
+                last_job_id=job.id,
+                last_job_host_summary_id=models.Subquery(
+                    cls.objects.filter(
+                        job_id=job.id, host_id=models.OuterRef('pk')
+                    ).values('pk')[:1]
+                )
+            )
+
 
 class SystemJobOptions(BaseModel):
     '''
@@ -1311,8 +1475,7 @@ class SystemJob(UnifiedJob, SystemJobOptions, JobNotificationMixin):
     def event_class(self):
         return SystemJobEvent
 
-    @property
-    def task_impact(self):
+    def _get_task_impact(self):
         return 5
 
     @property
@@ -17,7 +17,7 @@ from django.db.models.query import QuerySet
 # AWX
 from awx.main.models.base import prevent_search
 from awx.main.models.rbac import (
-    Role, RoleAncestorEntry, get_roles_on_resource
+    Role, RoleAncestorEntry, get_roles_on_resource, get_accessible_pks
 )
 from awx.main.utils import parse_yaml_or_json, get_custom_venv_choices
 from awx.main.utils.encryption import decrypt_value, get_encryption_key, is_encrypted
@@ -65,15 +65,20 @@ class ResourceMixin(models.Model):
                                                  object_id=accessor.id)
 
         if content_types is None:
-            ct_kwarg = dict(content_type_id = ContentType.objects.get_for_model(cls).id)
+            content_types = [ContentType.objects.get_for_model(cls).id]
+            ct_kwarg = dict(content_type_id = content_types[0])
         else:
             ct_kwarg = dict(content_type_id__in = content_types)
 
-        return RoleAncestorEntry.objects.filter(
+        qs = RoleAncestorEntry.objects.filter(
             ancestor__in = ancestor_roles,
             role_field = role_field,
             **ct_kwarg
         ).values_list('object_id').distinct()
+        if type(accessor) == User and accessor.pk:
+            # a request may ask for the same set many times
+            return get_accessible_pks(accessor, tuple(sorted(content_types)), role_field, qs)
+        return qs
 
 
     @staticmethod
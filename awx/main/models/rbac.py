@@ -6,8 +6,13 @@ import logging
 import threading
 import contextlib
 import re
+import time
+import uuid
+from array import array
 
 # Django
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models, transaction, connection
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -23,7 +28,11 @@ __all__ = [
     'get_roles_on_resource',
     'ROLE_SINGLETON_SYSTEM_ADMINISTRATOR',
     'ROLE_SINGLETON_SYSTEM_AUDITOR',
-    'role_summary_fields_generator'
+    'role_summary_fields_generator',
+    'AccessiblePks',
+    'get_accessible_pks',
+    'invalidate_accessible_pks',
+    'invalidate_accessible_pks_of_roles',
 ]
 
 logger = logging.getLogger('awx.main.models.rbac')
@@ -318,6 +327,11 @@ class Role(models.Model):
                 yield role_ids[i:i + 40000]
 
 
+        # roles that gained ancestors, and whether any lost some, to tell
+        # which users' accessible objects may have changed
+        gained_ancestors = set()
+        lost_ancestors = False
+
         with transaction.atomic():
             while len(additions) > 0 or len(removals) > 0:
                 if loop_ct > 100:
@@ -381,6 +395,10 @@ class Role(models.Model):
                         ''' % sql_params)
                         insert_ct += cursor.rowcount
 
+                if insert_ct:
+                    gained_ancestors.update(additions)
+                if delete_ct:
+                    lost_ancestors = True
                 if insert_ct == 0 and delete_ct == 0:
                     break
 
@@ -400,6 +418,12 @@ class Role(models.Model):
                     new_removals.update([row[0] for row in cursor.fetchall()])
                 removals = list(new_removals)
 
+            if lost_ancestors or len(gained_ancestors) > 1000:
+                invalidate_accessible_pks()
+            elif gained_ancestors:
+                # only the members of the new ancestors can see more
+                invalidate_accessible_pks_of_roles(gained_ancestors)
+
 
     @staticmethod
     def visible_roles(user):
@@ -454,6 +478,152 @@ class RoleAncestorEntry(models.Model):
     object_id       = models.PositiveIntegerField(null=False)
 
 
+# `accessible_pk_qs` sets of object ids for users, shared between processes
+# in the cache under a global and a per-user version stamp, which are replaced
+# whenever role membership or ancestry changes in a way that may change them
+ACCESSIBLE_PKS_VERSION_KEY = 'awx-accessible-pks-version'
+ACCESSIBLE_PKS_USER_VERSION_KEY = 'awx-accessible-pks-version-{}'
+ACCESSIBLE_PKS_KEY = 'awx-accessible-pks-{user}-{content_types}-{role_field}-{version}-{user_version}'
+
+# The sets are also memoized on the User object, which lives for a request,
+# for at most this many seconds, or until this process changes roles.
+ACCESSIBLE_PKS_MEMO_TTL = 5
+accessible_pks_generation = 0
+
+
+class AccessiblePks(models.Expression):
+    '''
+    A set of object ids, for the right-hand side of an `__in` lookup; it is
+    sent to PostgreSQL as a single array parameter, instead of a parameter
+    per id or a subquery.
+    '''
+
+    def __init__(self, pks):
+        super(AccessiblePks, self).__init__(output_field=models.IntegerField())
+        self.pks = pks
+
+    def _prepare(self, field):
+        return self
+
+    def as_sql(self, compiler, connection):
+        if not self.pks:
+            return 'SELECT 0 WHERE 1 = 0', []
+        return ', '.join(['%s'] * len(self.pks)), sorted(self.pks)
+
+    def as_postgresql(self, compiler, connection):
+        return 'SELECT unnest(%s::integer[])', [sorted(self.pks)]
+
+
+class BumpAccessiblePksVersions(object):
+    '''
+    on_commit callback that replaces the version stamps in `keys`.
+    '''
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __call__(self):
+        try:
+            cache.set_many(dict((key, uuid.uuid4().hex) for key in self.keys), None)
+        except Exception:
+            logger.exception('could not invalidate cached accessible objects')
+
+
+def invalidate_accessible_pks(user_ids=None):
+    '''
+    Forget the accessible object ids of the users in `user_ids` (or of every
+    user): right away in this process, and in the cache shared with other
+    processes once the current transaction commits.
+    '''
+    global accessible_pks_generation
+    accessible_pks_generation += 1
+    if user_ids is None:
+        keys = [ACCESSIBLE_PKS_VERSION_KEY]
+    else:
+        keys = [ACCESSIBLE_PKS_USER_VERSION_KEY.format(user_id) for user_id in user_ids]
+    if keys:
+        connection.on_commit(BumpAccessiblePksVersions(keys))
+
+
+def invalidate_accessible_pks_of_roles(role_ids):
+    '''
+    Forget the accessible object ids of the members of the roles in
+    `role_ids` and of their ancestors, e.g. before the roles are deleted.
+    '''
+    invalidate_accessible_pks(list(Role.members.through.objects.filter(
+        role_id__in=RoleAncestorEntry.objects.filter(
+            descendent_id__in=role_ids
+        ).values('ancestor_id')
+    ).values_list('user_id', flat=True).distinct()))
+
+
+def _pending_accessible_pks_versions():
+    # version stamps to be replaced when the current transaction commits;
+    # until then, the cached sets under them don't match what it sees
+    pending = set()
+    for sids, func in connection.run_on_commit:
+        if isinstance(func, BumpAccessiblePksVersions):
+            pending.update(func.keys)
+    return pending
+
+
+def _get_accessible_pks_versions(version_keys):
+    versions = cache.get_many(version_keys)
+    missing = [key for key in version_keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions = cache.get_many(version_keys)
+    return tuple(versions[key] for key in version_keys)
+
+
+def get_accessible_pks(user, content_type_ids, role_field, queryset):
+    '''
+    Return the object ids found by `queryset` (the RoleAncestorEntry
+    `object_id`s of `user` with `role_field` for `content_type_ids`) as an
+    AccessiblePks, memoized on the user object and cached for
+    AWX_ACCESSIBLE_PKS_CACHE_TIMEOUT seconds.
+    '''
+    memo = getattr(user, '_accessible_pks', None)
+    if (memo is None or memo['generation'] != accessible_pks_generation or
+            memo['created'] < time.time() - ACCESSIBLE_PKS_MEMO_TTL):
+        memo = user._accessible_pks = dict(
+            generation=accessible_pks_generation, created=time.time(), versions=None, pks={}
+        )
+    memo_key = (content_type_ids, role_field)
+    if memo_key not in memo['pks']:
+        memo['pks'][memo_key] = _get_cached_accessible_pks(user, content_type_ids, role_field, queryset, memo)
+    return AccessiblePks(memo['pks'][memo_key])
+
+
+def _get_cached_accessible_pks(user, content_type_ids, role_field, queryset, memo):
+    version_keys = [ACCESSIBLE_PKS_VERSION_KEY, ACCESSIBLE_PKS_USER_VERSION_KEY.format(user.pk)]
+    timeout = settings.AWX_ACCESSIBLE_PKS_CACHE_TIMEOUT
+    if not timeout or _pending_accessible_pks_versions().intersection(version_keys):
+        return frozenset(pk for (pk,) in queryset)
+    try:
+        if memo['versions'] is None:
+            memo['versions'] = _get_accessible_pks_versions(version_keys)
+        key = ACCESSIBLE_PKS_KEY.format(
+            user=user.pk, content_types='.'.join(str(ct) for ct in content_type_ids),
+            role_field=role_field, version=memo['versions'][0], user_version=memo['versions'][1]
+        )
+        data = cache.get(key)
+    except Exception:
+        logger.exception('could not read cached accessible objects')
+        return frozenset(pk for (pk,) in queryset)
+    if data is not None:
+        pks = array('I')
+        pks.frombytes(data)
+        return frozenset(pks)
+    pks = frozenset(pk for (pk,) in queryset)
+    try:
+        cache.set(key, array('I', sorted(pks)).tobytes(), timeout)
+    except Exception:
+        logger.exception('could not cache accessible objects')
+    return pks
+
+
 def get_roles_on_resource(resource, accessor):
     '''
     Returns a string list of the roles a accessor has for a given resource.
@@ -45,12 +45,13 @@ from awx.main.utils import (
     get_type_for_model, parse_yaml_or_json, getattr_dne
 )
 from awx.main.utils import polymorphic, schedule_task_manager
+from awx.main.utils.stdout_archive import event_lines, StdoutArchiveReader
 from awx.main.constants import ACTIVE_STATES, CAN_CANCEL
 from awx.main.redact import UriCleaner, REPLACE_STR
 from awx.main.consumers import emit_channel_notification
 from awx.main.fields import JSONField, AskForField
 
-__all__ = ['UnifiedJobTemplate', 'UnifiedJob', 'StdoutMaxBytesExceeded']
+__all__ = ['UnifiedJobTemplate', 'UnifiedJob', 'UnifiedJobStdoutArchive', 'StdoutMaxBytesExceeded']
 
 logger = logging.getLogger('awx.main.models.unified_jobs')
 
@@ -525,6 +526,62 @@ class UnifiedJobDeprecatedStdout(models.Model):
     )
 
 
+class UnifiedJobStdoutArchive(models.Model):
+    '''
+    The complete stdout of a finished job, stored as independently compressed
+    blocks of lines (see `awx.main.utils.stdout_archive`) so that any range of
+    lines can be read without reading the rest.  Written at the end of a run
+    when `STDOUT_ARCHIVE_ENABLED` is set.
+    '''
+
+    class Meta:
+        app_label = 'main'
+
+    unified_job = models.OneToOneField(
+        'UnifiedJob',
+        related_name='stdout_archive',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        editable=False,
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+    )
+    lines = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    size = models.BigIntegerField(
+        default=0,
+        editable=False,
+        help_text=_('Uncompressed size of the archived stdout, in bytes.'),
+    )
+    block_index = JSONField(
+        blank=True,
+        default=list,
+        editable=False,
+    )
+    data = models.BinaryField(
+        editable=False,
+    )
+
+    def read(self, offset, length):
+        '''
+        Return `length` bytes of the archive starting at `offset`, without
+        fetching the rest of it.
+        '''
+        chunk = UnifiedJobStdoutArchive.objects.filter(pk=self.pk).annotate(
+            chunk=models.Func(
+                models.F('data'), models.Value(offset + 1), models.Value(length),
+                function='SUBSTR', output_field=models.BinaryField()
+            )
+        ).values_list('chunk', flat=True).first()
+        return bytes(chunk or b'')
+
+    def get_reader(self):
+        return StdoutArchiveReader(self.read, self.block_index, self.lines)
+
+
 class StdoutMaxBytesExceeded(Exception):
 
     def __init__(self, total, supported):
@@ -603,6 +660,12 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
         editable=False,
         help_text=_("The instance that managed the isolated execution environment."),
     )
+    task_impact = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text=_("Number of capacity units this job consumes on the node it runs on; "
+                    "computed when the job leaves the pending state."),
+    )
     notifications = models.ManyToManyField(
         'Notification',
         editable=False,
@@ -1005,10 +1068,18 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
         # For older installs, this data still exists in the database; check for
         # it and use if it exists
         legacy_stdout_text = self.result_stdout_text
-        if legacy_stdout_text:
-            if enforce_max_bytes and len(legacy_stdout_text) > max_supported:
-                raise StdoutMaxBytesExceeded(len(legacy_stdout_text), max_supported)
-            fd.write(legacy_stdout_text)
+        archive = None if legacy_stdout_text else self.get_stdout_archive()
+        if legacy_stdout_text or archive is not None:
+            if legacy_stdout_text:
+                if enforce_max_bytes and len(legacy_stdout_text) > max_supported:
+                    raise StdoutMaxBytesExceeded(len(legacy_stdout_text), max_supported)
+                fd.write(legacy_stdout_text)
+            else:
+                # the job's stdout was archived when it finished
+                if enforce_max_bytes and archive.size > max_supported:
+                    raise StdoutMaxBytesExceeded(archive.size, max_supported)
+                for first_line, text in archive.get_reader().blocks():
+                    fd.write(text)
             if hasattr(fd, 'name'):
                 fd.flush()
                 return codecs.open(fd.name, 'r', encoding='utf-8')
@@ -1087,25 +1158,102 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
     def result_stdout(self):
         return self._result_stdout_raw(escape_ascii=True)
 
-    def _result_stdout_raw_limited(self, start_line=0, end_line=None, redact_sensitive=True, escape_ascii=False):
+    def get_stdout_archive(self):
+        '''
+        Return this job's UnifiedJobStdoutArchive (without its data, which is
+        read a range at a time), or None if its stdout hasn't been archived.
+        '''
+        return UnifiedJobStdoutArchive.objects.defer('data').filter(unified_job_id=self.pk).first()
+
+    def _result_stdout_event_range(self, start_line, end_line, archive=None):
+        """
+        Return the lines [start_line, end_line) of stdout (negative values
+        count back from the end, as in a slice), the actual range of lines
+        returned, and the total number of lines.
+
+        Only the events that overlap the range are read (the event tables are
+        indexed on `start_line` and `end_line`), or only the blocks of the
+        stdout archive that contain it, so the cost depends on the size of the
+        range rather than the size of the job's output.
+        """
+        max_supported = settings.STDOUT_MAX_BYTES_DISPLAY
+        event_qs = self.get_event_queryset()
+        if archive is not None:
+            absolute_end = archive.lines
+        else:
+            absolute_end = event_qs.aggregate(end=models.Max('end_line'))['end'] or 0
+        if start_line < 0:
+            start_line = max(absolute_end + start_line, 0)
+        if end_line is None:
+            end_line = absolute_end
+        elif end_line < 0:
+            end_line = max(absolute_end + end_line, 0)
+        end_line = min(end_line, absolute_end)
+        start_line = min(start_line, end_line)
+
+        if archive is not None:
+            reader = archive.get_reader()
+            total = reader.size_of(start_line, end_line)
+            if total > max_supported:
+                raise StdoutMaxBytesExceeded(total, max_supported)
+            return reader.read_lines(start_line, end_line), start_line, end_line, absolute_end
+
+        event_qs = event_qs.filter(start_line__lt=end_line, end_line__gt=start_line)
+        total = event_qs.aggregate(
+            total=models.Sum(models.Func(models.F('stdout'), function='LENGTH'))
+        )['total'] or 0
+        if total > max_supported:
+            raise StdoutMaxBytesExceeded(total, max_supported)
+
         return_buffer = StringIO()
+        rows = event_qs.order_by('start_line').values_list('stdout', 'start_line', 'end_line')
+        for stdout, event_start, event_end in rows.iterator():
+            for lineno, line in enumerate(event_lines(stdout, event_start, event_end), event_start):
+                if start_line <= lineno < end_line:
+                    return_buffer.write(line)
+        return return_buffer.getvalue(), start_line, end_line, absolute_end
+
+    def _result_stdout_raw_limited(self, start_line=0, end_line=None, redact_sensitive=True, escape_ascii=False):
+        start_line = int(start_line)
         if end_line is not None:
             end_line = int(end_line)
-        stdout_lines = self.result_stdout_raw_handle().readlines()
-        absolute_end = len(stdout_lines)
-        for line in stdout_lines[int(start_line):end_line]:
-            return_buffer.write(line)
-        if int(start_line) < 0:
-            start_actual = len(stdout_lines) + int(start_line)
-            end_actual = len(stdout_lines)
-        else:
-            start_actual = int(start_line)
-            if end_line is not None:
-                end_actual = min(int(end_line), len(stdout_lines))
+
+        indexed = False
+        archive = None
+        if start_line or end_line is not None:
+            # range and tail requests are read from just the overlapping
+            # events (or archive blocks), unless the job's stdout predates
+            # job events
+            try:
+                self.event_class
+            except NotImplementedError:
+                pass
             else:
+                indexed = not self.result_stdout_text
+                if indexed:
+                    archive = self.get_stdout_archive()
+
+        if indexed:
+            return_buffer, start_actual, end_actual, absolute_end = self._result_stdout_event_range(
+                start_line, end_line, archive=archive
+            )
+        else:
+            return_buffer = StringIO()
+            stdout_lines = self.result_stdout_raw_handle().readlines()
+            absolute_end = len(stdout_lines)
+            for line in stdout_lines[start_line:end_line]:
+                return_buffer.write(line)
+            if start_line < 0:
+                start_actual = len(stdout_lines) + start_line
                 end_actual = len(stdout_lines)
+            else:
+                start_actual = start_line
+                if end_line is not None:
+                    end_actual = min(end_line, len(stdout_lines))
+                else:
+                    end_actual = len(stdout_lines)
+            return_buffer = return_buffer.getvalue()
 
-        return_buffer = return_buffer.getvalue()
         if redact_sensitive:
             return_buffer = UriCleaner.remove_sensitive(return_buffer)
         if escape_ascii:
@@ -1180,10 +1328,16 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
         except JobLaunchConfig.DoesNotExist:
             return False
 
-    @property
-    def task_impact(self):
+    def _get_task_impact(self):
         raise NotImplementedError # Implement in subclass.
 
+    def get_task_impact(self):
+        '''
+        The stored task_impact or, for jobs it hasn't been stored for yet
+        (still pending, or started before it was stored), the computed one.
+        '''
+        return self.task_impact or self._get_task_impact()
+
     def websocket_emit_data(self):
         ''' Return extra data that should be included when submitting data to the browser over the websocket connection '''
         websocket_data = dict()
@@ -11,7 +11,12 @@ from django.conf import settings
 
 # Kombu
 from kombu import Connection, Exchange, Producer
-from kombu.serialization import registry
+from kombu.serialization import dumps, registry
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 __all__ = ['CallbackQueueDispatcher']
 
@@ -36,6 +41,28 @@ registry.register(
 )
 
 
+def ansible_msgpack_default(o):
+    if getattr(o, 'yaml_tag', None) == '!vault':
+        return o.data
+    raise TypeError('{!r} is not msgpack serializable'.format(o))
+
+
+if msgpack is not None:
+    registry.register(
+        'msgpack-ansible',
+        lambda obj: msgpack.packb(obj, default=ansible_msgpack_default, use_bin_type=True),
+        lambda obj: msgpack.unpackb(obj, raw=False),
+        content_type='application/x-msgpack',
+        content_encoding='binary'
+    )
+
+# maps CALLBACK_EVENT_CODEC values to kombu serializers
+EVENT_SERIALIZERS = {
+    'json': 'json-ansible',
+    'msgpack': 'msgpack-ansible',
+}
+
+
 class CallbackQueueDispatcher(object):
 
     def __init__(self):
@@ -44,10 +71,38 @@ class CallbackQueueDispatcher(object):
         self.connection = None
         self.exchange = None
         self.logger = logging.getLogger('awx.main.queue.CallbackQueueDispatcher')
+        codec = getattr(settings, 'CALLBACK_EVENT_CODEC', 'json')
+        self.serializer = EVENT_SERIALIZERS.get(codec)
+        if self.serializer is None or (self.serializer == 'msgpack-ansible' and msgpack is None):
+            self.logger.error('Event codec {} is not available, using json'.format(codec))
+            self.serializer = 'json-ansible'
+        self.compression = getattr(settings, 'CALLBACK_EVENT_COMPRESSION', None) or None
+        self.compression_threshold = getattr(settings, 'CALLBACK_EVENT_COMPRESSION_THRESHOLD', 0)
+
+    def encode(self, obj):
+        '''
+        Serialize an event; returns the message body and the kwargs that
+        describe its encoding to the callback receiver.
+        '''
+        content_type, content_encoding, body = dumps(obj, serializer=self.serializer)
+        compression = None
+        if self.compression and len(body) >= self.compression_threshold:
+            compression = self.compression
+        # kombu decodes messages based on their content type and compression
+        # headers; the codec header is informational, and lets receivers of
+        # mixed-version clusters see how each event was encoded
+        codec = '+'.join(filter(None, [self.serializer.split('-')[0], compression]))
+        return body, dict(
+            content_type=content_type,
+            content_encoding=content_encoding,
+            compression=compression,
+            headers={'awx_event_codec': codec}
+        )
 
     def dispatch(self, obj):
         if not self.callback_connection or not self.connection_queue:
             return
+        body, encoding = self.encode(obj)
         active_pid = os.getpid()
         for retry_count in range(4):
             try:
@@ -60,13 +115,12 @@ class CallbackQueueDispatcher(object):
                     self.exchange = Exchange(self.connection_queue, type='direct')
 
                 producer = Producer(self.connection)
-                producer.publish(obj,
-                                 serializer='json-ansible',
-                                 compression='bzip2',
+                producer.publish(body,
                                  exchange=self.exchange,
                                  declare=[self.exchange],
                                  delivery_mode="persistent" if settings.PERSISTENT_CALLBACK_MESSAGES else "transient",
-                                 routing_key=self.connection_queue)
+                                 routing_key=self.connection_queue,
+                                 **encoding)
                 return
             except Exception as e:
                 self.logger.info('Publish Job Event Exception: %r, retry=%d', e,
@@ -9,15 +9,22 @@ class UriCleaner(object):
     SENSITIVE_URI_PATTERN = re.compile(r'(\w+:(\/?\/?)[^\s]+)', re.MULTILINE)  # NOQA
 
     @staticmethod
-    def remove_sensitive(cleartext):
-        redactedtext = cleartext
-        text_index = 0
+    def _redact(text, output, endpos=None, text_index=0):
+        '''
+        Append text[:endpos] to the list `output`, with the credentials in
+        any URIs replaced, and return the position the next search would
+        start from.  Text between matches is copied once, so this is linear
+        in the size of the text no matter how many URIs it contains.
+        '''
+        if endpos is None:
+            endpos = len(text)
+        copied = 0
         while True:
-            match = UriCleaner.SENSITIVE_URI_PATTERN.search(redactedtext, text_index)
+            match = UriCleaner.SENSITIVE_URI_PATTERN.search(text, text_index, endpos)
             if not match:
                 break
+            uri_str = match.group(1)
             try:
-                uri_str = match.group(1)
                 # May raise a ValueError if invalid URI for one reason or another
                 o = urlparse.urlsplit(uri_str)
 
@@ -27,37 +34,77 @@ class UriCleaner(object):
                         # on account of a bug? in ansible redaction
                         (username, password) = o.netloc.split(':')
                     else:
-                        text_index += len(match.group(1))
+                        text_index += len(uri_str)
                         continue
                 else:
                     username = o.username
                     password = o.password
 
-                # Given a python MatchObject, with respect to redactedtext, find and
-                # replace the first occurance of username and the first and second
-                # occurance of password
-
-                uri_str = redactedtext[match.start():match.end()]
+                # replace the first occurance of username and the first and
+                # second occurance of password
                 if username:
                     uri_str = uri_str.replace(username, UriCleaner.REPLACE_STR, 1)
                 # 2, just in case the password is $encrypted$
                 if password:
                     uri_str = uri_str.replace(password, UriCleaner.REPLACE_STR, 2)
-
-                t = redactedtext[:match.start()] + uri_str
-                text_index = len(t)
-                if (match.end() < len(redactedtext)):
-                    t += redactedtext[match.end():]
-
-                redactedtext = t
-                if text_index >= len(redactedtext):
-                    text_index = len(redactedtext) - 1
             except ValueError:
                 # Invalid URI, redact the whole URI to be safe
-                redactedtext = redactedtext[:match.start()] + UriCleaner.REPLACE_STR + redactedtext[match.end():]
-                text_index = match.start() + len(UriCleaner.REPLACE_STR)
+                uri_str = UriCleaner.REPLACE_STR
+
+            output.append(text[copied:match.start()])
+            output.append(uri_str)
+            copied = text_index = match.end()
+        output.append(text[copied:endpos])
+        return text_index
+
+    @staticmethod
+    def remove_sensitive(cleartext):
+        output = []
+        UriCleaner._redact(cleartext, output)
+        return ''.join(output)
+
+
+class UriCleanerStream(object):
+    '''
+    Applies `UriCleaner.remove_sensitive` to text that arrives in chunks
+    (such as a stdout download), in memory proportional to the chunk size.
+
+    A URI never contains whitespace, so each call to `feed` redacts and
+    returns the text up to the last whitespace it has seen; the rest is
+    carried over and redacted along with the next chunk, so URIs that span
+    chunks are still found.  The position the next search starts from is
+    carried over too (relative to the carried text), so the output is the
+    same as redacting all of the text at once.  A run of more than MAX_CARRY
+    characters with no whitespace is redacted as if it ended where it was
+    cut.
+    '''
+
+    MAX_CARRY = 1024 * 1024
+    WHITESPACE = ' \n\t\r\f\v'
+
+    def __init__(self):
+        self.carry = ''
+        self.text_index = 0
+
+    def feed(self, data):
+        text = self.carry + data
+        cut = max(text.rfind(c) for c in self.WHITESPACE) + 1
+        if cut == 0:
+            if len(text) <= self.MAX_CARRY:
+                self.carry = text
+                return ''
+            cut = len(text)
+        output = []
+        self.text_index = UriCleaner._redact(text, output, cut, self.text_index) - cut
+        self.carry = text[cut:]
+        return ''.join(output)
 
-        return redactedtext
+    def flush(self):
+        output = []
+        UriCleaner._redact(self.carry, output, text_index=self.text_index)
+        self.carry = ''
+        self.text_index = 0
+        return ''.join(output)
 
 
 class PlainTextCleaner(object):
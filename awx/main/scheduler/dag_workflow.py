@@ -4,6 +4,7 @@ from django.utils.encoding import smart_text
 
 # Python
 from awx.main.models import (
+    UnifiedJob,
     WorkflowJobTemplateNode,
     WorkflowJobNode,
 )
@@ -222,3 +223,105 @@ class WorkflowDAG(SimpleDAG):
                         nodes_marked_do_not_run.append(node)
 
         return [n['node_object'] for n in nodes_marked_do_not_run]
+
+
+class WorkflowDAGCache(object):
+    '''
+    Per-process cache of the WorkflowDAG of each running workflow job, keyed
+    by workflow job id.
+
+    The topology of a workflow job never changes after launch, so its nodes
+    and edges are only queried the first time the workflow is seen.  On every
+    later cycle the state that does change (each node's job and its status,
+    and do_not_run) is refreshed for all of the cached workflows with a single
+    query.  A workflow job is dropped from the cache
+    when it's evicted or no longer running.
+    '''
+
+    def __init__(self):
+        self.dags = dict()
+
+    def __contains__(self, workflow_job_id):
+        return workflow_job_id in self.dags
+
+    def __len__(self):
+        return len(self.dags)
+
+    def get_dags(self, workflow_jobs):
+        '''
+        Return a dict of workflow job id -> WorkflowDAG, with node state that
+        is current as of this call, for each of the given running workflow jobs.
+        '''
+        workflow_jobs_by_id = dict((wj.id, wj) for wj in workflow_jobs)
+        for workflow_job_id, (created, dag) in list(self.dags.items()):
+            workflow_job = workflow_jobs_by_id.get(workflow_job_id)
+            if workflow_job is None or workflow_job.created != created:
+                # finished, deleted, or a different workflow job reusing the id
+                del self.dags[workflow_job_id]
+
+        stale = self.refresh(workflow_jobs_by_id)
+        for workflow_job_id in stale:
+            del self.dags[workflow_job_id]
+
+        for workflow_job in workflow_jobs:
+            if workflow_job.id not in self.dags:
+                self.dags[workflow_job.id] = (workflow_job.created, WorkflowDAG(workflow_job))
+        return dict((workflow_job_id, self.dags[workflow_job_id][1]) for workflow_job_id in workflow_jobs_by_id)
+
+    def refresh(self, workflow_jobs_by_id):
+        '''
+        Update the node state of every cached DAG from the database, and
+        return the ids of the workflow jobs whose nodes no longer match the
+        cached topology.
+        '''
+        if not self.dags:
+            return set()
+        nodes_by_id = dict()
+        for workflow_job_id, (created, dag) in self.dags.items():
+            for node in dag.nodes:
+                obj = node['node_object']
+                # keep the nodes pointing at this cycle's workflow job
+                obj.workflow_job = workflow_jobs_by_id[workflow_job_id]
+                nodes_by_id[obj.id] = obj
+
+        stale = set()
+        seen = set()
+        new_jobs = dict()
+        rows = WorkflowJobNode.objects.filter(workflow_job_id__in=list(self.dags)).values_list(
+            'workflow_job_id', 'id', 'do_not_run', 'unified_job_template_id', 'job_id', 'job__status'
+        )
+        for workflow_job_id, node_id, do_not_run, ujt_id, job_id, job_status in rows:
+            obj = nodes_by_id.get(node_id)
+            if obj is None:
+                stale.add(workflow_job_id)
+                continue
+            seen.add(node_id)
+            if obj.unified_job_template_id != ujt_id or (job_id is None and obj.job_id is not None):
+                # the node's template or job was deleted; rebuild the DAG
+                stale.add(workflow_job_id)
+                continue
+            obj.do_not_run = do_not_run
+            if job_id is None:
+                continue
+            elif obj.job_id == job_id and obj.job is not None:
+                obj.job.status = job_status
+            else:
+                # spawned since this DAG was built (possibly by another process)
+                new_jobs.setdefault(job_id, []).append(obj)
+        for node_id in set(nodes_by_id) - seen:
+            stale.add(nodes_by_id[node_id].workflow_job_id)
+
+        if new_jobs:
+            for job in UnifiedJob.objects.filter(pk__in=list(new_jobs)):
+                for obj in new_jobs[job.pk]:
+                    obj.job = job
+        return stale
+
+    def evict(self, workflow_job_id):
+        self.dags.pop(workflow_job_id, None)
+
+    def clear(self):
+        self.dags = dict()
+
+
+workflow_dag_cache = WorkflowDAGCache()
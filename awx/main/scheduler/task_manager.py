@@ -10,6 +10,7 @@ import random
 
 # Django
 from django.db import transaction, connection
+from django.db.models import F, OuterRef, Subquery
 from django.utils.translation import ugettext_lazy as _
 from django.utils.timezone import now as tz_now
 
@@ -23,10 +24,11 @@ from awx.main.models import (
     Project,
     ProjectUpdate,
     SystemJob,
+    UnifiedJobTemplate,
     WorkflowJob,
     WorkflowJobTemplate
 )
-from awx.main.scheduler.dag_workflow import WorkflowDAG
+from awx.main.scheduler.dag_workflow import WorkflowDAG, workflow_dag_cache
 from awx.main.utils.pglock import advisory_lock
 from awx.main.utils import get_type_for_model, task_manager_bulk_reschedule, schedule_task_manager
 from awx.main.signals import disable_activity_stream
@@ -41,10 +43,32 @@ class TaskManager():
 
     def __init__(self):
         self.graph = dict()
-        for rampart_group in InstanceGroup.objects.prefetch_related('instances'):
+        # per-cycle lookups used when generating job dependencies, see _schedule()
+        self.inventory_sources_by_inventory = dict()
+        self.latest_project_updates = None
+        self.latest_inventory_updates = None
+        # DAGs of the running workflow jobs, see workflow_dag_cache
+        self.workflow_dags = dict()
+        # in-memory capacity snapshot of every instance, keyed by hostname, see
+        # calculate_capacity_consumed(); instances are placed on without
+        # querying their running jobs
+        self.instances = dict()
+        self.instance_groups = list(InstanceGroup.objects.prefetch_related('instances'))
+        for rampart_group in self.instance_groups:
+            group_instances = sorted(
+                [i for i in rampart_group.instances.all() if i.capacity > 0],
+                key=lambda i: i.hostname
+            )
+            for instance in group_instances:
+                self.instances.setdefault(instance.hostname, dict(instance=instance,
+                                                                  capacity=instance.capacity,
+                                                                  enabled=instance.enabled,
+                                                                  consumed_capacity=0,
+                                                                  jobs_running=0))
             self.graph[rampart_group.name] = dict(graph=DependencyGraph(rampart_group.name),
                                                   capacity_total=rampart_group.capacity,
-                                                  consumed_capacity=0)
+                                                  consumed_capacity=0,
+                                                  instances=[i.hostname for i in group_instances])
 
     def is_job_blocked(self, task):
         # TODO: I'm not happy with this, I think blocking behavior should be decided outside of the dependency graph
@@ -60,7 +84,8 @@ class TaskManager():
         return False
 
     def get_tasks(self, status_list=('pending', 'waiting', 'running')):
-        jobs = [j for j in Job.objects.filter(status__in=status_list).prefetch_related('instance_group')]
+        jobs = [j for j in Job.objects.filter(status__in=status_list).select_related(
+            'project').prefetch_related('instance_group', 'dependent_jobs')]
         inventory_updates_qs = InventoryUpdate.objects.filter(
             status__in=status_list).exclude(source='file').prefetch_related('inventory_source', 'instance_group')
         inventory_updates = [i for i in inventory_updates_qs]
@@ -100,18 +125,63 @@ class TaskManager():
                 inventory_ids.add(task.inventory_id)
         return [invsrc for invsrc in InventorySource.objects.filter(inventory_id__in=inventory_ids, update_on_launch=True)]
 
+    def get_latest_project_updates(self, all_sorted_tasks):
+        '''
+        Return the latest check ProjectUpdate of the project of every pending
+        job, keyed by project id (one query, rather than one per job).
+        '''
+        project_ids = set()
+        for task in all_sorted_tasks:
+            if isinstance(task, Job) and task.status == 'pending' and task.project_id:
+                project_ids.add(task.project_id)
+        latest = ProjectUpdate.objects.filter(
+            project=OuterRef('project'), job_type='check'
+        ).order_by('-created').values('pk')[:1]
+        return dict(
+            (pu.project_id, pu) for pu in ProjectUpdate.objects.filter(
+                project_id__in=project_ids, job_type='check'
+            ).annotate(latest_pk=Subquery(latest)).filter(pk=F('latest_pk')).select_related('project')
+        )
+
+    def get_latest_inventory_updates(self, inventory_sources):
+        '''
+        Return the latest InventoryUpdate of each of the given inventory
+        sources, keyed by inventory source id (one query, rather than one per
+        job and inventory source).
+        '''
+        latest = InventoryUpdate.objects.filter(
+            inventory_source=OuterRef('inventory_source')
+        ).order_by('-created').values('pk')[:1]
+        return dict(
+            (iu.inventory_source_id, iu) for iu in InventoryUpdate.objects.filter(
+                inventory_source_id__in=[invsrc.id for invsrc in inventory_sources]
+            ).annotate(latest_pk=Subquery(latest)).filter(pk=F('latest_pk')).select_related('inventory_source')
+        )
+
+    def get_workflow_dag(self, workflow_job):
+        dag = self.workflow_dags.get(workflow_job.id)
+        if dag is None:
+            dag = WorkflowDAG(workflow_job)
+        return dag
+
     def spawn_workflow_graph_jobs(self, workflow_jobs):
         for workflow_job in workflow_jobs:
             if workflow_job.cancel_flag:
                 logger.debug('Not spawning jobs for %s because it is pending cancelation.', workflow_job.log_format)
                 continue
-            dag = WorkflowDAG(workflow_job)
+            dag = self.get_workflow_dag(workflow_job)
             spawn_nodes = dag.bfs_nodes_to_run()
             if spawn_nodes:
                 logger.info('Spawning jobs for %s', workflow_job.log_format)
             else:
                 logger.debug('No nodes to spawn for %s', workflow_job.log_format)
             for spawn_node in spawn_nodes:
+                if spawn_node.unified_job_template_id is not None:
+                    # a cached DAG may have loaded the template several cycles
+                    # ago; launch from its current state
+                    spawn_node.unified_job_template = UnifiedJobTemplate.objects.filter(
+                        pk=spawn_node.unified_job_template_id
+                    ).first()
                 if spawn_node.unified_job_template is None:
                     continue
                 kv = spawn_node.get_job_kwargs()
@@ -150,7 +220,7 @@ class TaskManager():
                 if not can_start:
                     job.status = 'failed'
                     job.save(update_fields=['status', 'job_explanation'])
-                    job.websocket_emit_status('failed')
+                    self.emit_status(job, 'failed')
 
                 # TODO: should we emit a status on the socket here similar to tasks.py awx_periodic_scheduler() ?
                 #emit_websocket_notification('/socket.io/jobs', '', dict(id=))
@@ -158,9 +228,11 @@ class TaskManager():
     def process_finished_workflow_jobs(self, workflow_jobs):
         result = []
         for workflow_job in workflow_jobs:
-            dag = WorkflowDAG(workflow_job)
             status_changed = False
             if workflow_job.cancel_flag:
+                # canceling needs the current state of every spawned job
+                workflow_dag_cache.evict(workflow_job.id)
+                dag = WorkflowDAG(workflow_job)
                 workflow_job.workflow_nodes.filter(do_not_run=False, job__isnull=True).update(do_not_run=True)
                 logger.debug('Canceling spawned jobs of %s due to cancel flag.', workflow_job.log_format)
                 cancel_finished = dag.cancel_node_jobs()
@@ -171,6 +243,7 @@ class TaskManager():
                     workflow_job.save(update_fields=['status', 'start_args'])
                     status_changed = True
             else:
+                dag = self.get_workflow_dag(workflow_job)
                 workflow_nodes = dag.mark_dnr_nodes()
                 for n in workflow_nodes:
                     n.save(update_fields=['do_not_run'])
@@ -192,17 +265,16 @@ class TaskManager():
                 workflow_job.save(update_fields=update_fields)
                 status_changed = True
             if status_changed:
-                workflow_job.websocket_emit_status(workflow_job.status)
+                workflow_dag_cache.evict(workflow_job.id)
+                self.emit_status(workflow_job, workflow_job.status)
                 if workflow_job.spawned_by_workflow:
-                    schedule_task_manager()
+                    self.reschedule()
         return result
 
     def get_dependent_jobs_for_inv_and_proj_update(self, job_obj):
         return [{'type': j.model_to_str(), 'id': j.id} for j in job_obj.dependent_jobs.all()]
 
     def start_task(self, task, rampart_group, dependent_tasks=None, instance=None):
-        from awx.main.tasks import handle_work_error, handle_work_success
-
         dependent_tasks = dependent_tasks or []
 
         task_actual = {
@@ -234,7 +306,7 @@ class TaskManager():
             if type(task) is WorkflowJob:
                 task.status = 'running'
                 logger.info('Transitioning %s to running status.', task.log_format)
-                schedule_task_manager()
+                self.reschedule()
             elif not task.supports_isolation() and rampart_group.controller_id:
                 # non-Ansible jobs on isolated instances run on controller
                 task.instance_group = rampart_group.controller
@@ -259,29 +331,44 @@ class TaskManager():
 
             if rampart_group is not None:
                 self.consume_capacity(task, rampart_group.name)
+            self.consume_instance_capacity(task, task.execution_node)
 
         def post_commit():
             if task.status != 'failed' and type(task) is not WorkflowJob:
-                task_cls = task._get_task_class()
-                task_cls.apply_async(
-                    [task.pk],
-                    opts,
-                    queue=task.get_queue_name(),
-                    uuid=task.celery_task_id,
-                    callbacks=[{
-                        'task': handle_work_success.name,
-                        'kwargs': {'task_actual': task_actual}
-                    }],
-                    errbacks=[{
-                        'task': handle_work_error.name,
-                        'args': [task.celery_task_id],
-                        'kwargs': {'subtasks': [task_actual] + dependencies}
-                    }],
-                )
-
-        task.websocket_emit_status(task.status)  # adds to on_commit
+                self.dispatch_task(task, opts, task_actual, dependencies)
+
+        self.emit_status(task, task.status)  # adds to on_commit
         connection.on_commit(post_commit)
 
+    def dispatch_task(self, task, opts, task_actual, dependencies):
+        '''
+        Send a started task to the dispatcher, to run on its execution node.
+        '''
+        from awx.main.tasks import handle_work_error, handle_work_success
+
+        task_cls = task._get_task_class()
+        task_cls.apply_async(
+            [task.pk],
+            opts,
+            queue=task.get_queue_name(),
+            uuid=task.celery_task_id,
+            callbacks=[{
+                'task': handle_work_success.name,
+                'kwargs': {'task_actual': task_actual}
+            }],
+            errbacks=[{
+                'task': handle_work_error.name,
+                'args': [task.celery_task_id],
+                'kwargs': {'subtasks': [task_actual] + dependencies}
+            }],
+        )
+
+    def emit_status(self, task, status):
+        task.websocket_emit_status(status)
+
+    def reschedule(self):
+        schedule_task_manager()
+
     def process_running_tasks(self, running_tasks):
         for task in running_tasks:
             if task.instance_group:
@@ -327,6 +414,8 @@ class TaskManager():
                 dep.dependent_jobs.add(*([task] + [d for d in dependencies if d != dep]))
 
     def get_latest_inventory_update(self, inventory_source):
+        if self.latest_inventory_updates is not None:
+            return self.latest_inventory_updates.get(inventory_source.id)
         latest_inventory_update = InventoryUpdate.objects.filter(inventory_source=inventory_source).order_by("-created")
         if not latest_inventory_update.exists():
             return None
@@ -357,6 +446,8 @@ class TaskManager():
         return False
 
     def get_latest_project_update(self, job):
+        if self.latest_project_updates is not None:
+            return self.latest_project_updates.get(job.project_id)
         latest_project_update = ProjectUpdate.objects.filter(project=job.project, job_type='check').order_by("-created")
         if not latest_project_update.exists():
             return None
@@ -406,16 +497,22 @@ class TaskManager():
                 if self.should_update_related_project(task, latest_project_update):
                     project_task = self.create_project_update(task)
                     dependencies.append(project_task)
+                    if self.latest_project_updates is not None:
+                        # later jobs of this cycle should depend on it, too
+                        self.latest_project_updates[task.project_id] = project_task
                 else:
                     if latest_project_update.status in ['waiting', 'pending', 'running']:
                         dependencies.append(latest_project_update)
 
             # Inventory created 2 seconds behind job
-            try:
-                start_args = json.loads(decrypt_field(task, field_name="start_args"))
-            except ValueError:
-                start_args = dict()
-            for inventory_source in [invsrc for invsrc in self.all_inventory_sources if invsrc.inventory == task.inventory]:
+            inventory_sources = self.inventory_sources_by_inventory.get(task.inventory_id, [])
+            start_args = dict()
+            if inventory_sources and task.start_args:
+                try:
+                    start_args = json.loads(decrypt_field(task, field_name="start_args"))
+                except ValueError:
+                    pass
+            for inventory_source in inventory_sources:
                 if "inventory_sources_already_updated" in start_args and inventory_source.id in start_args['inventory_sources_already_updated']:
                     continue
                 if not inventory_source.update_on_launch:
@@ -424,6 +521,8 @@ class TaskManager():
                 if self.should_update_inventory_source(task, latest_inventory_update):
                     inventory_task = self.create_inventory_update(task, inventory_source)
                     dependencies.append(inventory_task)
+                    if self.latest_inventory_updates is not None:
+                        self.latest_inventory_updates[inventory_source.id] = inventory_task
                 else:
                     if latest_inventory_update.status in ['waiting', 'pending', 'running']:
                         dependencies.append(latest_inventory_update)
@@ -437,17 +536,18 @@ class TaskManager():
             if self.is_job_blocked(task):
                 logger.debug("Dependent {} is blocked from running".format(task.log_format))
                 continue
+            self.compute_task_impact(task)
             preferred_instance_groups = task.preferred_instance_groups
             found_acceptable_queue = False
             idle_instance_that_fits = None
             for rampart_group in preferred_instance_groups:
                 if idle_instance_that_fits is None:
-                    idle_instance_that_fits = rampart_group.find_largest_idle_instance()
+                    idle_instance_that_fits = self.find_largest_idle_instance(rampart_group.name)
                 if self.get_remaining_capacity(rampart_group.name) <= 0:
                     logger.debug("Skipping group {} capacity <= 0".format(rampart_group.name))
                     continue
 
-                execution_instance = rampart_group.fit_task_to_most_remaining_capacity_instance(task)
+                execution_instance = self.fit_task_to_most_remaining_capacity_instance(task, rampart_group.name)
                 if execution_instance:
                     logger.debug("Starting dependent {} in group {} instance {}".format(
                                  task.log_format, rampart_group.name, execution_instance.hostname))
@@ -475,6 +575,7 @@ class TaskManager():
             if self.is_job_blocked(task):
                 logger.debug("{} is blocked from running".format(task.log_format))
                 continue
+            self.compute_task_impact(task)
             preferred_instance_groups = task.preferred_instance_groups
             found_acceptable_queue = False
             idle_instance_that_fits = None
@@ -489,14 +590,14 @@ class TaskManager():
                 continue
             for rampart_group in preferred_instance_groups:
                 if idle_instance_that_fits is None:
-                    idle_instance_that_fits = rampart_group.find_largest_idle_instance()
+                    idle_instance_that_fits = self.find_largest_idle_instance(rampart_group.name)
                 remaining_capacity = self.get_remaining_capacity(rampart_group.name)
                 if remaining_capacity <= 0:
                     logger.debug("Skipping group {}, remaining_capacity {} <= 0".format(
                                  rampart_group.name, remaining_capacity))
                     continue
 
-                execution_instance = rampart_group.fit_task_to_most_remaining_capacity_instance(task)
+                execution_instance = self.fit_task_to_most_remaining_capacity_instance(task, rampart_group.name)
                 if execution_instance:
                     logger.debug("Starting {} in group {} instance {} (remaining_capacity={})".format(
                                  task.log_format, rampart_group.name, execution_instance.hostname, remaining_capacity))
@@ -516,20 +617,67 @@ class TaskManager():
                 logger.debug("{} couldn't be scheduled on graph, waiting for next cycle".format(task.log_format))
 
     def calculate_capacity_consumed(self, tasks):
-        self.graph = InstanceGroup.objects.capacity_values(tasks=tasks, graph=self.graph)
+        self.graph = InstanceGroup.objects.capacity_values(qs=self.instance_groups, tasks=tasks, graph=self.graph)
+        for instance in self.instances.values():
+            instance['consumed_capacity'] = 0
+            instance['jobs_running'] = 0
+        for task in tasks:
+            self.consume_instance_capacity(task, task.execution_node)
+
+    def compute_task_impact(self, task):
+        '''
+        Work out the impact of a pending task; it's persisted when the task
+        is started, and the stored value is used from then on.
+        '''
+        if task.status == 'pending':
+            task.task_impact = task._get_task_impact()
+
+    def consume_instance_capacity(self, task, hostname):
+        if hostname not in self.instances:
+            return
+        self.instances[hostname]['consumed_capacity'] += task.get_task_impact()
+        self.instances[hostname]['jobs_running'] += 1
+
+    def fit_task_to_most_remaining_capacity_instance(self, task, instance_group):
+        '''
+        Return the enabled instance of the group with the most remaining
+        capacity, provided the task fits on it.
+        '''
+        impact = task.get_task_impact()
+        instance_most_capacity = None
+        most_remaining_capacity = None
+        for hostname in self.graph[instance_group]['instances']:
+            i = self.instances[hostname]
+            if not i['enabled']:
+                continue
+            remaining_capacity = i['capacity'] - i['consumed_capacity']
+            if remaining_capacity >= impact and \
+                    (instance_most_capacity is None or remaining_capacity > most_remaining_capacity):
+                instance_most_capacity = i['instance']
+                most_remaining_capacity = remaining_capacity
+        return instance_most_capacity
+
+    def find_largest_idle_instance(self, instance_group):
+        largest_instance = None
+        for hostname in self.graph[instance_group]['instances']:
+            i = self.instances[hostname]
+            if i['jobs_running'] == 0:
+                if largest_instance is None or i['capacity'] > largest_instance['capacity']:
+                    largest_instance = i
+        return largest_instance['instance'] if largest_instance else None
 
     def would_exceed_capacity(self, task, instance_group):
         current_capacity = self.graph[instance_group]['consumed_capacity']
         capacity_total = self.graph[instance_group]['capacity_total']
         if current_capacity == 0:
             return False
-        return (task.task_impact + current_capacity > capacity_total)
+        return (task.get_task_impact() + current_capacity > capacity_total)
 
     def consume_capacity(self, task, instance_group):
         logger.debug('{} consumed {} capacity units from {} with prior total of {}'.format(
-                     task.log_format, task.task_impact, instance_group,
+                     task.log_format, task.get_task_impact(), instance_group,
                      self.graph[instance_group]['consumed_capacity']))
-        self.graph[instance_group]['consumed_capacity'] += task.task_impact
+        self.graph[instance_group]['consumed_capacity'] += task.get_task_impact()
 
     def get_remaining_capacity(self, instance_group):
         return (self.graph[instance_group]['capacity_total'] - self.graph[instance_group]['consumed_capacity'])
@@ -556,8 +704,14 @@ class TaskManager():
             # self.process_latest_inventory_updates(latest_inventory_updates)
 
             self.all_inventory_sources = self.get_inventory_source_tasks(all_sorted_tasks)
+            self.inventory_sources_by_inventory = dict()
+            for inventory_source in self.all_inventory_sources:
+                self.inventory_sources_by_inventory.setdefault(inventory_source.inventory_id, []).append(inventory_source)
+            self.latest_project_updates = self.get_latest_project_updates(all_sorted_tasks)
+            self.latest_inventory_updates = self.get_latest_inventory_updates(self.all_inventory_sources)
 
             running_workflow_tasks = self.get_running_workflow_jobs()
+            self.workflow_dags = workflow_dag_cache.get_dags(running_workflow_tasks)
             finished_wfjs = self.process_finished_workflow_jobs(running_workflow_tasks)
 
             previously_running_workflow_tasks = running_workflow_tasks
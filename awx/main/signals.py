@@ -38,10 +38,11 @@ from awx.main.models import (
     UnifiedJobTemplate, User, UserSessionMembership,
     ROLE_SINGLETON_SYSTEM_ADMINISTRATOR
 )
+from awx.main.models.rbac import invalidate_accessible_pks
 from awx.main.constants import CENSOR_VALUE
 from awx.main.utils import model_instance_diff, model_to_dict, camelcase_to_underscore, get_current_apps
 from awx.main.utils import ignore_inventory_computed_fields, ignore_inventory_group_removal, _inventory_updates
-from awx.main.tasks import update_inventory_computed_fields
+from awx.main.tasks import schedule_inventory_computed_fields
 from awx.main.fields import (
     is_implicit_parent,
     update_role_parentage_for_instance,
@@ -78,9 +79,9 @@ def emit_event_detail(serializer, relation, **kwargs):
     created = kwargs['created']
     if created:
         event_serializer = serializer(instance)
-        consumers.emit_channel_notification(
+        consumers.event_broadcaster.send(
             '-'.join([event_serializer.get_group_name(instance), str(getattr(instance, relation))]),
-            event_serializer.data
+            lambda: event_serializer.data
         )
 
 
@@ -114,14 +115,19 @@ def emit_update_inventory_computed_fields(sender, **kwargs):
     if getattr(_inventory_updates, 'is_updating', False):
         return
     instance = kwargs['instance']
+    scope = Inventory.COMPUTED_FIELDS_ALL
     if sender == Group.hosts.through:
         sender_name = 'group.hosts'
+        scope = Inventory.COMPUTED_FIELDS_GROUPS | Inventory.COMPUTED_FIELDS_COUNTS
     elif sender == Group.parents.through:
         sender_name = 'group.parents'
+        scope = Inventory.COMPUTED_FIELDS_GROUPS | Inventory.COMPUTED_FIELDS_COUNTS
     elif sender == Host.inventory_sources.through:
         sender_name = 'host.inventory_sources'
+        scope = Inventory.COMPUTED_FIELDS_HOSTS | Inventory.COMPUTED_FIELDS_COUNTS
     elif sender == Group.inventory_sources.through:
         sender_name = 'group.inventory_sources'
+        scope = Inventory.COMPUTED_FIELDS_GROUPS | Inventory.COMPUTED_FIELDS_COUNTS
     else:
         sender_name = str(sender._meta.verbose_name)
     if kwargs['signal'] == post_save:
@@ -141,7 +147,7 @@ def emit_update_inventory_computed_fields(sender, **kwargs):
     except Inventory.DoesNotExist:
         pass
     else:
-        update_inventory_computed_fields.delay(inventory.id, True)
+        schedule_inventory_computed_fields(inventory.id, scope)
 
 
 def emit_update_inventory_on_created_or_deleted(sender, **kwargs):
@@ -156,13 +162,19 @@ def emit_update_inventory_on_created_or_deleted(sender, **kwargs):
     sender_name = str(sender._meta.verbose_name)
     logger.debug("%s created or deleted, updating inventory computed fields: %r %r",
                  sender_name, sender, kwargs)
+    # deleting an inventory source also drops its host and group
+    # memberships, without an m2m_changed, so it refreshes everything
+    if sender == Group:
+        scope = Inventory.COMPUTED_FIELDS_GROUPS | Inventory.COMPUTED_FIELDS_COUNTS
+    else:
+        scope = Inventory.COMPUTED_FIELDS_ALL
     try:
         inventory = instance.inventory
     except Inventory.DoesNotExist:
         pass
     else:
         if inventory is not None:
-            update_inventory_computed_fields.delay(inventory.id, True)
+            schedule_inventory_computed_fields(inventory.id, scope)
 
 
 def rebuild_role_ancestor_list(reverse, model, instance, pk_set, action, **kwargs):
@@ -180,6 +192,14 @@ def rebuild_role_ancestor_list(reverse, model, instance, pk_set, action, **kwarg
             model.rebuild_role_ancestor_list([], [instance.id])
 
 
+def invalidate_accessible_pks_of_members(reverse, instance, pk_set, action, **kwargs):
+    'When users are added to or removed from a role, forget the objects they could access'
+    if action in ['post_add', 'post_remove']:
+        invalidate_accessible_pks([instance.id] if reverse else pk_set)
+    elif action == 'post_clear':
+        invalidate_accessible_pks([instance.id] if reverse else None)
+
+
 def sync_superuser_status_to_rbac(instance, **kwargs):
     'When the is_superuser flag is changed on a user, reflect that in the membership of the System Admnistrator role'
     update_fields = kwargs.get('update_fields', None)
@@ -259,6 +279,7 @@ post_save.connect(emit_project_update_event_detail, sender=ProjectUpdateEvent)
 post_save.connect(emit_inventory_update_event_detail, sender=InventoryUpdateEvent)
 post_save.connect(emit_system_job_event_detail, sender=SystemJobEvent)
 m2m_changed.connect(rebuild_role_ancestor_list, Role.parents.through)
+m2m_changed.connect(invalidate_accessible_pks_of_members, Role.members.through)
 m2m_changed.connect(rbac_activity_stream, Role.members.through)
 m2m_changed.connect(rbac_activity_stream, Role.parents.through)
 post_save.connect(sync_superuser_status_to_rbac, sender=User)
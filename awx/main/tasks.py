@@ -29,7 +29,7 @@ import urllib.parse as urlparse
 
 # Django
 from django.conf import settings
-from django.db import transaction, DatabaseError, IntegrityError
+from django.db import transaction, DatabaseError, IntegrityError, connection
 from django.db.models.fields.related import ForeignKey
 from django.utils.timezone import now, timedelta
 from django.utils.encoding import smart_str
@@ -48,7 +48,7 @@ from awx.main.constants import CLOUD_PROVIDERS, PRIVILEGE_ESCALATION_METHODS, ST
 from awx.main.access import access_registry
 from awx.main.models import (
     Schedule, TowerScheduleState, Instance, InstanceGroup,
-    UnifiedJob, Notification,
+    UnifiedJob, UnifiedJobStdoutArchive, Notification,
     Inventory, SmartInventoryMembership,
     Job, AdHocCommand, ProjectUpdate, InventoryUpdate, SystemJob,
     Project,
@@ -59,6 +59,7 @@ from awx.main.constants import ACTIVE_STATES
 from awx.main.exceptions import AwxTaskError
 from awx.main.queue import CallbackQueueDispatcher
 from awx.main.expect import run, isolated_manager
+from awx.main.expect.event_receiver import EventPayloadReceiver
 from awx.main.dispatch.publish import task
 from awx.main.dispatch import get_local_queuename, reaper
 from awx.main.utils import (get_ansible_version, get_ssh_version, update_scm_url,
@@ -66,6 +67,7 @@ from awx.main.utils import (get_ansible_version, get_ssh_version, update_scm_url
                             wrap_args_with_proot, OutputEventFilter, OutputVerboseFilter, ignore_inventory_computed_fields,
                             ignore_inventory_group_removal, extract_ansible_vars, schedule_task_manager)
 from awx.main.utils.safe_yaml import safe_dump, sanitize_jinja
+from awx.main.utils.stdout_archive import StdoutArchiveWriter
 from awx.main.utils.reload import stop_local_services
 from awx.main.utils.pglock import advisory_lock
 from awx.main.consumers import emit_channel_notification
@@ -76,7 +78,9 @@ from rest_framework.exceptions import PermissionDenied
 
 __all__ = ['RunJob', 'RunSystemJob', 'RunProjectUpdate', 'RunInventoryUpdate',
            'RunAdHocCommand', 'handle_work_error', 'handle_work_success', 'apply_cluster_membership_policies',
-           'update_inventory_computed_fields', 'update_host_smart_inventory_memberships',
+           'update_inventory_computed_fields', 'schedule_inventory_computed_fields',
+           'update_dirty_inventory_computed_fields', 'update_host_smart_inventory_memberships',
+           'schedule_smart_host_memberships',
            'send_notifications', 'run_administrative_checks', 'purge_old_stdout_files']
 
 HIDDEN_PASSWORD = '**********'
@@ -566,7 +570,7 @@ def handle_work_error(task_id, *args, **kwargs):
 
 
 @task()
-def update_inventory_computed_fields(inventory_id, should_update_hosts=True):
+def update_inventory_computed_fields(inventory_id, should_update_hosts=True, should_update_groups=True):
     '''
     Signal handler and wrapper around inventory.update_computed_fields to
     prevent unnecessary recursive calls.
@@ -577,7 +581,7 @@ def update_inventory_computed_fields(inventory_id, should_update_hosts=True):
         return
     i = i[0]
     try:
-        i.update_computed_fields(update_hosts=should_update_hosts)
+        i.update_computed_fields(update_hosts=should_update_hosts, update_groups=should_update_groups)
     except DatabaseError as e:
         if 'did not affect any rows' in str(e):
             logger.debug('Exiting duplicate update_inventory_computed_fields task.')
@@ -585,26 +589,153 @@ def update_inventory_computed_fields(inventory_id, should_update_hosts=True):
         raise
 
 
+INVENTORY_COMPUTED_FIELDS_STATS_KEY = 'awx-inventory-computed-fields-{}'
+
+
+def _count_inventory_computed_fields(name):
+    key = INVENTORY_COMPUTED_FIELDS_STATS_KEY.format(name)
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception:
+        logger.exception('could not record inventory computed fields stats')
+
+
+def schedule_inventory_computed_fields(inventory_id, scope=Inventory.COMPUTED_FIELDS_ALL):
+    '''
+    Arrange for the `scope` parts (Inventory.COMPUTED_FIELDS_* bits) of the
+    computed fields of an inventory to be recomputed.
+
+    With INVENTORY_COMPUTED_FIELDS_DEBOUNCE set, the inventory is only marked
+    dirty here, and `update_dirty_inventory_computed_fields` recomputes it
+    once it has been dirty for that many seconds, however many times it was
+    marked in the meantime; otherwise it is recomputed right away.
+    '''
+    should_update_hosts = bool(scope & Inventory.COMPUTED_FIELDS_HOSTS)
+    should_update_groups = bool(scope & Inventory.COMPUTED_FIELDS_GROUPS)
+    if not settings.INVENTORY_COMPUTED_FIELDS_DEBOUNCE:
+        update_inventory_computed_fields.delay(inventory_id, should_update_hosts, should_update_groups)
+        return
+    if not Inventory.mark_computed_fields_dirty(inventory_id, scope):
+        _count_inventory_computed_fields('coalesced')
+
+
+class SmartHostMembershipStats(object):
+    '''
+    Bring the host memberships of smart inventories up to date, one
+    inventory at a time, and tally the changes for the log.
+    '''
+
+    def __init__(self):
+        self.inventories = self.changed = self.added = self.removed = 0
+        self.started = time.time()
+
+    def update(self, inventories):
+        '''
+        Update the memberships of the `inventories`; return the ones that
+        changed.
+        '''
+        changed_inventories = []
+        for smart_inventory in inventories:
+            added, removed = smart_inventory.update_smart_host_memberships()
+            self.inventories += 1
+            self.added += added
+            self.removed += removed
+            if added or removed:
+                self.changed += 1
+                changed_inventories.append(smart_inventory)
+        return changed_inventories
+
+    def log(self):
+        if self.inventories:
+            logger.info(
+                'Updated host memberships of {} smart inventories ({} changed, '
+                '{} added, {} removed) in {:.3f} seconds'.format(
+                    self.inventories, self.changed, self.added, self.removed,
+                    time.time() - self.started
+                )
+            )
+
+
+def schedule_smart_host_memberships(inventories):
+    '''
+    Arrange for the host memberships of the smart inventories in the queryset
+    `inventories` to be brought up to date by
+    `update_dirty_inventory_computed_fields`, after the usual debounce.
+    '''
+    Inventory.mark_smart_host_memberships_dirty(inventories)
+    if not settings.INVENTORY_COMPUTED_FIELDS_DEBOUNCE:
+        connection.on_commit(lambda: update_dirty_inventory_computed_fields.delay())
+
+
+@task()
+def update_dirty_inventory_computed_fields():
+    '''
+    Recompute the computed fields (and smart host memberships) of the
+    inventories that have been marked dirty by
+    `schedule_inventory_computed_fields` or `schedule_smart_host_memberships`
+    for at least INVENTORY_COMPUTED_FIELDS_DEBOUNCE seconds.
+    '''
+    cutoff = now() - timedelta(seconds=settings.INVENTORY_COMPUTED_FIELDS_DEBOUNCE)
+    dirty = Inventory.objects.filter(
+        computed_fields_dirty__gt=0, computed_fields_dirty_since__lte=cutoff
+    ).order_by('computed_fields_dirty_since').values_list('pk', 'computed_fields_dirty')
+    memberships = SmartHostMembershipStats()
+    for inventory_id, scope in dirty:
+        # another node may have claimed it, or it may have been marked
+        # again since it was listed; then it is picked up next time
+        if not Inventory.claim_computed_fields_dirty(inventory_id, scope):
+            continue
+        try:
+            if scope & Inventory.COMPUTED_FIELDS_SMART_HOSTS:
+                memberships.update(Inventory.objects.filter(pk=inventory_id))
+            update_inventory_computed_fields(inventory_id,
+                                             bool(scope & Inventory.COMPUTED_FIELDS_HOSTS),
+                                             bool(scope & Inventory.COMPUTED_FIELDS_GROUPS))
+        except Exception:
+            logger.exception('Failed to update computed fields of inventory {}'.format(inventory_id))
+            Inventory.mark_computed_fields_dirty(inventory_id, scope)
+        else:
+            _count_inventory_computed_fields('recomputed')
+    memberships.log()
+
+
+def inventory_computed_fields_debug():
+    '''
+    Render the number of inventories waiting for their computed fields to
+    be recomputed, and how many recomputes have been run and coalesced.
+    '''
+    if not settings.INVENTORY_COMPUTED_FIELDS_DEBOUNCE:
+        return ''
+    dirty = Inventory.objects.filter(computed_fields_dirty__gt=0)
+    oldest = dirty.order_by('computed_fields_dirty_since').values_list('computed_fields_dirty_since', flat=True).first()
+    stats = cache.get_many([INVENTORY_COMPUTED_FIELDS_STATS_KEY.format(name) for name in ('recomputed', 'coalesced')])
+    return (
+        '.  inventory computed fields: dirty={dirty} oldest={oldest:0.1f}s'
+        ' recomputed={recomputed} coalesced={coalesced}'.format(
+            dirty=dirty.count(),
+            oldest=(now() - oldest).total_seconds() if oldest else 0,
+            recomputed=stats.get(INVENTORY_COMPUTED_FIELDS_STATS_KEY.format('recomputed'), 0),
+            coalesced=stats.get(INVENTORY_COMPUTED_FIELDS_STATS_KEY.format('coalesced'), 0),
+        )
+    )
+
+
 @task()
 def update_host_smart_inventory_memberships():
+    '''
+    Bring the host memberships of every smart inventory up to date, applying
+    only the rows that changed.
+    '''
+    memberships = SmartHostMembershipStats()
     try:
-        with transaction.atomic():
-            smart_inventories = Inventory.objects.filter(kind='smart', host_filter__isnull=False, pending_deletion=False)
-            SmartInventoryMembership.objects.all().delete()
-            memberships = []
-            changed_inventories = set([])
-            for smart_inventory in smart_inventories:
-                add_for_inventory = [
-                    SmartInventoryMembership(inventory_id=smart_inventory.id, host_id=host_id[0])
-                    for host_id in smart_inventory.hosts.values_list('id')
-                ]
-                memberships.extend(add_for_inventory)
-                if add_for_inventory:
-                    changed_inventories.add(smart_inventory)
-            SmartInventoryMembership.objects.bulk_create(memberships)
+        SmartInventoryMembership.objects.exclude(inventory__kind='smart').delete()
+        changed_inventories = memberships.update(Inventory.objects.filter(kind='smart'))
     except IntegrityError as e:
         logger.error("Update Host Smart Inventory Memberships failed due to an exception: {}".format(e))
         return
+    finally:
+        memberships.log()
     # Update computed fields for changed inventories outside atomic action
     for smart_inventory in changed_inventories:
         smart_inventory.update_computed_fields(update_groups=False, update_hosts=False)
@@ -853,6 +984,8 @@ class BaseTask(object):
         if self.should_use_proot(instance, **kwargs):
             env['PROOT_TMP_DIR'] = settings.AWX_PROOT_BASE_PATH
         env['AWX_PRIVATE_DATA_DIR'] = kwargs['private_data_dir']
+        if kwargs.get('event_receiver'):
+            env['AWX_EVENT_SOCKET'] = kwargs['event_receiver'].path
         return env
 
     def should_use_proot(self, instance, **kwargs):
@@ -909,7 +1042,52 @@ class BaseTask(object):
         '''
         return OrderedDict()
 
-    def get_stdout_handle(self, instance):
+    def build_event_receiver(self, instance, **kwargs):
+        '''
+        Start listening for event payloads sent by the display callback, if
+        they should be sent over a socket rather than through memcache.
+        '''
+        if not isinstance(instance, (Job, AdHocCommand, ProjectUpdate)) or kwargs.get('isolated'):
+            return None
+        if settings.AWX_EVENT_PAYLOAD_TRANSPORT != 'socket':
+            return None
+        path = os.path.join(kwargs['private_data_dir'], 'events.sock')
+        try:
+            return EventPayloadReceiver(path, timeout=settings.AWX_EVENT_PAYLOAD_TIMEOUT)
+        except OSError:
+            logger.exception('{} could not listen on {}, falling back to memcache for event data'.format(
+                instance.log_format, path
+            ))
+            return None
+
+    def build_stdout_archive(self, instance, **kwargs):
+        '''
+        Start writing an archive of the job's stdout, which is saved by
+        final_run_hook(), if STDOUT_ARCHIVE_ENABLED is set.
+        '''
+        if not settings.STDOUT_ARCHIVE_ENABLED or kwargs.get('isolated'):
+            return None
+        path = os.path.join(kwargs['private_data_dir'], 'stdout.archive')
+        return StdoutArchiveWriter(open(path, 'wb'), block_size=settings.STDOUT_ARCHIVE_BLOCK_SIZE)
+
+    def save_stdout_archive(self, instance, stdout_archive):
+        if stdout_archive.error is not None:
+            logger.error('{} stdout was not archived: {}'.format(instance.log_format, stdout_archive.error))
+            return
+        if not stdout_archive.lines:
+            return
+        with open(stdout_archive.fileobj.name, 'rb') as f:
+            data = f.read()
+        UnifiedJobStdoutArchive.objects.update_or_create(
+            unified_job_id=instance.pk,
+            defaults=dict(lines=stdout_archive.lines, size=stdout_archive.size,
+                          block_index=stdout_archive.index, data=data)
+        )
+        logger.debug('{} archived {} lines of stdout ({} bytes compressed to {}).'.format(
+            instance.log_format, stdout_archive.lines, stdout_archive.size, len(data)
+        ))
+
+    def get_stdout_handle(self, instance, event_receiver=None, stdout_archive=None):
         '''
         Return an virtual file object for capturing stdout and/or events.
         '''
@@ -919,15 +1097,25 @@ class BaseTask(object):
             def event_callback(event_data):
                 event_data.setdefault(self.event_data_key, instance.id)
                 if 'uuid' in event_data:
-                    cache_event = cache.get('ev-{}'.format(event_data['uuid']), None)
-                    if cache_event is not None:
-                        event_data.update(json.loads(cache_event))
+                    payload = None
+                    if event_receiver is not None:
+                        payload = event_receiver.get(event_data['uuid'])
+                    if payload is None:
+                        cache_event = cache.get('ev-{}'.format(event_data['uuid']), None)
+                        if cache_event is not None:
+                            payload = json.loads(cache_event)
+                    if payload is not None:
+                        event_data.update(payload)
+                if stdout_archive is not None:
+                    stdout_archive.write_event(event_data.get('stdout'), event_data['start_line'], event_data['end_line'])
                 dispatcher.dispatch(event_data)
 
             return OutputEventFilter(event_callback)
         else:
             def event_callback(event_data):
                 event_data.setdefault(self.event_data_key, instance.id)
+                if stdout_archive is not None:
+                    stdout_archive.write_event(event_data.get('stdout'), event_data['start_line'], event_data['end_line'])
                 dispatcher.dispatch(event_data)
 
             return OutputVerboseFilter(event_callback)
@@ -946,6 +1134,8 @@ class BaseTask(object):
         '''
         Hook for any steps to run after job/task is marked as complete.
         '''
+        if kwargs.get('stdout_archive') is not None:
+            self.save_stdout_archive(instance, kwargs['stdout_archive'])
 
     @with_path_cleanup
     def run(self, pk, **kwargs):
@@ -961,6 +1151,8 @@ class BaseTask(object):
         extra_update_fields = {}
         event_ct = 0
         stdout_handle = None
+        event_receiver = None
+        stdout_archive = None
 
         try:
             kwargs['isolated'] = instance.is_isolated()
@@ -984,13 +1176,15 @@ class BaseTask(object):
             # Fetch ansible version once here to support version-dependent features.
             kwargs['ansible_version'] = get_ansible_version()
             kwargs['private_data_dir'] = self.build_private_data_dir(instance, **kwargs)
+            kwargs['event_receiver'] = event_receiver = self.build_event_receiver(instance, **kwargs)
+            kwargs['stdout_archive'] = stdout_archive = self.build_stdout_archive(instance, **kwargs)
 
             # Fetch "cached" fact data from prior runs and put on the disk
             # where ansible expects to find it
             if getattr(instance, 'use_fact_cache', False):
                 instance.start_job_fact_cache(
                     os.path.join(kwargs['private_data_dir']),
-                    kwargs.setdefault('fact_modification_times', {})
+                    kwargs.setdefault('fact_hashes', {})
                 )
 
             # May have to serialize the value
@@ -1026,7 +1220,8 @@ class BaseTask(object):
                     )
 
             if instance.is_isolated() is False:
-                stdout_handle = self.get_stdout_handle(instance)
+                stdout_handle = self.get_stdout_handle(instance, event_receiver=event_receiver,
+                                                       stdout_archive=stdout_archive)
             else:
                 stdout_handle = isolated_manager.IsolatedManager.get_stdout_handle(
                     instance, kwargs['private_data_dir'], event_data_key=self.event_data_key)
@@ -1088,6 +1283,10 @@ class BaseTask(object):
                             instance.log_format, event_ct)
             except Exception:
                 logger.exception('Error flushing job stdout and saving event count.')
+            if event_receiver is not None:
+                event_receiver.close()
+            if stdout_archive is not None:
+                stdout_archive.close()
 
         try:
             self.post_run_hook(instance, status, **kwargs)
@@ -1476,7 +1675,7 @@ class RunJob(BaseTask):
         if job.use_fact_cache:
             job.finish_job_fact_cache(
                 kwargs['private_data_dir'],
-                kwargs['fact_modification_times']
+                kwargs['fact_hashes']
             )
 
         # persist artifacts set via `set_stat` (if any)
@@ -1498,7 +1697,7 @@ class RunJob(BaseTask):
         except Inventory.DoesNotExist:
             pass
         else:
-            update_inventory_computed_fields.delay(inventory.id, True)
+            schedule_inventory_computed_fields(inventory.id)
 
 
 @task()
@@ -2515,4 +2714,4 @@ def deep_copy_model_obj(
             ), permission_check_func[2])
             permission_check_func(creater, copy_mapping.values())
     if isinstance(new_obj, Inventory):
-        update_inventory_computed_fields.delay(new_obj.id, True)
+        schedule_inventory_computed_fields(new_obj.id)
@@ -1,5 +1,7 @@
 import pytest
 
+from awx.api.versioning import reverse
+from awx.main.models import Job, JobEvent
 from awx.main.models.inventory import Group, Host
 from awx.api.pagination import Pagination
 
@@ -38,3 +40,68 @@ def test_pagination_backend_output_correct_total_count(group, host):
     p = Pagination().django_paginator_class(queryset, 10)
     p.page(1)
     assert p.count == 1
+
+
+@pytest.fixture
+def job_with_events():
+    job = Job()
+    job.save()
+    # several events share a start_line, so pages must break ties by pk
+    for i in range(10):
+        JobEvent(job=job, stdout='event {}'.format(i), start_line=i // 3, end_line=i // 3 + 1).save()
+    return job
+
+
+def walk(get, user, url, link):
+    pages = []
+    while url:
+        response = get(url, user=user, expect=200)
+        assert 'count' not in response.data
+        pages.append([event['stdout'] for event in response.data['results']])
+        url = response.data[link]
+    return pages
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('order_by', ['start_line', '-start_line', 'pk', '-pk'])
+def test_job_events_are_paged_by_cursor(get, admin, job_with_events, order_by):
+    url = reverse('api:job_job_events_list', kwargs={'pk': job_with_events.pk})
+    url += '?page_size=4&order_by={}'.format(order_by)
+    tie_breaker = '-pk' if order_by.startswith('-') else 'pk'
+    expected = [event.stdout for event in JobEvent.objects.filter(job=job_with_events).order_by(order_by, tie_breaker)]
+
+    pages = walk(get, admin, url, 'next')
+    assert pages == [expected[0:4], expected[4:8], expected[8:10]]
+
+    # and back again from the last page
+    last_page = get(url, user=admin, expect=200).data
+    last_page = get(last_page['next'], user=admin, expect=200).data
+    last_page = get(last_page['next'], user=admin, expect=200).data
+    assert last_page['next'] is None
+    assert walk(get, admin, last_page['previous'], 'previous') == [expected[4:8], expected[0:4]]
+
+
+@pytest.mark.django_db
+def test_job_events_page_number_pagination(get, admin, job_with_events):
+    url = reverse('api:job_job_events_list', kwargs={'pk': job_with_events.pk})
+    response = get(url + '?page_size=4&page=2', user=admin, expect=200)
+    assert response.data['count'] == 10
+    assert len(response.data['results']) == 4
+    response = get(url + '?page_size=4&pagination=page', user=admin, expect=200)
+    assert response.data['count'] == 10
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_is_opt_in(get, admin, job_with_events):
+    url = reverse('api:unified_job_list')
+    assert 'count' in get(url, user=admin, expect=200).data
+    response = get(url + '?pagination=cursor', user=admin, expect=200)
+    assert 'count' not in response.data
+    assert [job['id'] for job in response.data['results']] == [job_with_events.pk]
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_errors(get, admin, job_with_events):
+    url = reverse('api:unified_job_list')
+    get(url + '?pagination=cursor&order_by=finished', user=admin, expect=400)
+    get(url + '?cursor=not-a-cursor', user=admin, expect=404)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import io
 import json
 import re
 
@@ -13,7 +14,9 @@ from awx.api.versioning import reverse
 from awx.main.models import (Job, JobEvent, AdHocCommand, AdHocCommandEvent,
                              Project, ProjectUpdate, ProjectUpdateEvent,
                              InventoryUpdate, InventorySource,
-                             InventoryUpdateEvent, SystemJob, SystemJobEvent)
+                             InventoryUpdateEvent, SystemJob, SystemJobEvent,
+                             UnifiedJobStdoutArchive)
+from awx.main.utils.stdout_archive import StdoutArchiveWriter
 
 
 def _mk_project_update():
@@ -117,13 +120,36 @@ def test_stdout_line_range(sqlite_copy_expert, Parent, Child, relation, view, ge
     job = Parent()
     job.save()
     for i in range(20):
-        Child(**{relation: job, 'stdout': 'Testing {}\n'.format(i), 'start_line': i}).save()
+        Child(**{relation: job, 'stdout': 'Testing {}\n'.format(i), 'start_line': i, 'end_line': i + 1}).save()
     url = reverse(view, kwargs={'pk': job.pk}) + '?format=html&start_line=5&end_line=10'
 
     response = get(url, user=admin, expect=200)
     assert re.findall('Testing [0-9]+', smart_str(response.content)) == ['Testing %d' % i for i in range(5, 10)]
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('query, expected_range, expected_lines', [
+    ['start_line=2&end_line=5', (2, 5), ['line 2', 'task 1', 'line 4']],
+    ['start_line=-2', (4, 6), ['line 4', 'task 2']],
+    ['start_line=5&end_line=100', (5, 6), ['task 2']],
+])
+def test_stdout_line_range_reads_overlapping_events(get, admin, query, expected_range, expected_lines):
+    job = Job()
+    job.save()
+    JobEvent(job=job, stdout='line 0\r\nline 1\r\nline 2', start_line=0, end_line=3).save()
+    JobEvent(job=job, stdout='', start_line=3, end_line=3).save()
+    JobEvent(job=job, stdout='task 1', start_line=3, end_line=4).save()
+    JobEvent(job=job, stdout='line 4\r\ntask 2', start_line=4, end_line=6).save()
+    url = reverse('api:job_stdout', kwargs={'pk': job.pk}) + '?format=json&' + query
+
+    # no sqlite_copy_expert here; range requests never copy the whole output
+    response = get(url, user=admin, expect=200)
+    data = json.loads(smart_str(response.content))
+    assert (data['range']['start'], data['range']['end']) == expected_range
+    assert data['range']['absolute_end'] == 6
+    assert smart_str(data['content']).splitlines() == expected_lines
+
+
 @pytest.mark.django_db
 def test_text_stdout_from_system_job_events(sqlite_copy_expert, get, admin):
     job = SystemJob()
@@ -266,3 +292,29 @@ def test_unicode_with_base64_ansi(sqlite_copy_expert, get, admin):
     response = get(url, user=admin, expect=200)
     content = base64.b64decode(json.loads(smart_str(response.content))['content'])
     assert smart_str(content).splitlines() == ['オ%d' % i for i in range(3)]
+
+
+@pytest.mark.django_db
+def test_stdout_served_from_archive(get, admin):
+    job = Job()
+    job.save()
+    fileobj = io.BytesIO()
+    writer = StdoutArchiveWriter(fileobj, block_size=16)
+    for i in range(10):
+        JobEvent(job=job, stdout='', start_line=i, end_line=i + 1).save()
+        writer.write_event('Testing {}'.format(i), i, i + 1)
+    writer.flush()
+    UnifiedJobStdoutArchive.objects.create(
+        unified_job=job, lines=writer.lines, size=writer.size,
+        block_index=writer.index, data=fileobj.getvalue()
+    )
+    url = reverse('api:job_stdout', kwargs={'pk': job.pk})
+
+    # the events' stdout is gone, but the archive has all of it
+    response = get(url + '?format=txt', user=admin, expect=200)
+    assert smart_str(response.content).splitlines() == ['Testing %d' % i for i in range(10)]
+
+    response = get(url + '?format=json&start_line=-3', user=admin, expect=200)
+    data = json.loads(smart_str(response.content))
+    assert data['range'] == {'start': 7, 'end': 10, 'absolute_end': 10}
+    assert smart_str(data['content']).splitlines() == ['Testing %d' % i for i in range(7, 10)]
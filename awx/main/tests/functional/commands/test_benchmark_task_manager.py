@@ -0,0 +1,32 @@
+import json
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+
+from awx.main.models import Job, Organization
+
+
+@pytest.mark.django_db
+def test_benchmark_task_manager():
+    out = StringIO()
+    call_command(
+        'benchmark_task_manager', instance_groups=1, instances=2, projects=2,
+        inventories=2, job_templates=2, pending=4, running=1, cycles=2,
+        stdout=out
+    )
+    results = json.loads(out.getvalue())
+    assert results['options']['pending'] == 4
+    assert len(results['cycles']) == 2
+    for cycle in results['cycles']:
+        assert set(cycle['phases']) == set([
+            'get_tasks', 'process_finished_workflow_jobs',
+            'spawn_workflow_graph_jobs', 'process_tasks'
+        ])
+        assert cycle['queries'] >= sum(p['queries'] for p in cycle['phases'].values())
+    assert results['cycles'][0]['jobs_started'] == 4
+    assert results['total']['jobs_started'] == sum(c['jobs_started'] for c in results['cycles'])
+    # the generated data is rolled back
+    assert Organization.objects.count() == 0
+    assert Job.objects.count() == 0
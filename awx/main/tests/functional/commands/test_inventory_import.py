@@ -2,6 +2,8 @@
 # All Rights Reserved
 
 # Python
+import io
+import json
 import pytest
 from unittest import mock
 import os
@@ -12,6 +14,7 @@ from django.core.management.base import CommandError
 # AWX
 from awx.main.management.commands import inventory_import
 from awx.main.models import Inventory, Host, Group
+from awx.main.utils.mem_inventory import stream_to_mem_data
 
 
 TEST_INVENTORY_CONTENT = {
@@ -81,6 +84,9 @@ class MockLoader:
     def load(self):
         return self._data
 
+    def load_into(self, inventory):
+        return stream_to_mem_data(io.StringIO(json.dumps(self._data)), inventory=inventory)
+
 
 def mock_logging(self):
     pass
@@ -199,6 +205,54 @@ class TestINIImports:
         assert h.name == 'foo'
         assert h.variables_dict == {"some_hostvar": "foobar"}
 
+    @mock.patch.object(inventory_import, 'AnsibleInventoryLoader', MockLoader)
+    @pytest.mark.parametrize('activity_stream', [True, False])
+    def test_reimport_updates_and_adds_hosts(self, inventory, settings, activity_stream):
+        settings.ACTIVITY_STREAM_ENABLED_FOR_INVENTORY_SYNC = activity_stream
+        inventory_import.AnsibleInventoryLoader._data = {
+            "_meta": {
+                "hostvars": {"foo": {"a": 1}, "bar": {"b": 2}}
+            },
+            "all": {
+                "children": ["ungrouped"]
+            },
+            "ungrouped": {
+                "hosts": ["foo", "bar"]
+            }
+        }
+        inventory_import.Command().handle(inventory_id=inventory.pk, source=__file__)
+        bar_modified = inventory.hosts.get(name='bar').modified
+        settings.AWX_REBUILD_SMART_MEMBERSHIP = True
+        smart = Inventory.objects.create(name='smart', kind='smart', host_filter='name=baz',
+                                         organization=inventory.organization)
+        Inventory.objects.update(computed_fields_dirty=0, computed_fields_dirty_since=None)
+
+        inventory_import.AnsibleInventoryLoader._data = {
+            "_meta": {
+                "hostvars": {"foo": {"a": 3, "enabled": False}, "bar": {"b": 2}, "baz": {"c": 4}}
+            },
+            "all": {
+                "children": ["ungrouped"]
+            },
+            "ungrouped": {
+                "hosts": ["foo", "bar", "baz"]
+            }
+        }
+        inventory_import.Command().handle(inventory_id=inventory.pk, source=__file__,
+                                          enabled_var='enabled')
+        hosts = dict((h.name, h) for h in inventory.hosts.all())
+        assert hosts['foo'].variables_dict == {"a": 3, "enabled": False}
+        assert hosts['foo'].enabled is False
+        assert hosts['bar'].variables_dict == {"b": 2}
+        assert hosts['bar'].modified == bar_modified
+        assert hosts['baz'].variables_dict == {"c": 4}
+        assert hosts['baz'].created is not None
+        source = inventory.inventory_sources.get()
+        assert set(source.hosts.values_list('name', flat=True)) == set(['foo', 'bar', 'baz'])
+        # the smart inventories of the organization are brought up to date
+        smart.refresh_from_db()
+        assert smart.computed_fields_dirty & Inventory.COMPUTED_FIELDS_SMART_HOSTS
+
     @mock.patch.object(inventory_import, 'AnsibleInventoryLoader', MockLoader)
     def test_memberships_are_respected(self, inventory):
         """This tests that if import 1 added a group-group and group-host memberhip
@@ -5,12 +5,12 @@ from awx.main.models.rbac import batch_role_ancestor_rebuilding
 from awx.main.signals import (
     disable_activity_stream,
     disable_computed_fields,
-    update_inventory_computed_fields
 )
+from awx.main.tasks import update_inventory_computed_fields
 
 # AWX models
 from awx.main.models.organization import Organization
-from awx.main.models import ActivityStream, Job
+from awx.main.models import ActivityStream, Inventory, Job
 
 
 @pytest.mark.django_db
@@ -34,14 +34,28 @@ class TestComputedFields:
 
     def test_computed_fields_normal_use(self, mocker, inventory):
         job = Job.objects.create(name='fake-job', inventory=inventory)
+        Inventory.claim_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_ALL)
         with mocker.patch.object(update_inventory_computed_fields, 'delay'):
             job.delete()
-            update_inventory_computed_fields.delay.assert_called_once_with(inventory.id, True)
+            update_inventory_computed_fields.delay.assert_not_called()
+        inventory.refresh_from_db()
+        assert inventory.computed_fields_dirty == Inventory.COMPUTED_FIELDS_ALL
+        assert inventory.computed_fields_dirty_since is not None
+
+    def test_computed_fields_without_debounce(self, mocker, settings, inventory):
+        settings.INVENTORY_COMPUTED_FIELDS_DEBOUNCE = 0
+        job = Job.objects.create(name='fake-job', inventory=inventory)
+        with mocker.patch.object(update_inventory_computed_fields, 'delay'):
+            job.delete()
+            update_inventory_computed_fields.delay.assert_called_once_with(inventory.id, True, True)
 
     def test_disable_computed_fields(self, mocker, inventory):
         job = Job.objects.create(name='fake-job', inventory=inventory)
+        Inventory.claim_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_ALL)
         with disable_computed_fields():
             with mocker.patch.object(update_inventory_computed_fields, 'delay'):
                 job.delete()
                 update_inventory_computed_fields.delay.assert_not_called()
+        inventory.refresh_from_db()
+        assert inventory.computed_fields_dirty == 0
 
@@ -5,6 +5,7 @@ from awx.main.models import (Job, JobEvent, ProjectUpdate, ProjectUpdateEvent,
                              AdHocCommand, AdHocCommandEvent, InventoryUpdate,
                              InventorySource, InventoryUpdateEvent, SystemJob,
                              SystemJobEvent)
+from awx.main.models.events import bulk_save_events, JobHostCache
 
 
 @pytest.mark.django_db
@@ -111,3 +112,98 @@ def test_system_job_event_websocket_notifications(emit, inventory):
     topic, payload = emit.call_args_list[0][0]
     assert topic == 'system_job_events-123'
     assert payload['system_job'] == 123
+
+
+@pytest.mark.django_db
+def test_job_host_cache(inventory, django_assert_num_queries):
+    host = inventory.hosts.create(name='web1')
+    j = Job(inventory=inventory, verbosity=3)
+    j.save()
+    cache = JobHostCache(max_jobs=1)
+    entry = cache.get(j.pk)
+    assert entry == dict(inventory_id=inventory.pk, verbosity=3, hosts={'web1': host.pk})
+    with django_assert_num_queries(0):
+        assert cache.get(j.pk) is entry
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    other = Job(inventory=inventory)
+    other.save()
+    cache.get(other.pk)
+    assert list(cache.jobs.keys()) == [other.pk]
+
+    cache.evict(other.pk)
+    assert len(cache) == 0
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_bulk_save_events_resolves_hosts_from_cache(emit, inventory, django_assert_num_queries):
+    host = inventory.hosts.create(name='web1')
+    j = Job(inventory=inventory)
+    j.save()
+    cache = JobHostCache()
+    cache.get(j.pk)
+
+    # neither the host nor the job is loaded to save an event
+    event = JobEvent.build_from_data(
+        job_id=j.pk, event='runner_on_ok', event_data={'host': 'web1'}
+    )
+    event.host_cache = cache
+    with django_assert_num_queries(0):
+        event._update_fields_before_save()
+        event._update_related_objects()
+    assert event.host_id == host.pk
+
+    event = JobEvent.build_from_data(
+        job_id=j.pk, event='runner_on_ok', event_data={'host': 'web1'}
+    )
+    bulk_save_events(JobEvent, [event], host_cache=cache)
+    assert JobEvent.objects.get().host_id == host.pk
+    assert cache.hits == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('num_hosts', [1000, 10000])
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_host_summary_from_stats_query_count(emit, inventory, num_hosts):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils.timezone import now
+    from awx.main.models import Host, JobHostSummary
+
+    timestamp = now()
+    Host.objects.bulk_create([
+        Host(name='host-{}'.format(i), inventory=inventory, created=timestamp, modified=timestamp)
+        for i in range(num_hosts)
+    ])
+    j = Job(inventory=inventory)
+    j.save()
+    hostnames = ['host-{}'.format(i) for i in range(num_hosts)] + ['not-in-inventory']
+    stats = dict(
+        ok=dict((host, 1) for host in hostnames),
+        failures={hostnames[0]: 1},
+        processed=dict((host, 1) for host in hostnames),
+    )
+    event = JobEvent(job=j, event='playbook_on_stats', event_data=stats)
+
+    with CaptureQueriesContext(connection) as ctx:
+        event._update_host_summary_from_stats(set(hostnames))
+    # the per-host implementation needed 3-4 queries per host; the number of
+    # queries should now be driven by the database's bulk INSERT batch size
+    assert len(ctx.captured_queries) < num_hosts / 50
+
+    assert JobHostSummary.objects.filter(job=j).count() == num_hosts + 1
+    assert JobHostSummary.objects.get(job=j, host_name='not-in-inventory').host is None
+    summary = JobHostSummary.objects.get(job=j, host_name=hostnames[0])
+    assert summary.failed is True
+    host = Host.objects.get(name=hostnames[0])
+    assert host.last_job_id == j.pk
+    assert host.last_job_host_summary_id == summary.pk
+    assert Host.objects.filter(last_job=j).count() == num_hosts
+
+    # a second stats event only updates the summaries that changed
+    event.event_data['failures'] = {hostnames[1]: 1}
+    with CaptureQueriesContext(connection) as ctx:
+        event._update_host_summary_from_stats(set(hostnames))
+    assert len(ctx.captured_queries) <= 6
+    assert JobHostSummary.objects.filter(job=j, failed=True).get().host_name == hostnames[1]
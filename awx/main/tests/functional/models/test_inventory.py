@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import pytest
+from datetime import timedelta
 from unittest import mock
 
 from django.core.exceptions import ValidationError
+from django.db.models.query import QuerySet
 
 # AWX
 from awx.main.models import (
@@ -11,7 +13,9 @@ from awx.main.models import (
     Inventory,
     InventorySource,
     InventoryUpdate,
-    Job
+    Job,
+    Organization,
+    SmartInventoryMembership
 )
 from awx.main.utils.filters import SmartFilter
 
@@ -102,6 +106,71 @@ class TestInventoryScript:
             assert data == expected_data
 
 
+@pytest.mark.django_db
+def test_group_computed_fields(inventory):
+    g1 = inventory.groups.create(name='g1')
+    g2 = inventory.groups.create(name='g2')
+    g3 = inventory.groups.create(name='g3')
+    h1 = inventory.hosts.create(name='h1')
+    h2 = inventory.hosts.create(name='h2')
+    g1.children.add(g2, g3)
+    g2.children.add(g3)
+    g2.hosts.add(h1)
+    g3.hosts.add(h1, h2)
+    inventory.update_group_computed_fields()
+    g1.refresh_from_db()
+    g3.refresh_from_db()
+    assert (g1.total_hosts, g1.total_groups) == (2, 2)
+    assert (g3.total_hosts, g3.total_groups) == (2, 0)
+
+
+@pytest.mark.django_db
+def test_dirty_computed_fields_are_coalesced(inventory):
+    from awx.main.tasks import update_dirty_inventory_computed_fields
+    Inventory.claim_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_ALL)
+    assert Inventory.mark_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_COUNTS)
+    assert not Inventory.mark_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_GROUPS)
+    inventory.refresh_from_db()
+    assert inventory.computed_fields_dirty == Inventory.COMPUTED_FIELDS_GROUPS | Inventory.COMPUTED_FIELDS_COUNTS
+
+    # not dirty for long enough yet
+    with mock.patch('awx.main.tasks.update_inventory_computed_fields') as update:
+        update_dirty_inventory_computed_fields()
+        update.assert_not_called()
+
+    Inventory.objects.filter(pk=inventory.id).update(
+        computed_fields_dirty_since=inventory.computed_fields_dirty_since - timedelta(minutes=1))
+    with mock.patch('awx.main.tasks.update_inventory_computed_fields') as update:
+        update_dirty_inventory_computed_fields()
+        update.assert_called_once_with(inventory.id, False, True)
+    inventory.refresh_from_db()
+    assert (inventory.computed_fields_dirty, inventory.computed_fields_dirty_since) == (0, None)
+
+
+@pytest.mark.django_db
+def test_dirty_computed_fields_survive_a_concurrent_claim(inventory):
+    Inventory.claim_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_ALL)
+    Inventory.mark_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_COUNTS)
+    original_update = QuerySet.update
+    claimed = []
+
+    def update(queryset, **kwargs):
+        rows = original_update(queryset, **kwargs)
+        if not claimed:
+            # a recompute claims the inventory between the two UPDATEs
+            claimed.append(rows)
+            assert Inventory.claim_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_COUNTS)
+        return rows
+
+    with mock.patch.object(QuerySet, 'update', update):
+        assert not Inventory.mark_computed_fields_dirty(inventory.id, Inventory.COMPUTED_FIELDS_GROUPS)
+    assert claimed == [0]
+    inventory.refresh_from_db()
+    assert inventory.computed_fields_dirty == Inventory.COMPUTED_FIELDS_GROUPS
+    # so that update_dirty_inventory_computed_fields picks it up again
+    assert inventory.computed_fields_dirty_since is not None
+
+
 @pytest.mark.django_db
 class TestActiveCount:
 
@@ -284,3 +353,36 @@ class TestHostManager:
     # 2 organizations with host of same name only has 1 entry in smart inventory
     # smart inventory in 1 organization does not include host from another
     # smart inventory correctly returns hosts in filter in same organization
+
+
+@pytest.mark.django_db
+class TestSmartHostMemberships:
+
+    def test_only_changed_memberships_are_written(self, organization):
+        inventory = Inventory.objects.create(name='hosts', organization=organization)
+        h1, h2, h3 = [inventory.hosts.create(name='h{}'.format(i)) for i in range(3)]
+        smart = Inventory.objects.create(name='smart', kind='smart', organization=organization,
+                                         host_filter='name__startswith=h')
+        SmartInventoryMembership.objects.create(inventory=smart, host=h1)
+        SmartInventoryMembership.objects.create(inventory=smart, host=h2)
+        # the host filter can't be evaluated on SQLite
+        with mock.patch.object(Inventory, 'hosts', new_callable=mock.PropertyMock) as hosts:
+            hosts.return_value.order_by.return_value.values_list.return_value = [h2.pk, h3.pk]
+            assert smart.update_smart_host_memberships() == (1, 1)
+        assert set(SmartInventoryMembership.objects.filter(inventory=smart).values_list('host_id', flat=True)) == set([h2.pk, h3.pk])
+
+    def test_host_changes_mark_smart_inventories_of_the_organization(self, organization, settings):
+        settings.AWX_REBUILD_SMART_MEMBERSHIP = True
+        inventory = Inventory.objects.create(name='hosts', organization=organization)
+        smart = Inventory.objects.create(name='smart', kind='smart', organization=organization,
+                                         host_filter='name__startswith=h')
+        other = Inventory.objects.create(name='other', kind='smart',
+                                         organization=Organization.objects.create(name='other'),
+                                         host_filter='name__startswith=h')
+        Inventory.objects.update(computed_fields_dirty=0, computed_fields_dirty_since=None)
+
+        inventory.hosts.create(name='h1')
+        smart.refresh_from_db()
+        other.refresh_from_db()
+        assert smart.computed_fields_dirty == Inventory.COMPUTED_FIELDS_SMART_HOSTS | Inventory.COMPUTED_FIELDS_COUNTS
+        assert other.computed_fields_dirty == 0
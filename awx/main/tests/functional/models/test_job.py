@@ -1,3 +1,6 @@
+import json
+import os
+
 import pytest
 
 from awx.main.models import JobTemplate, Job, JobHostSummary, WorkflowJob
@@ -96,3 +99,37 @@ class TestSlicingModels:
             assert node.limit is None  # data not saved in node prompts
             job = node.job
             assert job.limit == 'foobar'
+
+
+@pytest.mark.django_db
+def test_finish_job_fact_cache_saves_changed_facts(inventory, tmpdir, settings):
+    settings.AWX_FACT_CACHE_BATCH_SIZE = 1
+    unchanged = inventory.hosts.create(name='unchanged', ansible_facts={'a': 1})
+    changed = inventory.hosts.create(name='changed', ansible_facts={'a': 2}, insights_system_id='old')
+    cleared = inventory.hosts.create(name='cleared', ansible_facts={'a': 3})
+    job = Job.objects.create(inventory=inventory)
+    fact_hashes = {}
+    job.start_job_fact_cache(str(tmpdir), fact_hashes, 0)
+
+    # what the playbook does to the fact cache
+    facts_dir = os.path.join(str(tmpdir), 'facts')
+    with open(os.path.join(facts_dir, 'changed'), 'w') as f:
+        json.dump({'a': 4, 'insights': {'system_id': 'updated_by_scan'}}, f)
+    os.remove(os.path.join(facts_dir, 'cleared'))
+
+    job.finish_job_fact_cache(str(tmpdir), fact_hashes)
+    for host in (unchanged, changed, cleared):
+        host.refresh_from_db()
+    assert unchanged.ansible_facts == {'a': 1}
+    assert unchanged.ansible_facts_modified is None
+    assert changed.ansible_facts == {'a': 4, 'insights': {'system_id': 'updated_by_scan'}}
+    assert changed.insights_system_id == 'updated_by_scan'
+    assert changed.ansible_facts_modified is not None
+    assert cleared.ansible_facts == {}
+    assert cleared.ansible_facts_modified is not None
+    assert cleared.insights_system_id is None
+
+    job.refresh_from_db()
+    assert job.fact_cache_stats['start']['hosts'] == 3
+    finish = job.fact_cache_stats['finish']
+    assert (finish['hosts'], finish['changed'], finish['cleared']) == (3, 1, 1)
@@ -245,11 +245,11 @@ class TestTaskImpact:
 
     def test_limit_task_impact(self, job_host_limit):
         job = job_host_limit(5, 2)
-        assert job.task_impact == 2 + 1  # forks becomes constraint
+        assert job._get_task_impact() == 2 + 1  # forks becomes constraint
 
     def test_host_task_impact(self, job_host_limit):
         job = job_host_limit(3, 5)
-        assert job.task_impact == 3 + 1  # hosts becomes constraint
+        assert job._get_task_impact() == 3 + 1  # hosts becomes constraint
 
     def test_shard_task_impact(self, slice_job_factory):
         # factory creates on host per slice
@@ -263,11 +263,11 @@ class TestTaskImpact:
             len(jobs[0].inventory.get_script_data(slice_number=i + 1, slice_count=3)['all']['hosts'])
             for i in range(3)
         ] == [1, 1, 1]
-        assert [job.task_impact for job in jobs] == [2, 2, 2]  # plus one base task impact
+        assert [job._get_task_impact() for job in jobs] == [2, 2, 2]  # plus one base task impact
         # Uneven distribution - first job takes the extra host
         jobs[0].inventory.hosts.create(name='remainder_foo')
         assert [
             len(jobs[0].inventory.get_script_data(slice_number=i + 1, slice_count=3)['all']['hosts'])
             for i in range(3)
         ] == [2, 1, 1]
-        assert [job.task_impact for job in jobs] == [3, 2, 2]
+        assert [job._get_task_impact() for job in jobs] == [3, 2, 2]
@@ -32,3 +32,31 @@ class TestCapacityMapping(TransactionTestCase):
         assert ig_map['ig_small'] == set(['ig_small'])
         assert ig_map['ig_large'] == set(['ig_large', 'tower'])
         assert ig_map['tower'] == set(['ig_large', 'tower'])
+
+
+@pytest.mark.django_db
+def test_task_manager_places_tasks_in_memory(django_assert_num_queries):
+    from awx.main.models import ProjectUpdate
+    from awx.main.scheduler import TaskManager
+
+    ig = InstanceGroup.objects.create(name='ig')
+    i1 = Instance.objects.create(hostname='i1', capacity=3)
+    i2 = Instance.objects.create(hostname='i2', capacity=2)
+    i3 = Instance.objects.create(hostname='i3', capacity=0)
+    ig.instances.add(i1, i2, i3)
+    running = ProjectUpdate(status='running', job_type='check', execution_node='i1', task_impact=1)
+    pending = ProjectUpdate(status='pending', job_type='check', task_impact=1)
+
+    tm = TaskManager()
+    tm.calculate_capacity_consumed([running])
+    with django_assert_num_queries(0):
+        # i1 has 2 units remaining, i2 has 2 units and no jobs
+        assert tm.fit_task_to_most_remaining_capacity_instance(pending, 'ig') == i1
+        assert tm.find_largest_idle_instance('ig') == i2
+        tm.consume_instance_capacity(pending, 'i2')
+        tm.consume_instance_capacity(pending, 'i2')
+        assert tm.fit_task_to_most_remaining_capacity_instance(pending, 'ig') == i1
+        assert tm.find_largest_idle_instance('ig') is None
+        tm.consume_instance_capacity(pending, 'i1')
+        tm.consume_instance_capacity(pending, 'i1')
+        assert tm.fit_task_to_most_remaining_capacity_instance(pending, 'ig') is None
@@ -4,6 +4,7 @@ import json
 from datetime import timedelta
 
 from awx.main.scheduler import TaskManager
+from awx.main.scheduler.dag_workflow import WorkflowDAG, workflow_dag_cache
 from awx.main.utils import encrypt_field
 from awx.main.models import WorkflowJobTemplate, JobTemplate
 
@@ -22,6 +23,23 @@ def test_single_job_scheduler_launch(default_instance_group, job_template_factor
         TaskManager.start_task.assert_called_once_with(j, default_instance_group, [], instance)
 
 
+@pytest.mark.django_db
+def test_task_impact_is_stored_when_job_starts(default_instance_group, job_template_factory):
+    objects = job_template_factory('jt', organization='org1', project='proj',
+                                   inventory='inv', credential='cred',
+                                   jobs=["job_should_start"])
+    j = objects.jobs["job_should_start"]
+    j.status = 'pending'
+    j.save()
+    assert j.task_impact == 0
+    with mock.patch('awx.main.models.unified_jobs.UnifiedJob.websocket_emit_status'):
+        TaskManager().schedule()
+    j.refresh_from_db()
+    assert j.status == 'waiting'
+    assert j.task_impact == j._get_task_impact()
+    assert j.task_impact > 0
+
+
 @pytest.mark.django_db
 class TestJobLifeCycle:
 
@@ -88,6 +106,42 @@ class TestJobLifeCycle:
         # no further action is necessary, so rescheduling should not happen
         self.run_tm(tm, [mock.call('successful')], [])
 
+    def test_task_manager_caches_workflow_dags(self, inventory, project, default_instance_group):
+        jt = JobTemplate.objects.create(
+            allow_simultaneous=True,
+            inventory=inventory,
+            project=project,
+            playbook='helloworld.yml'
+        )
+        wfjt = WorkflowJobTemplate.objects.create(name='foo')
+        root = wfjt.workflow_nodes.create(unified_job_template=jt)
+        root.success_nodes.add(wfjt.workflow_nodes.create(unified_job_template=jt))
+        wj = wfjt.create_unified_job()
+        wj.signal_start()
+        workflow_dag_cache.clear()
+        tm = TaskManager()
+
+        with mock.patch('awx.main.scheduler.dag_workflow.WorkflowDAG._init_graph',
+                        autospec=True, side_effect=WorkflowDAG._init_graph) as init_graph:
+            self.run_tm(tm)  # workflow job starts running
+            self.run_tm(tm)  # spawns the root node
+            assert wj.id in workflow_dag_cache
+            for job in jt.jobs.all():
+                job.status = 'successful'
+                job.save()
+            self.run_tm(tm)  # spawns the child node
+            assert jt.jobs.count() == 2
+            for job in jt.jobs.all():
+                job.status = 'successful'
+                job.save()
+            self.run_tm(tm)  # finishes the workflow
+            wj.refresh_from_db()
+            assert wj.status == 'successful'
+
+        # the topology was only queried once
+        assert init_graph.call_count == 1
+        assert wj.id not in workflow_dag_cache
+
     def test_task_manager_workflow_workflow_rescheduling(self):
         wfjts = [WorkflowJobTemplate.objects.create(name='foo')]
         for i in range(5):
@@ -326,3 +380,25 @@ def test_shared_dependencies_launch(default_instance_group, job_template_factory
     iu = [x for x in ii.inventory_updates.all()]
     assert len(pu) == 1
     assert len(iu) == 1
+
+
+@pytest.mark.django_db
+def test_latest_updates_are_fetched_once_per_cycle(job_template_factory, inventory_source_factory, django_assert_num_queries):
+    objects = job_template_factory('jt', organization='org1', project='proj',
+                                   inventory='inv', credential='cred',
+                                   jobs=["job1", "job2"])
+    jobs = list(objects.jobs.values())
+    for j in jobs:
+        j.status = 'pending'
+        j.save()
+    p = objects.project
+    old_pu, latest_pu = [p.project_updates.create(job_type='check', status='successful') for i in range(2)]
+    p.project_updates.create(job_type='run', status='successful')
+    ii = inventory_source_factory("ec2", inventory=objects.inventory)
+    old_iu, latest_iu = [ii.inventory_updates.create(status='successful') for i in range(2)]
+
+    tm = TaskManager()
+    with django_assert_num_queries(1):
+        assert tm.get_latest_project_updates(jobs) == {p.id: latest_pu}
+    with django_assert_num_queries(1):
+        assert tm.get_latest_inventory_updates([ii]) == {ii.id: latest_iu}
@@ -0,0 +1,159 @@
+from unittest import mock
+
+import pytest
+
+from awx.main.consumers import event_broadcaster
+from awx.main.dispatch.worker import CallbackBrokerWorker
+from awx.main.models import Job, JobEvent
+
+
+@pytest.fixture
+def worker(settings):
+    settings.JOB_EVENT_BUFFER_SIZE = 3
+    settings.JOB_EVENT_BUFFER_SECONDS = 60
+    settings.EVENT_BROADCAST_INTERVAL = 0
+    yield CallbackBrokerWorker()
+    event_broadcaster.configure()
+
+
+def event(job, counter, **kwargs):
+    kwargs.setdefault('event', 'verbose')
+    kwargs.setdefault('uuid', 'uuid-{}'.format(counter))
+    return dict(job_id=job.pk, counter=counter, **kwargs)
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_events_are_buffered_until_size_threshold(emit, worker):
+    j = Job()
+    j.save()
+    worker.last_flush = float('inf')
+    for counter in range(2):
+        worker.perform_work(event(j, counter))
+    assert JobEvent.objects.count() == 0
+
+    worker.perform_work(event(j, 2))
+    assert list(JobEvent.objects.order_by('pk').values_list('counter', flat=True)) == [0, 1, 2]
+    assert worker.stats['flushes'] == 1
+    assert worker.stats['last_flush_size'] == 3
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.dispatch.worker.callback.emit_channel_notification')
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_eof_flushes_buffered_events(emit, emit_summary, worker):
+    j = Job()
+    j.save()
+    worker.last_flush = float('inf')
+    worker.perform_work(event(j, 0))
+    assert JobEvent.objects.count() == 0
+
+    worker.perform_work(dict(job_id=j.pk, event='EOF', final_counter=1))
+    assert JobEvent.objects.count() == 1
+    emit_summary.assert_called_once_with(
+        'jobs-summary',
+        dict(group_name='jobs', unified_job_id=j.pk, final_counter=1)
+    )
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_idle_flush_after_buffer_seconds(emit, worker):
+    j = Job()
+    j.save()
+    worker.last_flush = float('inf')
+    worker.perform_work(event(j, 0))
+    assert JobEvent.objects.count() == 0
+
+    worker.last_flush = 0
+    worker.perform_work({'event': 'FLUSH'})
+    assert JobEvent.objects.count() == 1
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_buffered_events_emit_websocket_notifications(emit, worker):
+    j = Job()
+    j.save()
+    for counter in range(3):
+        worker.perform_work(event(j, counter))
+    assert len(emit.call_args_list) == 3
+    for call in emit.call_args_list:
+        topic, payload = call[0]
+        assert topic == 'job_events-{}'.format(j.pk)
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.dispatch.worker.callback.emit_channel_notification')
+@mock.patch('awx.main.consumers.emit_channel_notification')
+@mock.patch('awx.main.consumers.EventBroadcaster.group_has_channels', return_value=True)
+def test_websocket_notifications_are_batched(has_channels, emit, emit_summary, settings):
+    settings.JOB_EVENT_BUFFER_SIZE = 1
+    settings.EVENT_BROADCAST_INTERVAL = 60 * 1000
+    worker = CallbackBrokerWorker()
+    try:
+        j = Job()
+        j.save()
+        event_broadcaster.last_flush = float('inf')
+        for counter in range(3):
+            worker.perform_work(event(j, counter))
+        assert JobEvent.objects.count() == 3
+        assert emit.call_count == 0
+
+        worker.perform_work(dict(job_id=j.pk, event='EOF', final_counter=3))
+        emit.assert_called_once()
+        topic, payload = emit.call_args[0]
+        assert topic == 'job_events-{}'.format(j.pk)
+        assert payload['group_name'] == 'job_events'
+        assert [e['counter'] for e in payload['events']] == [0, 1, 2]
+        assert all(e['job'] == j.pk for e in payload['events'])
+    finally:
+        event_broadcaster.configure()
+
+
+def test_events_for_a_job_are_routed_to_one_process(worker):
+    queues = set(
+        worker.preferred_queue({'job_id': 123, 'uuid': str(uuid)})
+        for uuid in (
+            '4b5c4a0c-5a2d-4bd0-8b6e-8d1f3c0e3c11',
+            '9a1f2e3d-4c5b-4a69-8788-1a2b3c4d5e6f',
+        )
+    )
+    assert queues == {123}
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.dispatch.worker.callback.emit_channel_notification')
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_parent_flags_are_rolled_up(emit, emit_summary, worker):
+    j = Job()
+    j.save()
+    worker.perform_work(event(j, 0, uuid='task-1', event='playbook_on_task_start'))
+    for counter in range(1, 4):
+        worker.perform_work(event(
+            j, counter, parent_uuid='task-1', event='runner_on_failed',
+            event_data={'res': {'changed': True}}
+        ))
+    worker.flush(force=True)
+    assert worker.parent_rollup.pending == {j.pk: {'task-1': set(['changed', 'failed'])}}
+    parent = JobEvent.objects.get(uuid='task-1')
+    assert parent.changed is False
+    assert parent.failed is False
+
+    worker.perform_work(dict(job_id=j.pk, event='EOF', final_counter=4))
+    parent = JobEvent.objects.get(uuid='task-1')
+    assert parent.changed is True
+    assert parent.failed is True
+    assert len(worker.parent_rollup) == 0
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_parent_flags_are_written_when_the_next_parent_starts(emit, worker):
+    j = Job()
+    j.save()
+    worker.perform_work(event(j, 0, uuid='task-1', event='playbook_on_task_start'))
+    worker.perform_work(event(j, 1, parent_uuid='task-1', event='runner_on_failed'))
+    worker.perform_work(event(j, 2, uuid='task-2', event='playbook_on_task_start'))
+    assert JobEvent.objects.get(uuid='task-1').failed is True
+    assert JobEvent.objects.get(uuid='task-2').failed is False
@@ -11,7 +11,7 @@ import pytest
 from awx.main.models import Job, WorkflowJob, Instance
 from awx.main.dispatch import reaper
 from awx.main.dispatch.pool import PoolWorker, WorkerPool, AutoscalePool
-from awx.main.dispatch.publish import task
+from awx.main.dispatch.publish import task, Publisher
 from awx.main.dispatch.worker import BaseWorker, TaskWorker
 
 
@@ -354,6 +354,59 @@ class TestTaskPublisher:
         assert queue == 'called'
 
 
+@pytest.mark.django_db
+@mock.patch('awx.main.dispatch.publish.Connection')
+@mock.patch('awx.main.dispatch.publish.Producer')
+class TestPublisher:
+
+    @pytest.fixture(autouse=True)
+    def compression(self, settings):
+        settings.DISPATCHER_PUBLISH_COMPRESSION = 'zlib'
+        settings.DISPATCHER_PUBLISH_COMPRESSION_THRESHOLD = 1024
+
+    def test_connection_is_reused(self, Producer, Connection):
+        publisher = Publisher()
+        for i in range(3):
+            publisher.publish({'args': [i]}, 'tower', 'direct', routing_key='tower')
+        assert Connection.call_count == 1
+        assert Producer.return_value.publish.call_count == 3
+        assert publisher.stats['publishes'] == 3
+
+    def test_exchange_is_declared_once(self, Producer, Connection):
+        publisher = Publisher()
+        for i in range(2):
+            publisher.publish({}, 'tower', 'direct', routing_key='tower')
+        first, second = Producer.return_value.publish.call_args_list
+        assert [e.name for e in first[1]['declare']] == ['tower']
+        assert second[1]['declare'] == []
+
+    def test_small_bodies_are_not_compressed(self, Producer, Connection):
+        publisher = Publisher()
+        publisher.publish({'args': ['x']}, 'tower', 'direct', routing_key='tower')
+        publisher.publish({'args': ['x' * 1024]}, 'tower', 'direct', routing_key='tower')
+        small, large = Producer.return_value.publish.call_args_list
+        assert small[1]['compression'] is None
+        assert large[1]['compression'] == 'zlib'
+        assert publisher.stats['compressed'] == 1
+
+    def test_connections_are_discarded_after_fork(self, Producer, Connection):
+        publisher = Publisher()
+        publisher.publish({}, 'tower', 'direct', routing_key='tower')
+        publisher.pid = -1  # pretend we're a forked child
+        publisher.publish({}, 'tower', 'direct', routing_key='tower')
+        assert Connection.call_count == 2
+        second = Producer.return_value.publish.call_args_list[1]
+        assert [e.name for e in second[1]['declare']] == ['tower']
+
+    def test_publish_retries_on_a_new_connection(self, Producer, Connection):
+        publisher = Publisher()
+        Producer.return_value.publish.side_effect = [IOError(), None]
+        publisher.publish({}, 'tower', 'direct', routing_key='tower')
+        assert Connection.call_count == 2
+        assert publisher.stats['errors'] == 1
+        assert publisher.stats['publishes'] == 1
+
+
 yesterday = tz_now() - datetime.timedelta(days=1)
 
 
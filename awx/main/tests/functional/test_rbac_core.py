@@ -1,9 +1,13 @@
 import pytest
 
+from django.test import TransactionTestCase
+
 from awx.main.models import (
     Role,
     Organization,
     Project,
+    Team,
+    User,
 )
 from awx.main.fields import update_role_parentage_for_instance
 
@@ -211,3 +215,71 @@ def test_update_parents_keeps_teams(team, project):
     assert team.member_role in project.update_role  # test prep sanity check
     update_role_parentage_for_instance(project)
     assert team.member_role in project.update_role  # actual assertion
+
+
+@pytest.mark.django_db
+def test_accessible_objects_follow_role_changes(organization, alice):
+    assert Organization.accessible_objects(alice, 'admin_role').count() == 0
+    organization.admin_role.members.add(alice)
+    assert Organization.accessible_objects(alice, 'admin_role').count() == 1
+    alice.roles.remove(organization.admin_role)
+    assert Organization.accessible_objects(alice, 'admin_role').count() == 0
+
+    A = Role.objects.create()
+    A.members.add(alice)
+    organization.admin_role.parents.add(A)
+    assert Organization.accessible_objects(alice, 'admin_role').count() == 1
+    organization.admin_role.parents.remove(A)
+    assert Organization.accessible_objects(alice, 'admin_role').count() == 0
+
+
+@pytest.mark.django_db
+def test_accessible_pks_are_memoized(organization, alice, django_assert_num_queries):
+    organization.admin_role.members.add(alice)
+    Organization.accessible_pk_qs(alice, 'admin_role')
+    with django_assert_num_queries(0):
+        pks = Organization.accessible_pk_qs(alice, 'admin_role')
+    assert pks.pks == frozenset([organization.id])
+
+
+@pytest.mark.django_db
+def test_exclude_accessible_pks(organization, alice):
+    assert Organization.objects.exclude(pk__in=Organization.accessible_pk_qs(alice, 'admin_role')).count() == 1
+
+
+@pytest.mark.django_db
+class TestAccessiblePksTransactional(TransactionTestCase):
+
+    def test_accessible_pks_are_shared_until_roles_change(self):
+        alice = User.objects.create(username='alice')
+        org = Organization.objects.create(name='org')
+        org.admin_role.members.add(alice)
+        assert Organization.accessible_objects(alice, 'admin_role').count() == 1
+
+        # a later request (or another process) finds them in the cache
+        alice = User.objects.get(pk=alice.pk)
+        with self.assertNumQueries(0):
+            Organization.accessible_pk_qs(alice, 'admin_role')
+
+        other = Organization.objects.create(name='other')
+        other.admin_role.members.add(alice)
+        alice = User.objects.get(pk=alice.pk)
+        assert Organization.accessible_objects(alice, 'admin_role').count() == 2
+
+    def test_deleting_a_team_revokes_its_access(self):
+        alice = User.objects.create(username='alice')
+        org = Organization.objects.create(name='org')
+        project = Project.objects.create(name='project', organization=org)
+        team = Team.objects.create(name='team', organization=org)
+        team.member_role.members.add(alice)
+        project.use_role.parents.add(team.member_role)
+        assert Project.accessible_objects(alice, 'use_role').count() == 1
+        alice = User.objects.get(pk=alice.pk)
+        assert Project.accessible_objects(alice, 'use_role').count() == 1
+
+        # the project is still reachable from the organization's roles, so
+        # the ancestry rebuild doesn't remove anything itself
+        team.delete()
+        assert Project.accessible_objects(alice, 'use_role').count() == 0
+        alice = User.objects.get(pk=alice.pk)
+        assert Project.accessible_objects(alice, 'use_role').count() == 0
@@ -0,0 +1,66 @@
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from awx.main.expect.event_receiver import EventPayloadReceiver
+
+
+@pytest.fixture
+def receiver(tmpdir):
+    receiver = EventPayloadReceiver(os.path.join(str(tmpdir), 'events.sock'), timeout=1)
+    yield receiver
+    receiver.close()
+
+
+def send(path, *payloads):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    for payload in payloads:
+        sock.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+    return sock
+
+
+def test_payloads_are_received(receiver):
+    sock = send(
+        receiver.path,
+        {'uuid': 'abc', 'event': 'runner_on_ok'},
+        {'uuid': 'def', 'event': 'runner_on_failed', 'stdout': u'Iñtërnâtiônàlizætiøn'},
+    )
+    assert receiver.get('def')['stdout'] == u'Iñtërnâtiônàlizætiøn'
+    assert receiver.get('abc')['event'] == 'runner_on_ok'
+    # payloads are only handed out once
+    assert receiver.get('abc') is None
+    sock.close()
+
+
+def test_large_payload_spanning_many_reads(receiver):
+    payload = {'uuid': 'abc', 'event_data': {'res': 'x' * (1024 * 1024)}}
+    sock = send(receiver.path, payload)
+    assert receiver.get('abc') == payload
+    sock.close()
+
+
+def test_payloads_from_multiple_connections(receiver):
+    socks = [send(receiver.path, {'uuid': str(i)}) for i in range(5)]
+    for i in range(5):
+        assert receiver.get(str(i)) == {'uuid': str(i)}
+    for sock in socks:
+        sock.close()
+
+
+def test_no_wait_when_nothing_connects(receiver):
+    assert receiver.get('abc') is None
+    start = time.time()
+    assert receiver.get('def') is None
+    assert time.time() - start < 0.5
+
+
+def test_socket_is_private_and_removed_on_close(tmpdir):
+    path = os.path.join(str(tmpdir), 'events.sock')
+    receiver = EventPayloadReceiver(path)
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+    receiver.close()
+    assert not os.path.exists(path)
@@ -11,6 +11,7 @@ from awx.main.models import (
 def T(impact):
     j = mock.Mock(Job())
     j.task_impact = impact
+    j.get_task_impact.return_value = impact
     return j
 
 
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
 import os
-import time
 
 import pytest
 
@@ -15,10 +14,10 @@ from awx.main.models import (
 @pytest.fixture
 def hosts(inventory):
     return [
-        Host(name='host1', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
-        Host(name='host2', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
-        Host(name='host3', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
-        Host(name=u'Iñtërnâtiônàlizætiøn', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
+        Host(id=1, name='host1', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
+        Host(id=2, name='host2', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
+        Host(id=3, name='host3', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
+        Host(id=4, name=u'Iñtërnâtiônàlizætiøn', ansible_facts={"a": 1, "b": 2}, inventory=inventory),
     ]
 
 
@@ -27,30 +26,46 @@ def inventory():
     return Inventory(id=5)
 
 
+def host_rows(hosts):
+    return lambda fields, **filters: iter([tuple(getattr(h, f) for f in fields) for h in hosts])
+
+
 @pytest.fixture
 def job(mocker, hosts, inventory):
     j = Job(inventory=inventory, id=2)
-    j._get_inventory_hosts = mocker.Mock(return_value=hosts)
+    j._get_inventory_host_rows = mocker.Mock(side_effect=host_rows(hosts))
+    j._record_fact_cache_stats = mocker.Mock()
+    j._save_host_facts = mocker.Mock()
     return j
 
 
+def saved_facts(job):
+    return dict(
+        (name, (ansible_facts, cleared))
+        for call in job._save_host_facts.call_args_list
+        for pk, name, ansible_facts, cleared in call[0][0]
+    )
+
+
 def test_start_job_fact_cache(hosts, job, inventory, tmpdir):
     fact_cache = str(tmpdir)
-    modified_times = {}
-    job.start_job_fact_cache(fact_cache, modified_times, 0)
+    fact_hashes = {}
+    job.start_job_fact_cache(fact_cache, fact_hashes, 0)
 
     for host in hosts:
         filepath = os.path.join(fact_cache, 'facts', host.name)
         assert os.path.exists(filepath)
         with open(filepath, 'r') as f:
             assert f.read() == json.dumps(host.ansible_facts)
-        assert filepath in modified_times
+        assert filepath in fact_hashes
+    assert job._record_fact_cache_stats.call_args[0] == ('start',)
+    assert job._record_fact_cache_stats.call_args[1]['hosts'] == 4
 
 
 def test_fact_cache_with_invalid_path_traversal(job, inventory, tmpdir, mocker):
-    job._get_inventory_hosts = mocker.Mock(return_value=[
+    job._get_inventory_host_rows = mocker.Mock(side_effect=host_rows([
         Host(name='../foo', ansible_facts={"a": 1, "b": 2},),
-    ])
+    ]))
 
     fact_cache = str(tmpdir)
     job.start_job_fact_cache(fact_cache, {}, 0)
@@ -60,71 +75,57 @@ def test_fact_cache_with_invalid_path_traversal(job, inventory, tmpdir, mocker):
 
 def test_finish_job_fact_cache_with_existing_data(job, hosts, inventory, mocker, tmpdir):
     fact_cache = str(tmpdir)
-    modified_times = {}
-    job.start_job_fact_cache(fact_cache, modified_times, 0)
-
-    for h in hosts:
-        h.save = mocker.Mock()
+    fact_hashes = {}
+    job.start_job_fact_cache(fact_cache, fact_hashes, 0)
 
     ansible_facts_new = {"foo": "bar", "insights": {"system_id": "updated_by_scan"}}
     filepath = os.path.join(fact_cache, 'facts', hosts[1].name)
     with open(filepath, 'w') as f:
         f.write(json.dumps(ansible_facts_new))
-        f.flush()
-        # I feel kind of gross about calling `os.utime` by hand, but I noticed
-        # that in our container-based dev environment, the resolution for
-        # `os.stat()` after a file write was over a second, and I don't want to put
-        # a sleep() in this test
-        new_modification_time = time.time() + 3600
-        os.utime(filepath, (new_modification_time, new_modification_time))
 
-    job.finish_job_fact_cache(fact_cache, modified_times)
+    # rewriting a file with the same facts isn't a change, whatever its mtime
+    filepath = os.path.join(fact_cache, 'facts', hosts[2].name)
+    with open(filepath, 'w') as f:
+        f.write(json.dumps(hosts[2].ansible_facts))
+
+    job.finish_job_fact_cache(fact_cache, fact_hashes)
 
-    for host in (hosts[0], hosts[2], hosts[3]):
-        host.save.assert_not_called()
-        assert host.ansible_facts == {"a": 1, "b": 2}
-        assert host.ansible_facts_modified is None
-    assert hosts[1].ansible_facts == ansible_facts_new
-    assert hosts[1].insights_system_id == "updated_by_scan"
-    hosts[1].save.assert_called_once_with()
+    assert saved_facts(job) == {'host2': (ansible_facts_new, False)}
+    stats = job._record_fact_cache_stats.call_args[1]
+    assert (stats['hosts'], stats['changed'], stats['cleared']) == (4, 1, 0)
 
 
 def test_finish_job_fact_cache_with_bad_data(job, hosts, inventory, mocker, tmpdir):
     fact_cache = str(tmpdir)
-    modified_times = {}
-    job.start_job_fact_cache(fact_cache, modified_times, 0)
-
-    for h in hosts:
-        h.save = mocker.Mock()
+    fact_hashes = {}
+    job.start_job_fact_cache(fact_cache, fact_hashes, 0)
 
     for h in hosts:
         filepath = os.path.join(fact_cache, 'facts', h.name)
         with open(filepath, 'w') as f:
             f.write('not valid json!')
-            f.flush()
-            new_modification_time = time.time() + 3600
-            os.utime(filepath, (new_modification_time, new_modification_time))
 
-    job.finish_job_fact_cache(fact_cache, modified_times)
+    job.finish_job_fact_cache(fact_cache, fact_hashes)
 
-    for h in hosts:
-        h.save.assert_not_called()
+    job._save_host_facts.assert_not_called()
 
 
 def test_finish_job_fact_cache_clear(job, hosts, inventory, mocker, tmpdir):
     fact_cache = str(tmpdir)
-    modified_times = {}
-    job.start_job_fact_cache(fact_cache, modified_times, 0)
-
-    for h in hosts:
-        h.save = mocker.Mock()
+    fact_hashes = {}
+    job.start_job_fact_cache(fact_cache, fact_hashes, 0)
 
     os.remove(os.path.join(fact_cache, 'facts', hosts[1].name))
-    job.finish_job_fact_cache(fact_cache, modified_times)
-
-    for host in (hosts[0], hosts[2], hosts[3]):
-        host.save.assert_not_called()
-        assert host.ansible_facts == {"a": 1, "b": 2}
-        assert host.ansible_facts_modified is None
-    assert hosts[1].ansible_facts == {}
-    hosts[1].save.assert_called_once_with()
+    job.finish_job_fact_cache(fact_cache, fact_hashes)
+
+    assert saved_facts(job) == {'host2': ({}, True)}
+
+
+def test_finish_job_fact_cache_saves_in_batches(job, hosts, inventory, mocker, settings, tmpdir):
+    settings.AWX_FACT_CACHE_BATCH_SIZE = 3
+    fact_cache = str(tmpdir)
+    job.start_job_fact_cache(fact_cache, {}, 0)
+
+    job.finish_job_fact_cache(fact_cache, {})
+
+    assert [len(call[0][0]) for call in job._save_host_facts.call_args_list] == [3, 1]
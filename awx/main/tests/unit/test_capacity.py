@@ -12,6 +12,9 @@ class FakeObject(object):
 class Job(FakeObject):
     task_impact = 43
 
+    def get_task_impact(self):
+        return self.task_impact
+
     def log_format(self):
         return 'job 382 (fake)'
 
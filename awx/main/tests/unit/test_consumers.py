@@ -0,0 +1,79 @@
+from unittest import mock
+
+import pytest
+
+from awx.main.consumers import EventBroadcaster
+
+
+@pytest.fixture
+def emit():
+    with mock.patch('awx.main.consumers.emit_channel_notification') as emit:
+        yield emit
+
+
+@pytest.fixture
+def broadcaster():
+    broadcaster = EventBroadcaster()
+    broadcaster.configure(interval=1000)
+    broadcaster.group_has_channels = mock.Mock(return_value=True)
+    broadcaster.last_flush = float('inf')
+    return broadcaster
+
+
+def payload(counter):
+    return lambda: {'group_name': 'job_events', 'job': 1, 'counter': counter}
+
+
+def sent(emit):
+    return [(topic, [e['counter'] for e in message['events']]) for (topic, message), _ in emit.call_args_list]
+
+
+def test_events_are_sent_immediately_by_default(emit):
+    broadcaster = EventBroadcaster()
+    broadcaster.send('job_events-1', payload(0))
+    emit.assert_called_once_with('job_events-1', {'group_name': 'job_events', 'job': 1, 'counter': 0})
+
+
+def test_events_are_batched_per_group(emit, broadcaster):
+    for counter in range(3):
+        broadcaster.send('job_events-1', payload(counter))
+    broadcaster.send('job_events-2', payload(0))
+    assert emit.call_count == 0
+
+    broadcaster.last_flush = 0
+    broadcaster.flush()
+    assert sent(emit) == [('job_events-1', [0, 1, 2]), ('job_events-2', [0])]
+    assert emit.call_args_list[0][0][1]['group_name'] == 'job_events'
+
+
+def test_events_without_subscribers_are_not_serialized(emit, broadcaster):
+    broadcaster.group_has_channels.return_value = False
+    get_payload = mock.Mock()
+    broadcaster.send('job_events-1', get_payload)
+    broadcaster.send('job_events-1', get_payload)
+    broadcaster.flush(force=True)
+    assert get_payload.call_count == 0
+    assert emit.call_count == 0
+    # the subscribers of a group are looked up once a second
+    assert broadcaster.group_has_channels.call_count == 1
+
+
+def test_events_over_the_rate_wait(emit, broadcaster):
+    broadcaster.max_events_per_second = 2
+    for counter in range(5):
+        broadcaster.send('job_events-1', payload(counter))
+
+    broadcaster.last_flush = 0
+    with mock.patch('awx.main.consumers.time.time', return_value=1000):
+        broadcaster.flush()
+        assert sent(emit) == [('job_events-1', [0, 1])]
+        broadcaster.flush()
+        assert len(emit.call_args_list) == 1
+
+    with mock.patch('awx.main.consumers.time.time', return_value=1001):
+        broadcaster.flush()
+        assert sent(emit)[-1] == ('job_events-1', [2, 3])
+
+    # the end of a job sends everything
+    broadcaster.flush(force=True)
+    assert sent(emit)[-1] == ('job_events-1', [4])
@@ -0,0 +1,49 @@
+import pytest
+
+from kombu.serialization import loads
+
+from awx.main.queue import CallbackQueueDispatcher
+
+
+def decode(body, encoding):
+    # compression is applied by kombu when the message is published; accept
+    # what AWXConsumer.get_consumers does
+    return loads(body, encoding['content_type'], encoding['content_encoding'],
+                 accept={'application/json', 'application/x-msgpack'})
+
+
+@pytest.fixture
+def dispatcher(settings):
+    settings.CALLBACK_EVENT_COMPRESSION = 'zlib'
+    settings.CALLBACK_EVENT_COMPRESSION_THRESHOLD = 1024
+
+    def dispatcher(codec):
+        settings.CALLBACK_EVENT_CODEC = codec
+        return CallbackQueueDispatcher()
+    return dispatcher
+
+
+@pytest.mark.parametrize('codec, content_type', [
+    ('json', 'application/json'),
+    ('msgpack', 'application/x-msgpack'),
+])
+def test_event_codecs(dispatcher, codec, content_type):
+    event = {'uuid': 'abc', 'stdout': u'Iñtërnâtiônàlizætiøn', 'counter': 1}
+    body, encoding = dispatcher(codec).encode(event)
+    assert encoding['content_type'] == content_type
+    assert encoding['compression'] is None
+    assert encoding['headers'] == {'awx_event_codec': codec}
+    assert decode(body, encoding) == event
+
+
+def test_large_events_are_compressed(dispatcher):
+    event = {'uuid': 'abc', 'stdout': 'x' * 1024}
+    body, encoding = dispatcher('msgpack').encode(event)
+    assert encoding['compression'] == 'zlib'
+    assert encoding['headers'] == {'awx_event_codec': 'msgpack+zlib'}
+    assert decode(body, encoding) == event
+
+
+def test_unknown_codec_falls_back_to_json(dispatcher):
+    body, encoding = dispatcher('pickle').encode({'uuid': 'abc'})
+    assert encoding['content_type'] == 'application/json'
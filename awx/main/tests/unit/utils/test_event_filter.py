@@ -196,3 +196,70 @@ def test_verbose_line_buffering():
     assert len(events) == 6
 
     assert events[5]['event'] == 'EOF'
+
+
+def _recorded_stream():
+    # stdout resembling a chatty playbook run: progress output that uses
+    # erase-line sequences, and events with large `res` payloads
+    buff = StringIO()
+    for i in range(3):
+        buff.write('\x1b[Kprogress {}%\x1b[K\r\n'.format(i))
+        write_encoded_event_data(buff, {
+            'uuid': '{}-{}'.format(EXAMPLE_UUID, i),
+            'event': 'runner_on_ok',
+            'res': {'stdout': 'x' * (256 * 1024 * (i + 1))},
+        })
+        buff.write('\r\nok: [host-{}]\r\n'.format(i))
+    write_encoded_event_data(buff, {})
+    return buff.getvalue()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, None])
+def test_chunked_writes_are_equivalent(chunk_size):
+    stream = _recorded_stream()
+    if chunk_size is None:
+        chunk_size = len(stream)
+    if chunk_size == 1:
+        # one character at a time is slow enough to exercise with less data
+        stream = stream[:64 * 1024] + stream[-1024:]
+
+    events = []
+    f = OutputEventFilter(events.append)
+    for offset in range(0, len(stream), chunk_size):
+        f.write(stream[offset:offset + chunk_size])
+    f.close()
+
+    expected = []
+    f = OutputEventFilter(expected.append)
+    f.write(stream)
+    f.close()
+    assert events == expected
+
+
+def test_event_counters_and_lines():
+    events = []
+    f = OutputEventFilter(events.append)
+    f.write(_recorded_stream())
+    f.close()
+    assert [e['counter'] for e in events[:-1]] == list(range(1, len(events)))
+    assert [e.get('event') for e in events] == [
+        'verbose', 'runner_on_ok', 'runner_on_ok', 'runner_on_ok', 'EOF'
+    ]
+    # stdout that merely contains erase-line sequences isn't an event
+    assert events[0]['stdout'] == '\x1b[Kprogress 0%\x1b[K'
+    assert (events[0]['start_line'], events[0]['end_line']) == (0, 1)
+    assert events[1]['stdout'] == '\r\nok: [host-0]\r\n\x1b[Kprogress 1%\x1b[K'
+    assert (events[1]['start_line'], events[1]['end_line']) == (1, 4)
+    assert len(events[3]['res']['stdout']) == 256 * 1024 * 3
+
+
+@pytest.mark.timeout(5)
+def test_large_event_payload_benchmark():
+    # large payloads arrive in many small pexpect reads; parsing should be
+    # linear in the size of the stream regardless of how it's chunked
+    stream = _recorded_stream() * 4
+    stream += ''.join('progress {}%\x1b[K\r\n'.format(i % 100) for i in range(50000))
+    f = OutputEventFilter(lambda event_data: None)
+    for offset in range(0, len(stream), 2048):
+        f.write(stream[offset:offset + 2048])
+    f.close()
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from awx.main.utils.group_computed_fields import compute_group_fields, compute_group_fields_by_subtree
+
+
+def random_inventory(seed, groups=60, hosts=200):
+    rand = random.Random(seed)
+    group_children_map = {}
+    # a child's pk is always larger than its parents', so there is no cycle
+    for child_pk in range(2, groups + 1):
+        for parent_pk in rand.sample(range(1, child_pk), rand.randint(1, min(3, child_pk - 1))):
+            group_children_map.setdefault(parent_pk, set()).add(child_pk)
+    group_hosts_map = {}
+    for host_pk in range(1, hosts + 1):
+        for group_pk in rand.sample(range(1, groups + 1), rand.randint(0, 3)):
+            group_hosts_map.setdefault(group_pk, set()).add(host_pk)
+    active_host_pks = set(range(1, hosts + 1))
+    failed_host_pks = set(rand.sample(sorted(active_host_pks), 10))
+    groups_with_cloud_pks = set(rand.sample(range(1, groups + 1), 5))
+    return (set([1]), group_children_map, group_hosts_map,
+            active_host_pks, failed_host_pks, groups_with_cloud_pks)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_subtree_walk(seed):
+    args = random_inventory(seed)
+    assert compute_group_fields(*args) == compute_group_fields_by_subtree(*args)
+
+
+def test_shared_descendants_are_counted_once():
+    # 1 -> (2, 3) -> 4, with the failed host 10 in 4
+    fields = compute_group_fields(set([1]), {1: set([2, 3]), 2: set([4]), 3: set([4])},
+                                  {2: set([11]), 4: set([10])}, set([10, 11]), set([10]), set([3]))
+    assert fields[1] == {
+        'total_hosts': 2,
+        'has_active_failures': True,
+        'hosts_with_active_failures': 1,
+        'total_groups': 3,
+        'groups_with_active_failures': 3,
+        'has_inventory_sources': False,
+    }
+    assert fields[3]['has_inventory_sources'] is True
+    assert fields[4]['total_groups'] == 0
+
+
+def test_cycle():
+    assert compute_group_fields(set([1]), {1: set([2]), 2: set([3]), 3: set([2])}, {}, set(), set(), set()) is None
@@ -1,9 +1,10 @@
 # AWX utils
 from awx.main.utils.mem_inventory import (
-    MemInventory,
-    mem_data_to_dict, dict_to_mem_data
+    MemInventory, HostVarsStore, JSONStreamReader,
+    mem_data_to_dict, dict_to_mem_data, stream_to_mem_data
 )
 
+import io
 import pytest
 import json
 
@@ -126,3 +127,68 @@ def test_host_lists_accepted(JSON_with_lists):
     # Check that marietta's hosts was saved
     h = inventory.get_host('host6.example.com')
     assert h.name == 'host6.example.com'
+
+
+# Streamed JSON --> MemObject tests
+
+class ChunkedStream(io.StringIO):
+    # returns one character at a time, like a pipe that is slow to fill
+    def read(self, size=-1):
+        return super(ChunkedStream, self).read(1)
+
+
+@pytest.mark.inventory_import
+@pytest.mark.parametrize('fixture', ['JSON_of_inv', 'JSON_with_lists'])
+def test_stream_matches_dict(request, fixture):
+    data = request.getfixturevalue(fixture)
+    text = json.dumps(data, indent=4, sort_keys=True)
+    streamed = stream_to_mem_data(ChunkedStream(text), memory_budget=0)
+    assert mem_data_to_dict(streamed) == mem_data_to_dict(dict_to_mem_data(json.loads(text)))
+
+
+@pytest.mark.inventory_import
+def test_stream_hostvars_apply_to_grouped_hosts():
+    text = json.dumps({
+        '_meta': {'hostvars': {'a': {'x': 1, 'big': 10.5}, 'b': {'x': 2}, 'orphan': {'x': 3}}},
+        'g': {'hosts': {'a:2222': {'y': True}, 'b': {}}},
+    })
+    inventory = stream_to_mem_data(io.StringIO(text), memory_budget=20)
+    assert set(inventory.all_group.all_hosts) == set(['a', 'b'])
+    assert inventory.get_host('a').variables == {'ansible_port': 2222, 'x': 1, 'y': True, 'big': 10.5}
+    assert inventory.get_host('b').variables == {'x': 2}
+    store = inventory.get_host('a').variables_store
+    assert list(store.in_memory) == ['a'] and set(store.spilled) == set(['b', 'orphan'])
+
+
+@pytest.mark.inventory_import
+def test_stream_rejects_invalid_json():
+    with pytest.raises(TypeError):
+        stream_to_mem_data(io.StringIO('[1, 2]'))
+    with pytest.raises(ValueError):
+        stream_to_mem_data(io.StringIO('{"g": ["a"], "h": '))
+    with pytest.raises(ValueError):
+        stream_to_mem_data(io.StringIO('{"g": ["a"]} {}'))
+
+
+@pytest.mark.inventory_import
+@pytest.mark.parametrize('document, chunk_size', [
+    ('{"a": 12345, "b": [true]}', 9),
+    ('{"a": 12.5}', 9),   # split right after the '.'
+    ('{"a": 1e5}', 8),    # split right after the 'e'
+    ('{"a": -3.25E-2, "b": 7}', 12),
+])
+def test_json_stream_reader_numbers_across_chunks(document, chunk_size):
+    reader = JSONStreamReader(io.StringIO(document), chunk_size=chunk_size)
+    assert dict((k, reader.value()) for k in reader.members()) == json.loads(document)
+    reader.end()
+
+
+@pytest.mark.inventory_import
+def test_host_vars_store_replaces_spilled_variables():
+    store = HostVarsStore(memory_budget=0)
+    store['h'] = {'a': 1}
+    store['h'] = {'a': 2}
+    assert len(store) == 1
+    assert store['h'] == {'a': 2}
+    store.close()
+    assert 'h' not in store
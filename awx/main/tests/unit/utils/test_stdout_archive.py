@@ -0,0 +1,85 @@
+from io import BytesIO
+
+import pytest
+
+from awx.main.utils.stdout_archive import event_lines, StdoutArchiveWriter, StdoutArchiveReader
+
+
+class ArchiveFile(BytesIO):
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def archive():
+    '''
+    An archive of 30 events covering 0, 1 or 2 lines each, written in small
+    blocks; returns the expected lines, the reader, and the reads it makes.
+    '''
+    fileobj = ArchiveFile()
+    writer = StdoutArchiveWriter(fileobj, block_size=64)
+    expected = []
+    for i in range(30):
+        n = i % 3
+        stdout = '\r\n'.join('event {} line {}'.format(i, j) for j in range(n))
+        writer.write_event(stdout, len(expected), len(expected) + n)
+        expected.extend('event {} line {}\n'.format(i, j) for j in range(n))
+    writer.close()
+
+    data = fileobj.getvalue()
+    reads = []
+
+    def read(offset, length):
+        reads.append((offset, length))
+        return data[offset:offset + length]
+    return expected, StdoutArchiveReader(read, writer.index, writer.lines), reads
+
+
+@pytest.mark.parametrize('stdout, start_line, end_line, lines', [
+    ['', 0, 0, []],
+    ['', 0, 1, ['\n']],
+    ['foo', 0, 1, ['foo\n']],
+    ['foo\r\nbar', 3, 5, ['foo\n', 'bar\n']],
+])
+def test_event_lines(stdout, start_line, end_line, lines):
+    assert event_lines(stdout, start_line, end_line) == lines
+
+
+def test_archive_is_written_in_blocks(archive):
+    expected, reader, reads = archive
+    assert reader.lines == len(expected)
+    assert len(reader.index) > 1
+    assert sum(block[3] for block in reader.index) == len(''.join(expected))
+
+
+def test_read_every_line_range(archive):
+    expected, reader, reads = archive
+    for start_line in range(len(expected)):
+        for end_line in range(start_line, len(expected) + 2):
+            assert reader.read_lines(start_line, end_line) == ''.join(expected[start_line:end_line])
+
+
+def test_read_only_the_blocks_containing_a_range(archive):
+    expected, reader, reads = archive
+    first_line, offset, length, size = reader.index[2]
+    reader.read_lines(first_line, first_line + 1)
+    assert reads == [(offset, length)]
+
+
+def test_blocks_are_read_together(archive):
+    expected, reader, reads = archive
+    assert ''.join(text for first_line, text in reader.blocks()) == ''.join(expected)
+    assert len(reads) == 1
+
+
+def test_write_errors_are_recorded():
+    class BrokenFile(ArchiveFile):
+        def write(self, data):
+            raise IOError('No space left on device')
+
+    writer = StdoutArchiveWriter(BrokenFile(), block_size=1)
+    writer.write_event('foo', 0, 1)
+    writer.write_event('bar', 1, 2)
+    writer.close()
+    assert isinstance(writer.error, IOError)
@@ -956,17 +956,49 @@ def get_custom_venv_choices():
 class OutputEventFilter(object):
     '''
     File-like object that looks for encoded job events in stdout data.
+
+    Encoded events match EVENT_DATA_RE.  Rather than re-searching all of the
+    buffered output on every write(), stdout is tokenized incrementally: the
+    parser state is kept between writes so that each character is scanned
+    once no matter how the stream is chunked, and the base64 event data is
+    decoded as each of its chunks completes.
     '''
 
     EVENT_DATA_RE = re.compile(r'\x1b\[K((?:[A-Za-z0-9+/=]+\x1b\[\d+D)+)\x1b\[K')
+    EVENT_TOKEN = '\x1b[K'
+    BASE64_RE = re.compile(r'[A-Za-z0-9+/=]+')
+    DIGITS_RE = re.compile(r'\d+')
+    CHUNKS_RE = re.compile(r'(?:[A-Za-z0-9+/=]+\x1b\[\d+D)+')
+    CHUNK_SEPARATOR_RE = re.compile(r'\x1b\[\d+D')
+
+    # tokenizer states
+    TEXT = 'text'                  # plain stdout
+    BASE64_START = 'base64_start'  # expecting the base64 data of a chunk
+    BASE64 = 'base64'              # reading the base64 data of a chunk
+    ESCAPE = 'escape'              # read \x1b
+    BRACKET = 'bracket'            # read \x1b[
+    DIGITS = 'digits'              # read \x1b[<digits>
 
     def __init__(self, event_callback):
         self._event_callback = event_callback
         self._counter = 0
         self._start_line = 0
         self._buffer = StringIO()
-        self._last_chunk = ''
+        self._carry = ''
         self._current_event_data = None
+        self._reset_token()
+
+    def _reset_token(self):
+        self._state = self.TEXT
+        # the raw text of the encoded event being parsed, in case it turns out
+        # not to be an encoded event after all
+        self._token = []
+        self._chunks = 0
+        self._end_allowed = False
+        self._base64 = []
+        self._decoded = bytearray()
+        self._decode_error = False
+        self._padded = False
 
     def flush(self):
         # pexpect wants to flush the file it writes to, but we're not
@@ -975,35 +1007,149 @@ class OutputEventFilter(object):
         # the stdout stream
         pass
 
-    def write(self, data):
-        data = smart_str(data)
-        self._buffer.write(data)
-
-        # keep a sliding window of the last chunk written so we can detect
-        # event tokens and determine if we need to perform a search of the full
-        # buffer
-        should_search = '\x1b[K' in (self._last_chunk + data)
-        self._last_chunk = data
-
-        # Only bother searching the buffer if we recently saw a start/end
-        # token (\x1b[K)
-        while should_search:
-            value = self._buffer.getvalue()
-            match = self.EVENT_DATA_RE.search(value)
-            if not match:
-                break
+    def _decode_base64(self, final=False):
+        if self._padded and not final:
+            return
+        data = ''.join(self._base64)
+        self._base64 = []
+        if not final:
+            if '=' in data:
+                # padding should only appear at the very end; leave anything
+                # from here on to be decoded in one piece, the way b64decode
+                # would handle the whole string
+                self._base64.append(data)
+                self._padded = True
+                return
+            # only decode whole 4-character groups; the remainder is decoded
+            # along with the next chunk
+            cutoff = len(data) - len(data) % 4
+            if cutoff < len(data):
+                self._base64.append(data[cutoff:])
+            data = data[:cutoff]
+        if data and not self._decode_error:
             try:
-                base64_data = re.sub(r'\x1b\[\d+D', '', match.group(1))
-                event_data = json.loads(base64.b64decode(base64_data))
+                self._decoded.extend(base64.b64decode(data))
+            except ValueError:
+                self._decode_error = True
+
+    def _token_failed(self, data, pos):
+        # the text since the last EVENT_TOKEN isn't an encoded event, so it's
+        # plain stdout.  Every \x1b in it except the last one belongs to the
+        # EVENT_TOKEN or to a complete \x1b[<n>D chunk separator, so only the
+        # text from the last \x1b onward could start another EVENT_TOKEN and
+        # needs to be scanned again
+        token = ''.join(self._token)
+        idx = token.rfind('\x1b', 1)
+        if idx == -1:
+            idx = len(token)
+        self._buffer.write(token[:idx])
+        self._reset_token()
+        return token[idx:] + data[pos:]
+
+    def _token_complete(self):
+        self._decode_base64(final=True)
+        event_data = {}
+        if not self._decode_error:
+            try:
+                event_data = json.loads(bytes(self._decoded))
             except ValueError:
                 event_data = {}
-            self._emit_event(value[:match.start()], event_data)
-            remainder = value[match.end():]
-            self._buffer = StringIO()
-            self._buffer.write(remainder)
-            self._last_chunk = remainder
+        self._reset_token()
+        self._emit_event(self._buffer.getvalue(), event_data)
+        self._buffer = StringIO()
+
+    def write(self, data):
+        data = self._carry + smart_str(data)
+        self._carry = ''
+        pos = 0
+        while pos < len(data):
+            state = self._state
+            char = data[pos]
+            if state == self.TEXT:
+                idx = data.find(self.EVENT_TOKEN, pos)
+                if idx == -1:
+                    # hold back a trailing partial EVENT_TOKEN until the next
+                    # write tells us whether it starts an encoded event
+                    for n in (2, 1):
+                        if len(data) - pos >= n and data.endswith(self.EVENT_TOKEN[:n]):
+                            self._carry = data[-n:]
+                            data = data[:-n]
+                            break
+                    self._buffer.write(data[pos:])
+                    return
+                self._buffer.write(data[pos:idx])
+                self._token.append(self.EVENT_TOKEN)
+                self._state = self.BASE64_START
+                pos = idx + len(self.EVENT_TOKEN)
+                continue
+            elif state in (self.BASE64_START, self.BASE64):
+                if state == self.BASE64_START:
+                    # consume every complete chunk available in one pass
+                    match = self.CHUNKS_RE.match(data, pos)
+                    if match:
+                        self._token.append(match.group())
+                        self._base64.append(self.CHUNK_SEPARATOR_RE.sub('', match.group()))
+                        self._chunks += 1
+                        self._decode_base64()
+                        pos = match.end()
+                        continue
+                match = self.BASE64_RE.match(data, pos)
+                if match:
+                    self._token.append(match.group())
+                    self._base64.append(match.group())
+                    self._state = self.BASE64
+                    pos = match.end()
+                    continue
+                if char == '\x1b' and (state == self.BASE64 or self._chunks):
+                    # base64 data is followed by a chunk separator; a chunk
+                    # separator may also be followed by the closing token
+                    self._end_allowed = state == self.BASE64_START
+                    self._token.append(char)
+                    self._state = self.ESCAPE
+                    pos += 1
+                    continue
+            elif state == self.ESCAPE:
+                if char == '[':
+                    self._token.append(char)
+                    self._state = self.BRACKET
+                    pos += 1
+                    continue
+            elif state == self.BRACKET:
+                if self._end_allowed:
+                    if char == 'K':
+                        self._token_complete()
+                        pos += 1
+                        continue
+                else:
+                    match = self.DIGITS_RE.match(data, pos)
+                    if match:
+                        self._token.append(match.group())
+                        self._state = self.DIGITS
+                        pos = match.end()
+                        continue
+            elif state == self.DIGITS:
+                match = self.DIGITS_RE.match(data, pos)
+                if match:
+                    self._token.append(match.group())
+                    pos = match.end()
+                    continue
+                if char == 'D':
+                    self._token.append(char)
+                    self._chunks += 1
+                    self._decode_base64()
+                    self._state = self.BASE64_START
+                    pos += 1
+                    continue
+
+            # the input doesn't match the encoded event syntax
+            data = self._token_failed(data, pos)
+            pos = 0
 
     def close(self):
+        # an encoded event that was never completed is plain stdout
+        self._buffer.write(''.join(self._token) + self._carry)
+        self._carry = ''
+        self._reset_token()
         value = self._buffer.getvalue()
         if value:
             self._emit_event(value)
@@ -0,0 +1,231 @@
+# Copyright (c) 2018 Ansible by Red Hat
+# All Rights Reserved.
+
+'''
+Computation of the computed fields of the groups of an inventory
+(`total_hosts`, `groups_with_active_failures`, ...) from its group/host
+relationships, without touching the database.
+'''
+
+__all__ = ['compute_group_fields', 'compute_group_fields_by_subtree']
+
+
+# Sets of hosts and groups are held by index: small ones as frozensets of
+# indexes, and larger ones as bitsets, (offset, bits) pairs where the int
+# `bits` has bit i set for index (offset + i).  Indexes are handed out in the
+# order hosts and groups are visited, so the members of a subtree tend to
+# have nearby indexes and the ints stay small.
+
+SMALL_SET_SIZE = 64
+
+
+def _bitset(indexes):
+    offset = min(indexes)
+    data = bytearray((max(indexes) - offset) // 8 + 1)
+    for i in indexes:
+        i -= offset
+        data[i >> 3] |= 1 << (i & 7)
+    return (offset, int.from_bytes(bytes(data), 'little'))
+
+
+def _index_set(indexes):
+    if len(indexes) <= SMALL_SET_SIZE:
+        return frozenset(indexes)
+    return _bitset(indexes)
+
+
+def _union(a, b):
+    offset = min(a[0], b[0])
+    return (offset, (a[1] << (a[0] - offset)) | (b[1] << (b[0] - offset)))
+
+
+def _union_all(index_sets):
+    small = set()
+    bitsets = []
+    for index_set in index_sets:
+        if isinstance(index_set, frozenset):
+            small.update(index_set)
+        else:
+            bitsets.append(index_set)
+    if not bitsets:
+        return _index_set(small)
+    if small:
+        bitsets.append(_bitset(small))
+    # merge pairwise, so that merging many sets into a large one doesn't
+    # copy the large one for every other set
+    while len(bitsets) > 1:
+        bitsets = [_union(*bitsets[i:i + 2]) if i + 1 < len(bitsets) else bitsets[i]
+                   for i in range(0, len(bitsets), 2)]
+    return bitsets[0]
+
+
+if hasattr(int, 'bit_count'):
+    def _count(index_set):
+        if isinstance(index_set, frozenset):
+            return len(index_set)
+        return index_set[1].bit_count()
+else:
+    def _count(index_set):
+        if isinstance(index_set, frozenset):
+            return len(index_set)
+        return bin(index_set[1]).count('1')
+
+
+def compute_group_fields(root_group_pks, group_children_map, group_hosts_map,
+                         active_host_pks, failed_host_pks, groups_with_cloud_pks):
+    '''
+    Return {group pk: {field: value}} for every group under the groups in
+    `root_group_pks`, or None if the groups have a cycle (which the API
+    doesn't allow); see `compute_group_fields_by_subtree` for that case.
+
+    Each group is visited once, after all of its descendants (depth first,
+    in post-order), and the hosts and descendant groups under it (and those
+    of them with active failures) are found by merging the sets of its
+    children.  A group's sets are dropped as soon as all of its parents
+    have merged them, so for a tree only the children of the groups on the
+    current path are held.
+    '''
+    # Count the parents each group has among the groups being visited, so
+    # its sets can be dropped once they have all merged them.
+    pending_parents = {}
+    reachable = set(root_group_pks)
+    to_check = list(root_group_pks)
+    while to_check:
+        for child_pk in group_children_map.get(to_check.pop(), ()):
+            pending_parents[child_pk] = pending_parents.get(child_pk, 0) + 1
+            if child_pk not in reachable:
+                reachable.add(child_pk)
+                to_check.append(child_pk)
+
+    host_index = {}
+
+    def visit(group_pk):
+        '''
+        Return the stack frame for a group: [group pk, iterator over its
+        children] followed by lists of the sets to merge into its hosts,
+        failed hosts, groups and failed groups.
+        '''
+        indexes, failed_indexes = [], []
+        for host_pk in group_hosts_map.get(group_pk, ()):
+            if host_pk not in active_host_pks:
+                continue
+            i = host_index.setdefault(host_pk, len(host_index))
+            indexes.append(i)
+            if host_pk in failed_host_pks:
+                failed_indexes.append(i)
+        children = iter(sorted(group_children_map.get(group_pk, ())))
+        return [group_pk, children, [_index_set(indexes)], [_index_set(failed_indexes)], [], []]
+
+    def merge(frame, child_pk):
+        for index_sets, index_set in zip(frame[2:], summaries[child_pk]):
+            index_sets.append(index_set)
+        pending_parents[child_pk] -= 1
+        if not pending_parents[child_pk]:
+            del summaries[child_pk]
+
+    VISITING, DONE = 1, 2
+    state = {}
+    # group pk => (hosts, failed hosts, groups, failed groups), the groups
+    # including the group itself, for visited groups with parents that
+    # haven't merged them yet
+    summaries = {}
+    group_fields = {}
+
+    for root_pk in sorted(root_group_pks):
+        if root_pk in state:
+            continue
+        state[root_pk] = VISITING
+        stack = [visit(root_pk)]
+        while stack:
+            frame = stack[-1]
+            for child_pk in frame[1]:
+                child_state = state.get(child_pk)
+                if child_state == DONE:
+                    merge(frame, child_pk)
+                elif child_state == VISITING:
+                    return None
+                else:
+                    state[child_pk] = VISITING
+                    stack.append(visit(child_pk))
+                    break
+            else:
+                stack.pop()
+                group_pk = frame[0]
+                hosts, failed_hosts, groups, failed_groups = [_union_all(index_sets) for index_sets in frame[2:]]
+                hosts_with_active_failures = _count(failed_hosts)
+                group_fields[group_pk] = {
+                    'total_hosts': _count(hosts),
+                    'has_active_failures': bool(hosts_with_active_failures),
+                    'hosts_with_active_failures': hosts_with_active_failures,
+                    'total_groups': _count(groups),
+                    'groups_with_active_failures': _count(failed_groups),
+                    'has_inventory_sources': bool(group_pk in groups_with_cloud_pks),
+                }
+                state[group_pk] = DONE
+                if pending_parents.get(group_pk):
+                    this_group = frozenset([len(group_fields)])
+                    groups = _union_all([groups, this_group])
+                    if hosts_with_active_failures:
+                        failed_groups = _union_all([failed_groups, this_group])
+                    summaries[group_pk] = (hosts, failed_hosts, groups, failed_groups)
+                    if stack:
+                        merge(stack[-1], group_pk)
+    return group_fields
+
+
+def compute_group_fields_by_subtree(root_group_pks, group_children_map, group_hosts_map,
+                                    active_host_pks, failed_host_pks, groups_with_cloud_pks):
+    '''
+    Return the same as `compute_group_fields`, by walking the whole subtree
+    of each group, deepest groups first.  This also copes with groups that
+    have a cycle, but takes time proportional to the number of groups times
+    the size of their subtrees.
+    '''
+    failed_group_pks = set() # Update below as we check each group.
+    groups_to_update = {}
+
+    # Build list of group pks to check, starting with the groups at the
+    # deepest level within the tree.
+    group_depths = {} # pk: max_depth
+
+    def update_group_depths(group_pk, current_depth=0):
+        max_depth = group_depths.get(group_pk, -1)
+        # Arbitrarily limit depth to avoid hitting Python recursion limit (which defaults to 1000).
+        if current_depth > 100:
+            return
+        if current_depth > max_depth:
+            group_depths[group_pk] = current_depth
+        for child_pk in group_children_map.get(group_pk, set()):
+            update_group_depths(child_pk, current_depth + 1)
+    for group_pk in root_group_pks:
+        update_group_depths(group_pk)
+    group_pks_to_check = [x[1] for x in sorted([(v,k) for k,v in group_depths.items()], reverse=True)]
+
+    for group_pk in group_pks_to_check:
+        # Get all children and host pks for this group.
+        parent_pks_to_check = set([group_pk])
+        parent_pks_checked = set()
+        child_pks = set()
+        host_pks = set()
+        while parent_pks_to_check:
+            for parent_pk in list(parent_pks_to_check):
+                c_ids = group_children_map.get(parent_pk, set())
+                child_pks.update(c_ids)
+                parent_pks_to_check.remove(parent_pk)
+                parent_pks_checked.add(parent_pk)
+                parent_pks_to_check.update(c_ids - parent_pks_checked)
+                h_ids = group_hosts_map.get(parent_pk, set())
+                host_pks.update(h_ids)
+        # Define updates needed for this group.
+        group_updates = groups_to_update.setdefault(group_pk, {})
+        group_updates.update({
+            'total_hosts': len(active_host_pks & host_pks),
+            'has_active_failures': bool(failed_host_pks & host_pks),
+            'hosts_with_active_failures': len(failed_host_pks & host_pks),
+            'total_groups': len(child_pks),
+            'groups_with_active_failures': len(failed_group_pks & child_pks),
+            'has_inventory_sources': bool(group_pk in groups_with_cloud_pks),
+        })
+        if group_updates['has_active_failures']:
+            failed_group_pks.add(group_pk)
+    return groups_to_update
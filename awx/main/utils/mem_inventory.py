@@ -2,8 +2,11 @@
 # All Rights Reserved.
 
 # Python
+import json
+import os
 import re
 import logging
+import tempfile
 from collections import OrderedDict
 
 
@@ -12,8 +15,8 @@ from collections import OrderedDict
 logger = logging.getLogger('awx.main.commands.inventory_import')
 
 
-__all__ = ['MemHost', 'MemGroup', 'MemInventory',
-           'mem_data_to_dict', 'dict_to_mem_data']
+__all__ = ['MemHost', 'MemGroup', 'MemInventory', 'HostVarsStore',
+           'mem_data_to_dict', 'dict_to_mem_data', 'stream_to_mem_data']
 
 
 ipv6_port_re = re.compile(r'^\[([A-Fa-f0-9:]{3,})\]:(\d+?)$')
@@ -91,17 +94,38 @@ class MemHost(MemObject):
 
     def __init__(self, name, port=None):
         super(MemHost, self).__init__(name)
-        self.variables = {}
+        self._variables = {}
+        # HostVarsStore holding the host's `_meta.hostvars`, if any
+        self.variables_store = None
         self.instance_id = None
         self.name = name
         if port:
             # was `ansible_ssh_port` in older Ansible versions
-            self.variables['ansible_port'] = port
+            self._variables['ansible_port'] = port
         logger.debug('Loaded host: %s', self.name)
 
     def __repr__(self):
         return '<_in-memory-host_ `{}`>'.format(self.name)
 
+    @property
+    def variables(self):
+        '''
+        Variables of the host.  When they are held in a HostVarsStore, they
+        are read from it (over the host's own variables) on every access, so
+        changes to the returned dict are not kept; assign to `variables` to
+        replace them instead.
+        '''
+        if self.variables_store is None:
+            return self._variables
+        variables = dict(self._variables)
+        variables.update(self.variables_store[self.name])
+        return variables
+
+    @variables.setter
+    def variables(self, variables):
+        self._variables = variables
+        self.variables_store = None
+
 
 class MemInventory(object):
     '''
@@ -180,6 +204,161 @@ class MemInventory(object):
                 del self.all_group.all_groups[name]
 
 
+class HostVarsStore(object):
+    '''
+    Variables of many hosts, by host name, kept as compact JSON.  Up to
+    `memory_budget` bytes of it are held in memory; once that is exceeded,
+    the variables of any further hosts are written to an anonymous temporary
+    file (removed when the store is closed or the process exits) and read
+    back from it when they are needed.
+    '''
+
+    def __init__(self, memory_budget, tmp_dir=None):
+        self.memory_budget = memory_budget
+        self.tmp_dir = tmp_dir
+        self.memory_size = 0
+        self.in_memory = {}
+        # host name => (offset, length) in spill_file
+        self.spilled = {}
+        self.spill_file = None
+
+    def __len__(self):
+        return len(self.in_memory) + len(self.spilled)
+
+    def __contains__(self, name):
+        return name in self.in_memory or name in self.spilled
+
+    def __setitem__(self, name, variables):
+        data = json.dumps(variables, separators=(',', ':')).encode('utf-8')
+        if name in self.in_memory:
+            self.memory_size -= len(self.in_memory.pop(name))
+        self.spilled.pop(name, None)
+        if self.spill_file is None and self.memory_size + len(data) <= self.memory_budget:
+            self.in_memory[name] = data
+            self.memory_size += len(data)
+            return
+        if self.spill_file is None:
+            logger.info('Host variables exceed %d bytes, storing the rest in a temporary file',
+                        self.memory_budget)
+            self.spill_file = tempfile.TemporaryFile(prefix='awx_hostvars_', dir=self.tmp_dir)
+        self.spill_file.seek(0, os.SEEK_END)
+        self.spilled[name] = (self.spill_file.tell(), len(data))
+        self.spill_file.write(data)
+
+    def __getitem__(self, name):
+        data = self.in_memory.get(name)
+        if data is None:
+            offset, length = self.spilled[name]
+            self.spill_file.seek(offset)
+            data = self.spill_file.read(length)
+        return json.loads(data.decode('utf-8'))
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        self.in_memory = {}
+        self.spilled = {}
+        self.memory_size = 0
+
+
+class JSONStreamReader(object):
+    '''
+    Reads a JSON document from a text file object a piece at a time.  The
+    members of an object are walked one by one with `members`, and `value`
+    decodes the next value, so no more than one value (plus a chunk) has to
+    be held in memory at once.
+    '''
+
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    NUMBER_CHARACTERS = '0123456789.eE+-'
+
+    def __init__(self, fileobj, chunk_size=64 * 1024):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        # characters dropped from the front of the buffer, for error messages
+        self.offset = 0
+        self.eof = False
+
+    def _read(self, size):
+        data = self.fileobj.read(size)
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        if not data:
+            self.eof = True
+        return bool(data)
+
+    def _error(self, message):
+        return ValueError('{} at character {}'.format(message, self.offset + self.pos))
+
+    def peek(self):
+        '''
+        Return the next character that isn't whitespace, or '' at the end of
+        the stream.
+        '''
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read(self.chunk_size):
+                return ''
+
+    def expect(self, characters):
+        c = self.peek()
+        if not c or c not in characters:
+            raise self._error('Expecting one of {!r}'.format(characters))
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise self._error('Invalid JSON value')
+            else:
+                # a number (or literal) that ends with the buffer, or just
+                # before a character that could carry it on (the '.' or 'e'
+                # of a number split between chunks), may go on in the part
+                # of the stream that hasn't been read yet
+                if (self.eof or self.buffer[end - 1] in '"]}' or
+                        (end < len(self.buffer) and self.buffer[end] not in self.NUMBER_CHARACTERS)):
+                    self.pos = end
+                    return value
+            # read at least as much again as is buffered, so that a large
+            # value is only decoded a few times before it is complete
+            self._read(max(self.chunk_size, len(self.buffer) - self.pos))
+
+    def members(self):
+        '''
+        Generate the keys of the object that starts at the next character;
+        the value of each member must be read (with `value`, or `members`
+        for an object) before the next key is generated.
+        '''
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error('Expecting property name enclosed in double quotes')
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def end(self):
+        if self.peek():
+            raise self._error('Extra data')
+
+
 # Conversion utilities
 
 def mem_data_to_dict(inventory):
@@ -224,6 +403,76 @@ def mem_data_to_dict(inventory):
     return inventory_data
 
 
+def _add_group_data(inventory, k, v):
+    '''
+    Add the group named `k`, loaded from `v`, to `inventory`.
+    '''
+    group = inventory.get_group(k)
+    if not group:
+        return
+
+    # Load group hosts/vars/children from a dictionary.
+    if isinstance(v, dict):
+        # Process hosts within a group.
+        hosts = v.get('hosts', {})
+        if isinstance(hosts, dict):
+            for hk, hv in hosts.items():
+                host = inventory.get_host(hk)
+                if not host:
+                    continue
+                if isinstance(hv, dict):
+                    host.variables.update(hv)
+                else:
+                    logger.warning('Expected dict of vars for '
+                                   'host "%s", got %s instead',
+                                   hk, str(type(hv)))
+                group.add_host(host)
+        elif isinstance(hosts, (list, tuple)):
+            for hk in hosts:
+                host = inventory.get_host(hk)
+                if not host:
+                    continue
+                group.add_host(host)
+        else:
+            logger.warning('Expected dict or list of "hosts" for '
+                           'group "%s", got %s instead', k,
+                           str(type(hosts)))
+        # Process group variables.
+        vars = v.get('vars', {})
+        if isinstance(vars, dict):
+            group.variables.update(vars)
+        else:
+            logger.warning('Expected dict of vars for '
+                           'group "%s", got %s instead',
+                           k, str(type(vars)))
+        # Process child groups.
+        children = v.get('children', [])
+        if isinstance(children, (list, tuple)):
+            for c in children:
+                child = inventory.get_group(c, inventory.all_group, child=True)
+                if child and c != 'ungrouped':
+                    group.add_child_group(child)
+        else:
+            logger.warning('Expected list of children for '
+                           'group "%s", got %s instead',
+                           k, str(type(children)))
+
+    # Load host names from a list.
+    elif isinstance(v, (list, tuple)):
+        for h in v:
+            host = inventory.get_host(h)
+            if not host:
+                continue
+            group.add_host(host)
+    else:
+        logger.warning('')
+        logger.warning('Expected dict or list for group "%s", '
+                       'got %s instead', k, str(type(v)))
+
+    if k not in ['all', 'ungrouped']:
+        inventory.all_group.add_child_group(group)
+
+
 def dict_to_mem_data(data, inventory=None):
     '''
     In-place operation on `inventory`, adds contents from `data` to the
@@ -237,70 +486,7 @@ def dict_to_mem_data(data, inventory=None):
     _meta = data.pop('_meta', {})
 
     for k,v in data.items():
-        group = inventory.get_group(k)
-        if not group:
-            continue
-
-        # Load group hosts/vars/children from a dictionary.
-        if isinstance(v, dict):
-            # Process hosts within a group.
-            hosts = v.get('hosts', {})
-            if isinstance(hosts, dict):
-                for hk, hv in hosts.items():
-                    host = inventory.get_host(hk)
-                    if not host:
-                        continue
-                    if isinstance(hv, dict):
-                        host.variables.update(hv)
-                    else:
-                        logger.warning('Expected dict of vars for '
-                                       'host "%s", got %s instead',
-                                       hk, str(type(hv)))
-                    group.add_host(host)
-            elif isinstance(hosts, (list, tuple)):
-                for hk in hosts:
-                    host = inventory.get_host(hk)
-                    if not host:
-                        continue
-                    group.add_host(host)
-            else:
-                logger.warning('Expected dict or list of "hosts" for '
-                               'group "%s", got %s instead', k,
-                               str(type(hosts)))
-            # Process group variables.
-            vars = v.get('vars', {})
-            if isinstance(vars, dict):
-                group.variables.update(vars)
-            else:
-                logger.warning('Expected dict of vars for '
-                               'group "%s", got %s instead',
-                               k, str(type(vars)))
-            # Process child groups.
-            children = v.get('children', [])
-            if isinstance(children, (list, tuple)):
-                for c in children:
-                    child = inventory.get_group(c, inventory.all_group, child=True)
-                    if child and c != 'ungrouped':
-                        group.add_child_group(child)
-            else:
-                logger.warning('Expected list of children for '
-                               'group "%s", got %s instead',
-                               k, str(type(children)))
-
-        # Load host names from a list.
-        elif isinstance(v, (list, tuple)):
-            for h in v:
-                host = inventory.get_host(h)
-                if not host:
-                    continue
-                group.add_host(host)
-        else:
-            logger.warning('')
-            logger.warning('Expected dict or list for group "%s", '
-                           'got %s instead', k, str(type(v)))
-
-        if k not in ['all', 'ungrouped']:
-            inventory.all_group.add_child_group(group)
+        _add_group_data(inventory, k, v)
 
     if _meta:
         for k,v in inventory.all_group.all_hosts.items():
@@ -313,3 +499,45 @@ def dict_to_mem_data(data, inventory=None):
                                k, str(type(meta_hostvars)))
 
     return inventory
+
+
+def stream_to_mem_data(stream, inventory=None, memory_budget=64 * 1024 * 1024, tmp_dir=None):
+    '''
+    Like `dict_to_mem_data`, but reads the JSON from the text file object
+    `stream` as it arrives, without holding all of it in memory: groups are
+    added one at a time, and the `_meta.hostvars` of each host are moved into
+    a HostVarsStore (see there for `memory_budget` and `tmp_dir`) that the
+    host reads its variables from.
+    '''
+    if inventory is None:
+        inventory = MemInventory()
+
+    reader = JSONStreamReader(stream)
+    if reader.peek() != '{':
+        data = reader.value()
+        raise TypeError('Returned JSON must be a dictionary, got %s instead' % str(type(data)))
+
+    store = HostVarsStore(memory_budget, tmp_dir=tmp_dir)
+    for k in reader.members():
+        if k != '_meta':
+            _add_group_data(inventory, k, reader.value())
+            continue
+        for meta_key in reader.members():
+            if meta_key != 'hostvars':
+                reader.value()
+                continue
+            for hk in reader.members():
+                hv = reader.value()
+                if isinstance(hv, dict):
+                    store[hk] = hv
+                else:
+                    logger.warning('Expected dict of vars for '
+                                   'host "%s", got %s instead',
+                                   hk, str(type(hv)))
+    reader.end()
+
+    for k,v in inventory.all_group.all_hosts.items():
+        if k in store:
+            v.variables_store = store
+
+    return inventory
@@ -0,0 +1,145 @@
+# Copyright (c) 2018 Ansible by Red Hat
+# All Rights Reserved.
+
+# Python
+import bisect
+import zlib
+from io import StringIO
+
+
+__all__ = ['event_lines', 'StdoutArchiveWriter', 'StdoutArchiveReader']
+
+
+def event_lines(stdout, start_line, end_line):
+    '''
+    Return the lines of stdout (each ending with a line break) covered by an
+    event; the trailing line break of an event's output isn't stored with it.
+    '''
+    lines = (stdout.replace('\r\n', '\n') + '\n').split('\n')[:end_line - start_line]
+    return [line + '\n' for line in lines]
+
+
+class StdoutArchiveWriter(object):
+    '''
+    Writes a job's stdout, one event at a time, as a sequence of
+    independently zlib-compressed blocks of whole lines.
+
+    `index` holds a [first line, offset, compressed length, size] entry for
+    each block, so that any range of lines can be read by decompressing only
+    the blocks that contain it (see `StdoutArchiveReader`).
+    '''
+
+    def __init__(self, fileobj, block_size=65536):
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.index = []
+        self.lines = 0
+        self.size = 0
+        self.error = None
+        self._offset = 0
+        self._block = []
+        self._block_start = 0
+        self._block_size = 0
+
+    def write_event(self, stdout, start_line, end_line):
+        if self.error is not None:
+            return
+        try:
+            for line in event_lines(stdout or '', start_line, end_line):
+                data = line.encode('utf-8')
+                self._block.append(data)
+                self._block_size += len(data)
+                self.lines += 1
+                if self._block_size >= self.block_size:
+                    self.flush()
+        except (IOError, OSError) as e:
+            # an incomplete archive is never saved; the job's output is
+            # still available from its events
+            self.error = e
+
+    def flush(self):
+        if not self._block:
+            return
+        data = zlib.compress(b''.join(self._block))
+        self.fileobj.write(data)
+        self.index.append([self._block_start, self._offset, len(data), self._block_size])
+        self._offset += len(data)
+        self.size += self._block_size
+        self._block = []
+        self._block_start = self.lines
+        self._block_size = 0
+
+    def close(self):
+        try:
+            if self.error is None:
+                self.flush()
+        except (IOError, OSError) as e:
+            self.error = e
+        finally:
+            self.fileobj.close()
+
+
+class StdoutArchiveReader(object):
+    '''
+    Reads lines from an archive written by `StdoutArchiveWriter`.
+
+    `read` is a callable that returns `length` bytes of the archive starting
+    at `offset`; blocks that are read together are fetched with one call.
+    '''
+
+    MAX_READ_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, read, index, lines):
+        self.read = read
+        self.index = index
+        self.lines = lines
+        self._starts = [block[0] for block in index]
+
+    def _blocks_for(self, start_line, end_line):
+        first = max(bisect.bisect_right(self._starts, start_line) - 1, 0)
+        last = bisect.bisect_left(self._starts, end_line)
+        return self.index[first:last]
+
+    def size_of(self, start_line, end_line):
+        '''
+        Return the uncompressed size of the blocks containing the lines
+        [start_line, end_line).
+        '''
+        return sum(block[3] for block in self._blocks_for(start_line, end_line))
+
+    def blocks(self, start_line=0, end_line=None):
+        '''
+        Yield the first line and the text of each block containing the lines
+        [start_line, end_line).
+        '''
+        if end_line is None:
+            end_line = self.lines
+        blocks = self._blocks_for(start_line, end_line)
+        while blocks:
+            # read as many contiguous blocks at a time as fit in MAX_READ_SIZE
+            batch = [blocks[0]]
+            for block in blocks[1:]:
+                if block[1] + block[2] - batch[0][1] > self.MAX_READ_SIZE:
+                    break
+                batch.append(block)
+            blocks = blocks[len(batch):]
+
+            offset = batch[0][1]
+            data = self.read(offset, batch[-1][1] + batch[-1][2] - offset)
+            for first_line, block_offset, length, size in batch:
+                block_offset -= offset
+                yield first_line, zlib.decompress(data[block_offset:block_offset + length]).decode('utf-8')
+
+    def read_lines(self, start_line, end_line):
+        '''
+        Return the lines [start_line, end_line) as a string.
+        '''
+        buff = StringIO()
+        for first_line, text in self.blocks(start_line, end_line):
+            for lineno, line in enumerate(text.split('\n')[:-1], first_line):
+                if lineno >= end_line:
+                    break
+                if lineno >= start_line:
+                    buff.write(line)
+                    buff.write('\n')
+        return buff.getvalue()
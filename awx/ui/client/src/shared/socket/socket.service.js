@@ -79,7 +79,9 @@ export default
                         $log.debug(`Websocket disconnected`);
                     };
 
-                    self.socket.onmessage = this.onMessage;
+                    self.socket.onmessage = function (e) {
+                        self.onMessage(e);
+                    };
 
                     return self.socket;
                 }
@@ -95,10 +97,22 @@ export default
                 // the appropriate controller for the current $state.
                 $log.debug('Received From Server: ' + e.data);
 
-                var data = JSON.parse(e.data), str = "";
+                var data = JSON.parse(e.data);
+
+                if(Array.isArray(data.events)){
+                    // The API sends the events of a running job in batches;
+                    // each one is routed as if it had been sent on its own.
+                    data.events.forEach(event => this.routeMessage(event));
+                }
+                else {
+                    this.routeMessage(data);
+                }
+            },
+            routeMessage: function(data){
+                var str = "";
 
                 if(!window.liveUpdates && data.group_name !== "control" && $state.current.name !== "jobResult"){
-                    $log.debug('Message from server dropped: ' + e.data);
+                    $log.debug('Message from server dropped: ' + JSON.stringify(data));
                     needsRefreshAfterBlur = true;
                     return;
                 }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+'''
+Compare the time it takes to compute the computed fields of the groups of a
+synthetic inventory, by walking the subtree of every group (the previous
+implementation of Inventory.update_group_computed_fields) and by merging the
+fields of child groups bottom-up.
+
+Usage: benchmark_group_computed_fields.py [--groups N] [--hosts N] [--depth N]
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from awx.main.utils.group_computed_fields import compute_group_fields, compute_group_fields_by_subtree  # noqa
+
+
+def generate_inventory(shape, groups, hosts, depth, seed=0):
+    '''
+    Build the arguments of compute_group_fields for `groups` groups under a
+    single root, either as a `wide` tree (every group a child of the root),
+    a `deep` one (`depth` levels, with about the same number of groups at
+    each) or a `dag` like the deep tree but where every group has 3 parents;
+    every host is in 2 of the groups at the bottom level.
+    '''
+    rand = random.Random(seed)
+    group_children_map = {}
+    if shape == 'wide':
+        levels = [[1], list(range(2, groups + 1))]
+    else:
+        per_level = max(1, (groups - 1) // depth)
+        levels = [[1]]
+        pk = 2
+        for level in range(depth):
+            levels.append(list(range(pk, pk + per_level)))
+            pk += per_level
+    for parents, children in zip(levels, levels[1:]):
+        parent_count = min(3 if shape == 'dag' else 1, len(parents))
+        for child_pk in children:
+            for parent_pk in rand.sample(parents, parent_count):
+                group_children_map.setdefault(parent_pk, set()).add(child_pk)
+    group_hosts_map = {}
+    for host_pk in range(1, hosts + 1):
+        for group_pk in rand.sample(levels[-1], min(2, len(levels[-1]))):
+            group_hosts_map.setdefault(group_pk, set()).add(host_pk)
+    active_host_pks = set(range(1, hosts + 1))
+    failed_host_pks = set(rand.sample(range(1, hosts + 1), hosts // 100))
+    return (set([1]), group_children_map, group_hosts_map, active_host_pks, failed_host_pks, set())
+
+
+def measure(name, func, args):
+    started = time.time()
+    fields = func(*args)
+    print('{:<12} {:>10.3f}s'.format(name, time.time() - started))
+    return fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--groups', type=int, default=5000,
+                        help='Number of groups to generate (default=5000)')
+    parser.add_argument('--hosts', type=int, default=20000,
+                        help='Number of hosts to generate (default=20000)')
+    parser.add_argument('--depth', type=int, default=7,
+                        help='Number of levels of the deep tree (default=7)')
+    options = parser.parse_args()
+
+    for shape in ('wide', 'deep', 'dag'):
+        args = generate_inventory(shape, options.groups, options.hosts, options.depth)
+        print('{}: {} groups, {} hosts'.format(shape, options.groups, options.hosts))
+        expected = measure('subtree', compute_group_fields_by_subtree, args)
+        fields = measure('bottom-up', compute_group_fields, args)
+        print('same fields' if fields == expected else 'DIFFERENT FIELDS')
+
+
+if __name__ == '__main__':
+    main()